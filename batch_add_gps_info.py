@@ -1,34 +1,97 @@
 import os
 import csv
 import sys
+import json
+import signal
+import argparse
+import time
+import shutil
+import tempfile
 import datetime
+import threading
+import multiprocessing
+from itertools import islice, chain
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
 from PIL import Image
 import piexif
-from fractions import Fraction
+from jpeg_segments import (rewrite_jpeg_metadata, load_exif_dict, scan_jpeg_file, patch_metadata_in_place,
+                           atomic_output, sync_files, XMP_HEADER)
+from dji_xmp import build_dji_xmp_packet
+from image_index import ImageIndex
+from image_catalog import ImageCatalog, open_catalog
+from manifest import iter_manifest_chunks, count_csv_rows, TIMESTAMP_FORMATS, DEFAULT_CHUNK_ROWS
+from gps_track import load_track, read_capture_times, build_track_manifest, DEFAULT_MAX_GAP
+from clock_offset import (estimate_time_offset, load_control_photos, describe_offset, DEFAULT_OFFSET_RANGE,
+                          LOW_CONFIDENCE)
+from exif_reader import dump_geotags, DEFAULT_READ_WORKERS
+from run_stats import RunStats
 
 # 在打包版本中，完全禁用XMP功能，避免依赖exempi库
 LIBXMP_AVAILABLE = False
 if not getattr(sys, 'frozen', False):
     try:
         from libxmp import XMPFiles, consts
-        from libxmp.core import XMPMeta, XMPError
+        from libxmp.core import XMPMeta
         
         # 测试XMP库是否可用
         test_xmp = XMPMeta()
         LIBXMP_AVAILABLE = True
     except Exception as e:
-        print(f"警告: XMP功能不可用: {str(e)}")
-        print("将使用标准EXIF方法而非DJI XMP格式")
+        print(f"警告: XMP功能不可用: {str(e)}", file=sys.stderr)
+        print("将使用标准EXIF方法而非DJI XMP格式", file=sys.stderr)
 else:
-    print("EXE打包模式: 已禁用DJI XMP格式支持，仅使用EXIF")
+    print("EXE打包模式: 已禁用DJI XMP格式支持，仅使用EXIF", file=sys.stderr)
 
-# 尝试导入OPT转换工具
-try:
-    from opt_converter import create_dji_dewarp_xmp, parse_opt_file
-    OPT_CONVERTER_AVAILABLE = True
-except ImportError:
-    OPT_CONVERTER_AVAILABLE = False
-    print("警告: 未找到opt_converter.py，无法使用相机畸变参数转换功能")
+# OPT转换工具由camera_profile加载
+from camera_profile import OPT_CONVERTER_AVAILABLE, get_camera_profile
+from camera_registry import get_camera_registry, find_opt_file, DEFAULT_CAMERA_DIR
+from camera_rig import load_rig, expand_manifest
+if not OPT_CONVERTER_AVAILABLE:
+    print("警告: 未找到opt_converter.py，无法使用相机畸变参数转换功能", file=sys.stderr)
+
+# 写入方式:
+#   lossless - 仅替换APP1/EXIF段，图像压缩数据原样拷贝（默认，无损且快）
+#   reencode - 使用PIL解码后重新以JPEG(quality=95)保存（旧方式）
+WRITE_MODE_LOSSLESS = 'lossless'
+WRITE_MODE_REENCODE = 'reencode'
+DEFAULT_WRITE_MODE = WRITE_MODE_LOSSLESS
+
+# 落盘方式:
+#   none  - 不主动fsync，由操作系统决定何时写盘
+#   file  - 每个文件重命名前fsync
+#   batch - 每批文件统一刷新一次（默认）；覆盖原图时重命名前仍逐个fsync临时文件，
+#           否则断电后原图可能只剩被截断的新文件，只有写入输出文件夹时才完全按批刷新
+FSYNC_NONE = 'none'
+FSYNC_FILE = 'file'
+FSYNC_BATCH = 'batch'
+DEFAULT_FSYNC = FSYNC_BATCH
+# batch模式下每写入多少个文件统一刷新一次
+FSYNC_BATCH_SIZE = 1000
+# 原地写入（in_place）：覆盖原图且原有EXIF/XMP段空间足够时直接覆盖这些段，不重写整个文件。
+# 这不是原子操作，中途断电可能留下新旧混合的元数据，因此默认关闭，与落盘方式相互独立
+
+# 并行方式:
+#   process - 进程池，适合reencode等CPU密集的写入
+#   thread  - 线程池，适合lossless写入，重叠网络盘/NAS上的读写等待
+EXECUTOR_PROCESS = 'process'
+EXECUTOR_THREAD = 'thread'
+
+# 重写EXIF段时在末尾预留的空间（字节），使以后再次写入时可以原地覆盖
+EXIF_RESERVED_PADDING = 512
+
+# 命令行模式的退出码:
+#   0   - 全部成功（包括跳过的记录）
+#   1   - 处理完成，但有记录失败，或CSV中途读取出错（已处理的记录照常输出）
+#   2   - 参数错误或无法读取CSV/图片文件夹，未开始处理
+#   130 - 收到SIGINT/SIGTERM，处理完在途任务后提前停止
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_ERROR = 2
+EXIT_STOPPED = 130
+
+# 命令行汇总中最多列出的错误信息数
+CLI_MAX_ERRORS = 20
 
 def decimal_to_dms(decimal):
     """将十进制度数转换为度分秒格式，用于GPS信息"""
@@ -51,14 +114,7 @@ def parse_timestamp(timestamp_str):
         return None
     
     # 尝试不同的时间格式
-    formats = [
-        '%Y-%m-%d %H:%M:%S',      # 标准格式：2024-08-18 10:30:00
-        '%Y-%m-%d_%H:%M:%S',      # 下划线格式：2020-10-18_12:19:00
-        '%Y/%m/%d %H:%M:%S',      # 斜杠格式
-        '%Y-%m-%d %H-%M-%S',      # 连字符格式
-    ]
-    
-    for fmt in formats:
+    for fmt in TIMESTAMP_FORMATS:
         try:
             dt = datetime.datetime.strptime(timestamp_str, fmt)
             return dt.strftime('%Y:%m:%d %H:%M:%S')  # 返回EXIF标准格式
@@ -95,8 +151,8 @@ def normalize_angle(angle):
     
     return angle
 
-def create_dji_xmp(lat, lng, alt, roll, pitch, yaw, timestamp=None, opt_file=None, opt_data=None):
-    """创建DJI格式的XMP元数据"""
+def create_dji_xmp(lat, lng, alt, roll, pitch, yaw, timestamp=None, opt_file=None, profile=None):
+    """创建DJI格式的XMP元数据；profile为已加载的CameraProfile，不提供时按opt_file查找"""
     if not LIBXMP_AVAILABLE:
         return None
     
@@ -112,36 +168,19 @@ def create_dji_xmp(lat, lng, alt, roll, pitch, yaw, timestamp=None, opt_file=Non
         xmp.set_property(DJI_NS, "drone-dji:GpsLongtitude", f"{lng}")  # DJI使用Longtitude而不是Longitude
         xmp.set_property(DJI_NS, "drone-dji:AbsoluteAltitude", f"{alt}")
         
-        # 设置姿态角（飞行器姿态）
-        xmp.set_property(DJI_NS, "drone-dji:FlightRollDegree", f"{roll}")
-        xmp.set_property(DJI_NS, "drone-dji:FlightPitchDegree", f"{pitch}")
-        xmp.set_property(DJI_NS, "drone-dji:FlightYawDegree", f"{yaw}")
+        # 设置姿态角（飞行器姿态），没有姿态数据时不写入
+        if not np.isnan([roll, pitch, yaw]).any():
+            xmp.set_property(DJI_NS, "drone-dji:FlightRollDegree", f"{roll}")
+            xmp.set_property(DJI_NS, "drone-dji:FlightPitchDegree", f"{pitch}")
+            xmp.set_property(DJI_NS, "drone-dji:FlightYawDegree", f"{yaw}")
         
         # 写入焦距信息到XMP
-        try:
-            if opt_data and 'FocalLength' in opt_data:
-                actual_focal = opt_data.get('FocalLength')
-                # 设置实际焦距
-                xmp.set_property(consts.XMP_NS_EXIF, 'exif:FocalLength', f"{actual_focal}")
-                
-                # 计算并设置35mm等效焦距
-                if 'SensorSize' in opt_data and opt_data.get('SensorSize') > 0:
-                    sensor_size = opt_data.get('SensorSize')
-                    equiv_focal = int(round(actual_focal * (35.0 / sensor_size)))
-                    xmp.set_property(consts.XMP_NS_EXIF, 'exif:FocalLengthIn35mmFilm', f"{equiv_focal}")
-            elif opt_file and OPT_CONVERTER_AVAILABLE:
-                # 如果没有传递opt_data但有opt_file，尝试解析
-                opt_data = parse_opt_file(opt_file)
-                if opt_data and 'FocalLength' in opt_data:
-                    actual_focal = opt_data.get('FocalLength')
-                    xmp.set_property(consts.XMP_NS_EXIF, 'exif:FocalLength', f"{actual_focal}")
-                    
-                    if 'SensorSize' in opt_data and opt_data.get('SensorSize') > 0:
-                        sensor_size = opt_data.get('SensorSize')
-                        equiv_focal = int(round(actual_focal * (35.0 / sensor_size)))
-                        xmp.set_property(consts.XMP_NS_EXIF, 'exif:FocalLengthIn35mmFilm', f"{equiv_focal}")
-        except Exception as e:
-            print(f"XMP焦距写入失败: {e}")
+        if profile is None:
+            profile = get_camera_profile(opt_file)
+        if profile is not None and profile.focal_length is not None:
+            xmp.set_property(consts.XMP_NS_EXIF, 'exif:FocalLength', f"{profile.focal_length}")
+            if profile.focal_length_35mm is not None:
+                xmp.set_property(consts.XMP_NS_EXIF, 'exif:FocalLengthIn35mmFilm', f"{profile.focal_length_35mm}")
         
         # 设置时间戳
         if timestamp:
@@ -159,24 +198,28 @@ def create_dji_xmp(lat, lng, alt, roll, pitch, yaw, timestamp=None, opt_file=Non
             except Exception as e:
                 print(f"XMP时间格式错误: {e}")
         
-        # 如果提供了OPT文件，添加相机畸变参数
-        if opt_file and OPT_CONVERTER_AVAILABLE:
-            try:
-                dewarp_data = create_dji_dewarp_xmp(opt_file)
-                if dewarp_data:
-                    for key, value in dewarp_data.items():
-                        xmp.set_property(DJI_NS, key, value)
-            except Exception as e:
-                print(f"添加相机畸变参数失败: {e}")
+        # 如果提供了OPT文件，添加相机畸变参数（已在CameraProfile中预先计算）
+        if profile is not None:
+            for key, value in profile.xmp_attributes.items():
+                xmp.set_property(DJI_NS, key, value)
         
         return xmp
     except Exception as e:
         print(f"创建DJI XMP元数据失败: {e}")
         return None
 
-def set_gps_location(image_path, lat, lng, altitude=0, roll=0, pitch=0, yaw=0, timestamp=None, opt_file=None, output_path=None):
+def is_jpeg_file(image_path):
+    """判断文件是否为JPEG（检查SOI标记）"""
+    try:
+        with open(image_path, 'rb') as f:
+            return f.read(2) == b'\xff\xd8'
+    except OSError:
+        return False
+
+def set_gps_location(image_path, lat, lng, altitude=0, roll=0, pitch=0, yaw=0, timestamp=None, opt_file=None, output_path=None, write_mode=None, write_xmp=True, fsync=False, precomputed=None,
+                     camera_dir=None, metrics=None, in_place=False):
     """设置图片的GPS信息、姿态角和时间
-    
+
     Args:
         image_path: 原始图片路径
         lat: 纬度
@@ -184,67 +227,102 @@ def set_gps_location(image_path, lat, lng, altitude=0, roll=0, pitch=0, yaw=0, t
         altitude: 高度
         roll: 横滚角
         pitch: 俯仰角
-        yaw: 偏航角
+        yaw: 偏航角；姿态角为NaN表示没有姿态数据（如GPX轨迹），不写入方向和姿态
         timestamp: 时间戳
         opt_file: OPT文件路径
         output_path: 输出文件路径，若不提供则覆盖原图
+        write_mode: 写入方式，'lossless'(默认)仅替换EXIF段，'reencode'使用PIL重新编码
+        write_xmp: 是否写入DJI XMP数据（lossless模式下与EXIF同一次写入）
+        fsync: 写入完成后是否立即刷新到磁盘
+        precomputed: compile_manifest预先计算的值（exif_time、lat_dms、lng_dms、
+                     altitude_rational、direction_rational），提供时不再逐张计算；
+                     其中的gps_time（轨迹的UTC时间）提供时用于GPSDateStamp/GPSTimeStamp，
+                     否则GPS时间与拍摄时间相同
+        camera_dir: OPT文件目录，提供时按图片EXIF中的机型、镜头和尺寸自动选择相机参数，
+                    无法确定时使用opt_file
+        metrics: 提供时填入各阶段耗时(秒) {'read', 'exif', 'xmp', 'write'} 和读取的字节数'bytes_read'
+        in_place: 覆盖原图且原有段空间足够时是否原地覆盖EXIF/XMP段，不重写整个文件。
+                  原地写入不是原子操作，中途断电可能留下新旧混合的元数据
     """
+    if write_mode is None:
+        write_mode = DEFAULT_WRITE_MODE
+    
+    clock = time.perf_counter()
+    
+    def lap(stage):
+        """记录上一个计时点到现在的阶段耗时"""
+        nonlocal clock
+        now = time.perf_counter()
+        if metrics is not None:
+            metrics[stage] = metrics.get(stage, 0.0) + now - clock
+        clock = now
+
     try:
         # 解析时间戳
         parsed_time = None
-        if timestamp:
+        gps_time = None
+        if precomputed is not None:
+            parsed_time = precomputed.get('exif_time')
+            gps_time = precomputed.get('gps_time')
+        elif timestamp:
             parsed_time = parse_timestamp(timestamp)
+        gps_time = gps_time or parsed_time
         
         # 标准化角度
         normalized_roll = float(roll) if roll is not None else 0
         normalized_pitch = float(pitch) if pitch is not None else 0
         normalized_yaw = normalize_angle(float(yaw)) if yaw is not None else 0
-        
-        # 从opt文件读取焦距和传感器大小
-        focal_length = None
-        focal_length_35mm_equiv = None
-        if opt_file and os.path.exists(opt_file) and OPT_CONVERTER_AVAILABLE:
-            try:
-                opt_data = parse_opt_file(opt_file)
-                if opt_data and 'FocalLength' in opt_data:
-                    focal_length = opt_data.get('FocalLength')
-                    # 计算35mm等效焦距
-                    if 'SensorSize' in opt_data and opt_data.get('SensorSize') > 0:
-                        sensor_size = opt_data.get('SensorSize')
-                        # 35mm等效焦距 = 实际焦距 × (35 / 传感器尺寸)
-                        focal_length_35mm_equiv = int(round(focal_length * (35.0 / sensor_size)))
-                        print(f"计算35mm等效焦距: {focal_length_35mm_equiv}mm (实际焦距: {focal_length}mm, 传感器尺寸: {sensor_size}mm)")
-                    else:
-                        print("无法计算35mm等效焦距: 传感器尺寸缺失或无效")
-            except Exception as e:
-                print(f"读取焦距失败: {e}")
+        has_attitude = not np.isnan([normalized_roll, normalized_pitch, normalized_yaw]).any()
         
         # 1. 首先设置EXIF数据
+        is_jpeg = is_jpeg_file(image_path)
+        layout = None
         try:
-            # 加载现有EXIF
-            exif_dict = piexif.load(image_path)
+            # 加载现有EXIF（JPEG只读取文件头部的EXIF段）
+            if is_jpeg:
+                layout = scan_jpeg_file(image_path)
+                exif_dict = load_exif_dict(image_path, layout)
+            else:
+                exif_dict = piexif.load(image_path)
         except:
             # 如果没有EXIF，创建新的
             exif_dict = {"0th": {}, "Exif": {}, "GPS": {}, "1st": {}, "thumbnail": None}
+        lap('read')
+        
+        # 相机参数每个OPT文件只解析一次；自动选择时按写入前的EXIF和帧尺寸查找，结果按机型缓存
+        profile = None
+        if camera_dir:
+            profile = get_camera_registry(camera_dir).match_image(exif_dict, layout['frame_size'] if layout else None)
+        if profile is None:
+            profile = get_camera_profile(opt_file)
+        focal_length = profile.focal_length if profile is not None else None
+        focal_length_35mm_equiv = profile.focal_length_35mm if profile is not None else None
         
         # 确保GPS字典存在
         if "GPS" not in exif_dict:
             exif_dict["GPS"] = {}
         
         # 设置GPS信息
-        exif_dict["GPS"][piexif.GPSIFD.GPSLatitude] = decimal_to_dms(lat)
+        if precomputed is None:
+            precomputed = {
+                'lat_dms': decimal_to_dms(lat),
+                'lng_dms': decimal_to_dms(lng),
+                'altitude_rational': int(abs(float(altitude)) * 100),
+                'direction_rational': int(normalized_yaw * 100) if has_attitude else None
+            }
+        exif_dict["GPS"][piexif.GPSIFD.GPSLatitude] = precomputed['lat_dms']
         exif_dict["GPS"][piexif.GPSIFD.GPSLatitudeRef] = "N" if lat >= 0 else "S"
-        exif_dict["GPS"][piexif.GPSIFD.GPSLongitude] = decimal_to_dms(lng)
+        exif_dict["GPS"][piexif.GPSIFD.GPSLongitude] = precomputed['lng_dms']
         exif_dict["GPS"][piexif.GPSIFD.GPSLongitudeRef] = "E" if lng >= 0 else "W"
         
         # 设置高度
-        alt_value = abs(float(altitude))
-        exif_dict["GPS"][piexif.GPSIFD.GPSAltitude] = (int(alt_value * 100), 100)
+        exif_dict["GPS"][piexif.GPSIFD.GPSAltitude] = (precomputed['altitude_rational'], 100)
         exif_dict["GPS"][piexif.GPSIFD.GPSAltitudeRef] = 1 if altitude < 0 else 0
         
-        # 设置方向（偏航角）
-        exif_dict["GPS"][piexif.GPSIFD.GPSImgDirection] = (int(normalized_yaw * 100), 100)
-        exif_dict["GPS"][piexif.GPSIFD.GPSImgDirectionRef] = "T"  # T表示真北
+        # 设置方向（偏航角），没有姿态数据时不写入
+        if has_attitude and precomputed['direction_rational'] is not None:
+            exif_dict["GPS"][piexif.GPSIFD.GPSImgDirection] = (precomputed['direction_rational'], 100)
+            exif_dict["GPS"][piexif.GPSIFD.GPSImgDirectionRef] = "T"  # T表示真北
         
         # 写入焦距信息到EXIF
         if "Exif" not in exif_dict:
@@ -252,31 +330,31 @@ def set_gps_location(image_path, lat, lng, altitude=0, roll=0, pitch=0, yaw=0, t
             
         # 设置实际焦距
         if focal_length is not None:
-            # 将焦距转换为有理数格式
-            focal_fraction = Fraction(focal_length).limit_denominator(1000)
-            exif_dict["Exif"][piexif.ExifIFD.FocalLength] = (focal_fraction.numerator, focal_fraction.denominator)
+            exif_dict["Exif"][piexif.ExifIFD.FocalLength] = profile.focal_rational
             
         # 设置35mm等效焦距
         if focal_length_35mm_equiv is not None:
             exif_dict["Exif"][piexif.ExifIFD.FocalLengthIn35mmFilm] = focal_length_35mm_equiv
         
-        # 设置时间戳
-        if parsed_time:
-            exif_dict["GPS"][piexif.GPSIFD.GPSDateStamp] = parsed_time.split(' ')[0].replace(':', '/')
+        # 设置时间戳：GPS时间使用gps_time（UTC），拍摄时间保持相机本地时间
+        if gps_time:
+            exif_dict["GPS"][piexif.GPSIFD.GPSDateStamp] = gps_time.split(' ')[0].replace(':', '/')
             exif_dict["GPS"][piexif.GPSIFD.GPSTimeStamp] = tuple([
-                (int(parsed_time.split(' ')[1].split(':')[0]), 1),  # 小时
-                (int(parsed_time.split(' ')[1].split(':')[1]), 1),  # 分钟
-                (int(parsed_time.split(' ')[1].split(':')[2]), 1)   # 秒钟
+                (int(gps_time.split(' ')[1].split(':')[0]), 1),  # 小时
+                (int(gps_time.split(' ')[1].split(':')[1]), 1),  # 分钟
+                (int(gps_time.split(' ')[1].split(':')[2]), 1)   # 秒钟
             ])
+        if parsed_time:
             # 设置拍摄时间到EXIF主字段
             exif_dict["Exif"][piexif.ExifIFD.DateTimeOriginal] = parsed_time
             exif_dict["0th"][piexif.ImageIFD.DateTime] = parsed_time
         
         # 在EXIF的UserComment中存储姿态角信息
-        attitude_info = f"Roll={normalized_roll:.1f},Pitch={normalized_pitch:.1f},Yaw={normalized_yaw:.1f}"
-        if "Exif" not in exif_dict:
-            exif_dict["Exif"] = {}
-        exif_dict["Exif"][piexif.ExifIFD.UserComment] = attitude_info.encode('ascii', errors='replace')
+        if has_attitude:
+            attitude_info = f"Roll={normalized_roll:.1f},Pitch={normalized_pitch:.1f},Yaw={normalized_yaw:.1f}"
+            if "Exif" not in exif_dict:
+                exif_dict["Exif"] = {}
+            exif_dict["Exif"][piexif.ExifIFD.UserComment] = attitude_info.encode('ascii', errors='replace')
         
         # 保存EXIF数据
         try:
@@ -284,58 +362,61 @@ def set_gps_location(image_path, lat, lng, altitude=0, roll=0, pitch=0, yaw=0, t
         except Exception as e:
             print(f"EXIF数据序列化失败: {e}")
             return False
+        lap('exif')
         
         # 2. 如果可用，再设置DJI XMP数据
         xmp = None
-        # 提取opt_data以传递给XMP生成函数，避免重复解析
-        opt_data_for_xmp = None
-        if opt_file and os.path.exists(opt_file) and OPT_CONVERTER_AVAILABLE:
-            try:
-                if 'opt_data' in locals() and opt_data:
-                    opt_data_for_xmp = opt_data
-                else:
-                    opt_data_for_xmp = parse_opt_file(opt_file)
-            except Exception:
-                pass
-        
-        if LIBXMP_AVAILABLE:
-            xmp = create_dji_xmp(lat, lng, altitude, normalized_roll, normalized_pitch, normalized_yaw, parsed_time, opt_file, opt_data_for_xmp)
+        lossless = write_mode == WRITE_MODE_LOSSLESS and is_jpeg
+        xmp_packet = None
+        if write_xmp and lossless:
+            # 纯Python生成XMP包；已有XMP段时优先按原段大小生成，以便原地覆盖
+            if layout and layout['xmp'] is not None:
+                xmp_packet = build_dji_xmp_packet(lat, lng, altitude, normalized_roll, normalized_pitch, normalized_yaw,
+                                                  parsed_time, packet_size=layout['xmp'].payload_length - len(XMP_HEADER),
+                                                  profile=profile)
+            if xmp_packet is None:
+                xmp_packet = build_dji_xmp_packet(lat, lng, altitude, normalized_roll, normalized_pitch, normalized_yaw,
+                                                  parsed_time, profile=profile)
+        elif write_xmp and LIBXMP_AVAILABLE:
+            xmp = create_dji_xmp(lat, lng, altitude, normalized_roll, normalized_pitch, normalized_yaw, parsed_time, opt_file, profile)
+        lap('xmp')
         
         # 确定输出路径
         save_path = output_path if output_path else image_path
         
         # 确保输出路径的目录存在
         output_dir = os.path.dirname(save_path)
-        if not os.path.exists(output_dir):
+        if output_dir and not os.path.exists(output_dir):
             os.makedirs(output_dir)
         
-        # 打印焦距信息，用于调试
-        if focal_length is not None:
-            print(f"写入实际焦距: {focal_length}mm")
-        if focal_length_35mm_equiv is not None:
-            print(f"写入35mm等效焦距: {focal_length_35mm_equiv}mm")
-        
-        # 调试：检查EXIF字典内容
-        if focal_length is not None or focal_length_35mm_equiv is not None:
-            print(f"EXIF焦距字段检查:")
-            if piexif.ExifIFD.FocalLength in exif_dict["Exif"]:
-                print(f"  - FocalLength: {exif_dict['Exif'][piexif.ExifIFD.FocalLength]}")
-            if piexif.ExifIFD.FocalLengthIn35mmFilm in exif_dict["Exif"]:
-                print(f"  - FocalLengthIn35mmFilm: {exif_dict['Exif'][piexif.ExifIFD.FocalLengthIn35mmFilm]}")
-            
-        # 3. 重新打开图像并保存带有EXIF的版本
-        with Image.open(image_path) as img:
-            img.save(save_path, "JPEG", exif=exif_bytes, quality=95)
-        
-        # 4. 如果有XMP数据，写入XMP
-        if LIBXMP_AVAILABLE and xmp:
-            try:
-                xmpfile = XMPFiles(file_path=save_path, open_forupdate=True)
-                if xmpfile.can_put_xmp(xmp):
-                    xmpfile.put_xmp(xmp)
-                    xmpfile.close_file()
-            except Exception as e:
-                print(f"XMP写入失败: {e}")
+        # 3. 写入EXIF：JPEG默认直接替换EXIF段（XMP段同一次写入），其他格式或reencode模式使用PIL重新保存
+        #    两种方式都先写入目标目录中的临时文件，完成后原子替换目标文件
+        if lossless:
+            # 允许原地写入、覆盖原图且原有段空间足够时原地写入，否则通过临时文件重写
+            overwrite = in_place and os.path.exists(save_path) and os.path.samefile(image_path, save_path)
+            if not (overwrite and layout and patch_metadata_in_place(image_path, exif_bytes, layout, xmp_packet, fsync)):
+                rewrite_jpeg_metadata(image_path, save_path, exif_bytes, xmp_packet,
+                                      exif_padding=EXIF_RESERVED_PADDING, fsync=fsync)
+                if metrics is not None and layout:
+                    metrics['bytes_read'] = layout['file_size']
+        else:
+            with atomic_output(save_path, fsync, mode_source=image_path) as temp_path:
+                with Image.open(image_path) as img:
+                    # 非JPEG（如TIFF）按原格式保存，不把JPEG数据写入其他扩展名的文件
+                    img.save(temp_path, "JPEG" if is_jpeg else img.format, exif=exif_bytes, quality=95)
+                
+                # 4. 如果有XMP数据，在替换目标文件之前写入XMP
+                if LIBXMP_AVAILABLE and xmp:
+                    try:
+                        xmpfile = XMPFiles(file_path=temp_path, open_forupdate=True)
+                        if xmpfile.can_put_xmp(xmp):
+                            xmpfile.put_xmp(xmp)
+                            xmpfile.close_file()
+                    except Exception as e:
+                        print(f"XMP写入失败: {e}")
+            if metrics is not None:
+                metrics['bytes_read'] = os.path.getsize(image_path)
+        lap('write')
         
         return True
         
@@ -343,16 +424,435 @@ def set_gps_location(image_path, lat, lng, altitude=0, roll=0, pitch=0, yaw=0, t
         print(f"写入元数据失败: {e}")
         return False
 
-def process_images_from_csv(csv_file, image_folder, opt_file=None, progress_callback=None, output_dir=None):
+def _process_job(job, options):
+    """处理单个图像任务，返回结果字典（在主进程或工作进程中执行）"""
+    start = time.perf_counter()
+    # CSV中指定了相机参数时优先使用，不再自动选择
+    opt_file = job.get('opt_file')
+    camera_dir = None if opt_file else options.get('camera_dir')
+    metrics = {}
+    try:
+        success = set_gps_location(job['image_path'], job['latitude'], job['longitude'], job['altitude'],
+                                   job['roll'], job['pitch'], job['yaw'], job['timestamp'],
+                                   opt_file or options['opt_file'], job['output_path'], options['write_mode'],
+                                   fsync=options['fsync_file'], precomputed=job.get('precomputed'),
+                                   camera_dir=camera_dir, metrics=metrics, in_place=options['in_place'])
+        error = None if success else f"EXIF写入失败: {job['image_name']}"
+    except Exception as e:
+        success = False
+        error = f"第{job['index']+1}行处理错误: {str(e)}"
+    output_path = job['output_path'] or job['image_path']
+    size = 0
+    if success:
+        try:
+            size = os.path.getsize(output_path)
+        except OSError:
+            pass
+    return {
+        'index': job['index'],
+        'image_name': job['image_name'],
+        'latitude': job['latitude'],
+        'longitude': job['longitude'],
+        'output_path': output_path,
+        'success': success,
+        'error': error,
+        'bytes': size,
+        'bytes_read': metrics.pop('bytes_read', 0),
+        'stages': metrics,
+        'worker': threading.current_thread().name if options.get('threaded') else os.getpid(),
+        'elapsed': time.perf_counter() - start
+    }
+
+def _process_job_chunk(jobs, options):
+    """在工作进程中处理一组任务"""
+    return [_process_job(job, options) for job in jobs]
+
+def _iter_thread_results(jobs, options, workers, max_in_flight):
+    """使用线程池处理任务，同时在途的任务数不超过max_in_flight，内存占用有上限"""
+    pending = set()
+    job_iter = iter(jobs)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='io') as executor:
+        while True:
+            for job in job_iter:
+                pending.add(executor.submit(_process_job, job, options))
+                if len(pending) >= max_in_flight:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+def _iter_process_results(jobs, options, workers, chunk_size):
+    """使用进程池分块处理任务，同时在途的任务块不超过进程数的2倍"""
+    pending = set()
+    job_iter = iter(jobs)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        try:
+            while True:
+                while len(pending) < workers * 2:
+                    chunk = list(islice(job_iter, chunk_size))
+                    if not chunk:
+                        break
+                    pending.add(executor.submit(_process_job_chunk, chunk, options))
+                if not pending:
+                    return
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        finally:
+            # 提前停止时取消尚未开始的任务块
+            executor.shutdown(wait=True, cancel_futures=True)
+
+def _iter_job_results(jobs, options, workers, chunk_size, executor=EXECUTOR_PROCESS, max_in_flight=None):
+    """按完成顺序逐个产出任务结果；workers>1时使用进程池分块或线程池并行处理
+
+    jobs可以是生成器，任务按需取出，不会一次性全部加载。
+    """
+    if workers <= 1:
+        for job in jobs:
+            yield _process_job(job, options)
+        return
+
+    if executor == EXECUTOR_THREAD:
+        yield from _iter_thread_results(jobs, options, workers, max_in_flight or workers * 2)
+        return
+
+    yield from _iter_process_results(jobs, options, workers, chunk_size)
+
+def update_worker_stats(stats, result):
+    """按工作进程/线程累计处理数量、耗时和数据量"""
+    entry = stats.setdefault(result['worker'], {'images': 0, 'seconds': 0.0, 'bytes': 0})
+    entry['images'] += 1
+    entry['seconds'] += result['elapsed']
+    entry['bytes'] += result.get('bytes', 0)
+    entry['images_per_sec'] = entry['images'] / entry['seconds'] if entry['seconds'] > 0 else 0
+
+def load_image_index(image_folder, recursive=False, catalog_path=None, log=print):
+    """
+    建立图片文件名索引
+
+    Args:
+        image_folder: 图片文件夹路径或多个根目录的列表
+        recursive: 是否递归包含子文件夹（使用持久化目录库增量更新）
+        catalog_path: 目录库SQLite文件路径
+        log: 日志输出函数
+
+    Returns:
+        tuple: (ImageIndex, 目录库；非递归模式下为None)
+    """
+    roots = [image_folder] if isinstance(image_folder, str) else list(image_folder)
+    if not recursive:
+        # 非递归时每个根目录只扫描一层，不使用目录库
+        return ImageIndex(roots if len(roots) > 1 else roots[0]), None
+    catalog = open_catalog(roots, catalog_path)
+    try:
+        log(f"目录库: 检查 {catalog.stats['directories']} 个文件夹，重新扫描 {catalog.stats['rescanned']} 个")
+        return catalog.index(), catalog
+    finally:
+        catalog.close()
+
+def image_root_of(path, catalog, image_roots):
+    """返回图片所在的根目录，用于计算保留子文件夹结构的相对路径"""
+    if catalog:
+        return catalog.root_of(path)
+    for root in image_roots:
+        if path.startswith(os.path.join(root, '')):
+            return root
+    return image_roots[0]
+
+def _process_manifests(manifests, total_rows, image_index, catalog, image_roots, log, progress_callback=None,
+                       opt_file=None, output_dir=None, write_mode=None, fsync=DEFAULT_FSYNC, workers=1, chunk_size=None,
+                       executor=EXECUTOR_PROCESS, max_in_flight=None, should_stop=None, auto_camera=False,
+                       camera_dir=DEFAULT_CAMERA_DIR, rig_config=None, stats=None, result_callback=None,
+                       completed_rows=None, in_place=False):
+    """
+    将编译好的清单交给写入流程：检查文件、生成任务、执行并汇总结果，CSV清单和轨迹插值共用
+    
+    Args:
+        manifests: 可迭代的(第一行行号, 清单)；清单中有'path'时直接使用其中的图片路径，不再按文件名查找
+        total_rows: 记录总数，用于显示进度
+        image_index: 图片目录索引
+        catalog: 递归模式下的目录库，否则为None
+        image_roots: 图片根目录列表
+        log: 日志输出函数
+        rig_config: load_rig的结果，提供时每条记录展开为每个相机一条
+        stats: RunStats，处理过程中实时累加计数
+        result_callback: 每条记录处理完成（含生成任务阶段的失败和跳过）时调用，参数为结果字典
+        completed_rows: 上次运行已成功的(行号, 文件名)集合，这些记录直接跳过（续传）
+        其余参数见process_images_from_csv
+    
+    Returns:
+        dict: 处理结果统计
+    """
+    counters = {'success': 0, 'failed': 0, 'skipped': 0, 'completed': 0, 'resumed': 0}
+    errors = []
+    if stats is None:
+        stats = RunStats()
+    
+    def report(index, image_name, success, error=None, skipped=False):
+        """生成任务阶段的失败和跳过也交给result_callback，与写入结果格式相同"""
+        if result_callback:
+            result_callback({'index': index, 'image_name': image_name, 'output_path': None, 'success': success,
+                             'skipped': skipped, 'error': error, 'bytes': 0, 'elapsed': 0.0})
+    
+    def fail(message, error, index, image_name):
+        """记录生成任务阶段的失败行"""
+        log(message)
+        counters['failed'] += 1
+        counters['completed'] += 1
+        stats.record_skipped(failed=True)
+        errors.append(error)
+        report(index, image_name, False, error)
+    
+    # CSV相机参数列中每个ID只查找一次OPT文件
+    opt_files = {}
+    
+    # CSV读取中途出错（如后面某块中的格式错误行）时记录错误并停止生成任务，已提交的任务照常完成并落盘
+    manifest_error = []
+    
+    def iter_manifests():
+        """遍历清单块，读取出错时记录错误后结束"""
+        try:
+            yield from manifests
+        except Exception as e:
+            error_msg = f"读取CSV文件失败: {str(e)}"
+            log(f"{error_msg}，停止提交新任务，等待在途任务完成")
+            manifest_error.append(error_msg)
+    
+    def generate_jobs():
+        """逐块读取编译好的清单，检查文件并生成待处理任务"""
+        for offset, manifest in iter_manifests():
+            unparsed_times = sum(1 for text, value in zip(manifest['timestamp'], manifest['exif_time'])
+                                 if text and value is None)
+            if unparsed_times:
+                log(f"⚠️ {unparsed_times} 条记录的时间格式无法解析，将不写入时间")
+            
+            # 多相机组：每条曝光记录展开为每个相机一条，姿态整块向量化合成
+            if rig_config:
+                manifest = expand_manifest(manifest, rig_config)
+            rows = manifest['row'].tolist() if 'row' in manifest else range(manifest['count'])
+            paths = manifest.get('path')
+            gps_times = manifest.get('gps_time')
+            
+            columns = {field: manifest[field].tolist() for field in
+                       ('latitude', 'longitude', 'altitude', 'roll', 'pitch', 'yaw', 'valid')}
+            for position, image_name in enumerate(manifest['filename']):
+                index = offset + rows[position]
+                if not image_name:
+                    log(f"第{index+1}行: 文件名为空，跳过")
+                    counters['skipped'] += 1
+                    counters['completed'] += 1
+                    stats.record_skipped()
+                    report(index, image_name, False, skipped=True)
+                    continue
+                
+                if completed_rows and (index, image_name) in completed_rows:
+                    counters['skipped'] += 1
+                    counters['resumed'] += 1
+                    counters['completed'] += 1
+                    stats.record_skipped()
+                    continue
+                
+                if not columns['valid'][position]:
+                    fail(f"第{index+1}行: 错误 - 经纬度无效", f"第{index+1}行处理错误: 经纬度无效", index, image_name)
+                    continue
+                
+                # 在目录索引中查找图像（大小写、扩展名变体、不带扩展名均可匹配），轨迹插值的清单已带有路径
+                resolve_start = time.perf_counter()
+                image_path = paths[position] if paths is not None else image_index.resolve(image_name)
+                stats.record_stage('resolve', time.perf_counter() - resolve_start)
+                if image_path is None:
+                    if image_index.is_ambiguous(image_name):
+                        fail(f"第{index+1}行: 文件名在多个子文件夹中重复，请在CSV中写明子文件夹: {image_name}",
+                             f"文件名重复: {image_name}", index, image_name)
+                    else:
+                        fail(f"第{index+1}行: 文件不存在: {image_name}", f"文件不存在: {image_name}", index, image_name)
+                    continue
+                
+                # CSV中指定的相机参数
+                profile_id = manifest['profile'][position]
+                opt_file_for_row = None
+                if profile_id:
+                    if profile_id not in opt_files:
+                        opt_files[profile_id] = find_opt_file(profile_id, camera_dir)
+                    opt_file_for_row = opt_files[profile_id]
+                    if opt_file_for_row is None:
+                        fail(f"第{index+1}行: 未找到相机参数: {profile_id}", f"未找到相机参数: {profile_id}", index,
+                             image_name)
+                        continue
+                
+                # 确定输出路径，使用实际的文件名并保留子文件夹结构
+                output_path = None
+                if output_dir:
+                    root = image_root_of(image_path, catalog, image_roots)
+                    output_path = os.path.join(output_dir, os.path.relpath(image_path, root))
+                
+                stats.record_submitted()
+                yield {
+                    'index': index,
+                    'image_name': image_name,
+                    'image_path': image_path,
+                    'output_path': output_path,
+                    'opt_file': opt_file_for_row,
+                    'latitude': columns['latitude'][position],
+                    'longitude': columns['longitude'][position],
+                    'altitude': columns['altitude'][position],
+                    'roll': columns['roll'][position],
+                    'pitch': columns['pitch'][position],
+                    'yaw': columns['yaw'][position],
+                    'timestamp': manifest['timestamp'][position],
+                    'precomputed': {
+                        'exif_time': manifest['exif_time'][position],
+                        'gps_time': gps_times[position] if gps_times is not None else None,
+                        'lat_dms': manifest['lat_dms'][position],
+                        'lng_dms': manifest['lng_dms'][position],
+                        'altitude_rational': manifest['altitude_rational'][position],
+                        'direction_rational': manifest['direction_rational'][position]
+                    }
+                }
+    
+    log(f"开始处理 {total_rows} 条记录，文件夹中共 {len(image_index.paths)} 张图片...")
+    if workers > 1:
+        if executor == EXECUTOR_THREAD:
+            log(f"并行线程数: {workers}, 最大在途任务数: {max_in_flight or workers * 2}")
+        else:
+            log(f"并行进程数: {workers}")
+    if not chunk_size:
+        # 每个进程大约分到4块，兼顾负载均衡和进程间通信开销
+        chunk_size = max(1, min(64, total_rows // (workers * 4)))
+    start_time = time.perf_counter()
+    stats.start(total_rows)
+    written_paths = []
+    catalog_paths = []
+    worker_stats = {}
+    total_bytes = 0
+    log("-" * 40)
+    
+    # 执行任务，结果按完成顺序返回主进程汇总
+    # 覆盖原图时batch模式也在重命名前fsync，批量刷新只负责目录项
+    fsync_each = fsync == FSYNC_FILE or (fsync == FSYNC_BATCH and not output_dir)
+    options = {'opt_file': opt_file, 'write_mode': write_mode, 'fsync_file': fsync_each,
+               'in_place': in_place, 'threaded': executor == EXECUTOR_THREAD,
+               'camera_dir': camera_dir if auto_camera else None}
+    # 相机参数说明经日志输出（命令行中为标准错误），不混入标准输出的JSON Lines
+    profile = get_camera_profile(opt_file)
+    if profile is not None and profile.describe_focal_length():
+        log(f"相机参数: {os.path.basename(opt_file)}，{profile.describe_focal_length()}")
+    if auto_camera:
+        registry = get_camera_registry(camera_dir)
+        log(f"自动选择相机参数: {camera_dir} 中共 {len(registry)} 个相机")
+    for result in _iter_job_results(generate_jobs(), options, workers, chunk_size, executor, max_in_flight):
+        counters['completed'] += 1
+        stats.record_result(result)
+        update_worker_stats(worker_stats, result)
+        if result_callback:
+            result_callback(result)
+        total_bytes += result['bytes']
+        index = result['index']
+        log(f"第{index+1}行: 处理 {result['image_name']} ({result['latitude']:.6f}, {result['longitude']:.6f})")
+        if result['success']:
+            counters['success'] += 1
+            if output_dir:
+                log(f"  ✓ 成功 (已保存至: {os.path.basename(output_dir)})")
+            else:
+                log(f"  ✓ 成功")
+            # 批量落盘：累计一定数量后统一刷新，内存占用有上限
+            if fsync == FSYNC_BATCH:
+                written_paths.append(result['output_path'])
+                if len(written_paths) >= FSYNC_BATCH_SIZE:
+                    sync_files(written_paths)
+                    written_paths = []
+            if catalog and catalog.root_of(os.path.abspath(result['output_path'])):
+                catalog_paths.append(result['output_path'])
+            # 更新完成进度
+            if progress_callback:
+                progress_callback(f"第{index+1}行: 处理完成", counters['completed'], total_rows)
+        else:
+            counters['failed'] += 1
+            errors.append(result['error'])
+            log(f"  ✗ 失败")
+            # 更新失败进度
+            if progress_callback:
+                progress_callback(f"第{index+1}行: 处理失败", counters['completed'], total_rows)
+        
+        if should_stop and should_stop():
+            log("处理已停止")
+            break
+    
+    if fsync == FSYNC_BATCH and written_paths:
+        sync_files(written_paths)
+    if catalog_paths:
+        # 写入改变了所在目录的修改时间，记录写入后的状态，下次运行不必重新扫描这些目录
+        with ImageCatalog(catalog.roots, catalog.db_path) as written_catalog:
+            written_catalog.record_written(catalog_paths)
+    
+    if manifest_error:
+        errors.append(manifest_error[0])
+    
+    elapsed = time.perf_counter() - start_time
+    log("-" * 40)
+    log(f"处理完成: 成功={counters['success']}, 失败={counters['failed']}, 跳过={counters['skipped']}")
+    if counters['resumed']:
+        log(f"续传: 其中 {counters['resumed']} 条记录在上次运行中已成功，本次跳过")
+    if elapsed > 0:
+        log(f"耗时: {elapsed:.2f}秒, 速度: {counters['success'] / elapsed:.2f} 张/秒, {total_bytes / elapsed / 1024 / 1024:.2f} MB/秒")
+    if workers > 1:
+        label = "线程" if executor == EXECUTOR_THREAD else "进程"
+        for worker, stat in sorted(worker_stats.items()):
+            log(f"  {label}{worker}: {stat['images']}张, 用时{stat['seconds']:.2f}秒, {stat['images_per_sec']:.2f} 张/秒")
+    
+    return {
+        'success': counters['success'],
+        'failed': counters['failed'],
+        'skipped': counters['skipped'],
+        'resumed': counters['resumed'],
+        'errors': errors,
+        'elapsed': elapsed,
+        'bytes': total_bytes,
+        'workers': worker_stats,
+        'manifest_error': manifest_error[0] if manifest_error else None
+    }
+
+def process_images_from_csv(csv_file, image_folder, opt_file=None, progress_callback=None, output_dir=None, write_mode=None, fsync=None,
+                            workers=1, chunk_size=None, executor=None, max_in_flight=None, column_mapping=None, should_stop=None,
+                            chunksize=DEFAULT_CHUNK_ROWS, recursive=False, catalog_path=None, auto_camera=False,
+                            camera_dir=DEFAULT_CAMERA_DIR, rig=None, stats=None, result_callback=None, completed_rows=None,
+                            in_place=False):
     """处理CSV文件并为对应图像添加地理信息
     
     Args:
         csv_file: CSV文件路径
-        image_folder: 图片文件夹路径
+        image_folder: 图片文件夹路径，递归模式下可以是多个根目录的列表
         opt_file: OPT文件路径
         progress_callback: 进度回调函数
         output_dir: 输出文件夹路径，若不提供则覆盖原图
+        write_mode: 写入方式，见set_gps_location
+        fsync: 落盘方式，'none'、'file'(逐个文件)或'batch'(批量统一刷新，默认)
+        workers: 并行处理的进程数，1表示在当前进程中逐个处理
+        chunk_size: 每次分发给工作进程的任务数，默认自动计算
+        executor: 并行方式，'process'(进程池，默认)或'thread'(线程池，适合网络盘上的lossless写入)
+        max_in_flight: 线程池模式下同时在途的最大任务数，默认为workers的2倍
+        column_mapping: 用户列映射（GUI），{'filename', 'latitude', 'longitude', 'altitude', 'profile', 'has_header'}
+        should_stop: 返回True时停止处理的回调函数
+        chunksize: 流式读取CSV时每块的行数，None表示一次读取整个文件
+        recursive: 是否递归查找子文件夹中的图片（使用持久化目录库，只重新扫描有变化的目录）
+        catalog_path: 目录库SQLite文件路径，默认为用户目录下的共用目录库
+        auto_camera: 是否按每张图片的EXIF自动选择camera_dir中的OPT文件，无法确定时使用opt_file
+        camera_dir: 自动选择以及CSV相机参数列（如5100-35）查找OPT文件的目录
+        rig: 多相机组配置（JSON文件路径或字典），提供时每条曝光记录展开为每个相机一张图片
+        stats: RunStats，提供时处理过程中实时累加速度、读写字节数和各阶段耗时，供界面定时读取
+        result_callback: 每条记录处理完成时调用，参数为结果字典（index、image_name、output_path、success、
+                         error、bytes、elapsed等），用于逐张输出结果
+        completed_rows: 上次运行已成功的(行号, 文件名)集合，这些记录直接跳过（续传）
+        in_place: 覆盖原图时是否原地覆盖原有EXIF/XMP段（更快但不是原子操作），见set_gps_location
     """
+    if fsync is None:
+        fsync = DEFAULT_FSYNC
+    if not workers or workers < 1:
+        workers = os.cpu_count() or 1
+    if executor is None:
+        executor = EXECUTOR_PROCESS
     
     def log(message):
         """日志输出函数"""
@@ -361,133 +861,231 @@ def process_images_from_csv(csv_file, image_folder, opt_file=None, progress_call
         else:
             print(message)
     
-    success_count = 0
-    failed_count = 0 
-    skipped_count = 0
-    errors = []
-    
     if not os.path.exists(csv_file):
         error_msg = f"CSV文件不存在: {csv_file}"
         log(error_msg)
         return {'success': 0, 'failed': 1, 'skipped': 0, 'errors': [error_msg]}
     
-    if not os.path.exists(image_folder):
-        error_msg = f"图像文件夹不存在: {image_folder}"
-        log(error_msg)
-        return {'success': 0, 'failed': 1, 'skipped': 0, 'errors': [error_msg]}
+    image_roots = [image_folder] if isinstance(image_folder, str) else list(image_folder)
+    for root in image_roots:
+        if not os.path.exists(root):
+            error_msg = f"图像文件夹不存在: {root}"
+            log(error_msg)
+            return {'success': 0, 'failed': 1, 'skipped': 0, 'errors': [error_msg]}
     
-    # 使用detect_csv_format来检测格式
-    csv_format = detect_csv_format(csv_file)
+    # 使用detect_csv_format来检测格式；提供列映射时以映射中的表头设置为准
+    if column_mapping:
+        csv_format = 'with_header' if column_mapping.get('has_header', True) else 'no_header'
+    else:
+        csv_format = detect_csv_format(csv_file)
     log(f"CSV格式: {csv_format}")
     
+    rig_config = None
+    if rig:
+        try:
+            rig_config = load_rig(rig)
+        except (OSError, ValueError) as e:
+            error_msg = f"读取相机组配置失败: {str(e)}"
+            log(error_msg)
+            return {'success': 0, 'failed': 1, 'skipped': 0, 'errors': [error_msg]}
+    
     try:
-        # 读取CSV文件
-        import pandas as pd
-        if csv_format == 'no_header':
-            df = pd.read_csv(csv_file, header=None)
-            # 无表头格式：文件名,时间,经度,纬度,高度,Pitch,Roll,Yaw
-            columns = ['filename', 'timestamp', 'longitude', 'latitude', 'altitude', 'pitch', 'roll', 'yaw']
-            if len(df.columns) >= 8:
-                df.columns = columns[:len(df.columns)]
-            else:
-                log(f"CSV列数不足，需要至少8列，实际只有{len(df.columns)}列")
-                return {'success': 0, 'failed': 1, 'skipped': 0, 'errors': ['CSV格式错误：列数不足']}
+        # 快速统计行数用于显示进度，CSV在处理的同时分块读取
+        total_rows = count_csv_rows(csv_file, csv_format != 'no_header')
+        if rig_config:
+            log(f"相机组: {rig_config['name'] or '未命名'}，每条记录展开为 {len(rig_config['cameras'])} 张图片")
+            total_rows *= len(rig_config['cameras'])
+        # 只遍历一次图片文件夹（递归模式下增量更新目录库），之后每行在内存索引中查找
+        image_index, catalog = load_image_index(image_roots, recursive, catalog_path, log)
+        manifests = iter_manifest_chunks(csv_file, csv_format, column_mapping, chunksize)
+        # 列数不足等格式错误在读取第一块时抛出，之后各块的错误由_process_manifests处理
+        first = next(manifests, None)
+        if first is not None:
+            manifests = chain([first], manifests)
+    except ValueError as e:
+        log(str(e))
+        return {'success': 0, 'failed': 1, 'skipped': 0, 'errors': [f"CSV格式错误：{str(e)}"]}
+    except Exception as e:
+        error_msg = f"读取CSV文件失败: {str(e)}"
+        log(error_msg)
+        return {'success': 0, 'failed': 1, 'skipped': 0, 'errors': [error_msg]}
+    
+    try:
+        return _process_manifests(manifests, total_rows, image_index, catalog, image_roots, log, progress_callback,
+                                  opt_file, output_dir, write_mode, fsync, workers, chunk_size, executor,
+                                  max_in_flight, should_stop, auto_camera, camera_dir, rig_config, stats,
+                                  result_callback, completed_rows, in_place)
+    except Exception as e:
+        error_msg = f"处理失败: {str(e)}"
+        log(error_msg)
+        return {'success': 0, 'failed': 1, 'skipped': 0, 'errors': [error_msg]}
+
+def process_images_from_track(track_file, image_folder, opt_file=None, progress_callback=None, output_dir=None,
+                              write_mode=None, fsync=None, workers=1, chunk_size=None, executor=None,
+                              max_in_flight=None, should_stop=None, recursive=False, catalog_path=None,
+                              auto_camera=False, camera_dir=DEFAULT_CAMERA_DIR, time_offset=0.0,
+                              max_gap=DEFAULT_MAX_GAP, estimate_offset=False, offset_range=DEFAULT_OFFSET_RANGE,
+                              control_file=None, min_confidence=LOW_CONFIDENCE, stats=None, in_place=False):
+    """按拍摄时间在GPS轨迹上插值，为文件夹中的所有图片添加地理信息
+    
+    每张图片只读取头部EXIF中的拍摄时间，所有图片一次向量化插值后交给与CSV清单相同的写入流程。
+    
+    Args:
+        track_file: 轨迹文件路径：CSV（时间、经度、纬度，可选高度和姿态）、GPX、KML或NMEA
+        image_folder: 图片文件夹路径，递归模式下可以是多个根目录的列表
+        time_offset: 相机时间加上该秒数得到轨迹时间，例如相机为北京时间、轨迹为UTC时为-28800
+        max_gap: 前后两个轨迹点间隔超过该秒数时视为轨迹中断，不插值
+        estimate_offset: 是否在time_offset前后offset_range秒内自动估计相机时钟偏移
+        offset_range: 自动估计时的搜索范围(秒)
+        control_file: 控制照片CSV（文件名、纬度、经度），提供时按已知位置估计偏移
+        min_confidence: 估计结果的置信度低于该值时不应用，仍使用time_offset
+        其余参数见process_images_from_csv
+    """
+    if fsync is None:
+        fsync = DEFAULT_FSYNC
+    if not workers or workers < 1:
+        workers = os.cpu_count() or 1
+    if executor is None:
+        executor = EXECUTOR_PROCESS
+    
+    def log(message):
+        """日志输出函数"""
+        if progress_callback:
+            progress_callback(message)
         else:
-            df = pd.read_csv(csv_file)
+            print(message)
+    
+    if not os.path.exists(track_file):
+        error_msg = f"轨迹文件不存在: {track_file}"
+        log(error_msg)
+        return {'success': 0, 'failed': 1, 'skipped': 0, 'errors': [error_msg]}
+    
+    image_roots = [image_folder] if isinstance(image_folder, str) else list(image_folder)
+    for root in image_roots:
+        if not os.path.exists(root):
+            error_msg = f"图像文件夹不存在: {root}"
+            log(error_msg)
+            return {'success': 0, 'failed': 1, 'skipped': 0, 'errors': [error_msg]}
+    
+    try:
+        track = load_track(track_file)
+    except Exception as e:
+        error_msg = f"读取轨迹文件失败: {str(e)}"
+        log(error_msg)
+        return {'success': 0, 'failed': 1, 'skipped': 0, 'errors': [error_msg]}
+    log(f"轨迹点数: {len(track['time'])}，时长 {track['time'][-1] - track['time'][0]:.1f} 秒"
+        + ("" if track['attitude'] else "，不含姿态"))
+    
+    try:
+        image_index, catalog = load_image_index(image_roots, recursive, catalog_path, log)
+        paths = sorted(image_index.paths)
+        names = [os.path.relpath(path, image_root_of(path, catalog, image_roots)) for path in paths]
+        capture_texts, capture_times = read_capture_times(paths)
         
-        total_rows = len(df)
-        log(f"开始处理 {total_rows} 条记录...")
-        log("-" * 40)
+        # 插值前估计并应用相机时钟偏移
+        if estimate_offset or control_file:
+            control = None
+            if control_file:
+                control = load_control_photos(control_file, image_index, dict(zip(paths, capture_times)))
+                log(f"控制照片: {len(control['time'])} 张")
+            estimate = estimate_time_offset(track, capture_times, time_offset, offset_range, control=control,
+                                            max_gap=max_gap)
+            log(describe_offset(estimate))
+            if estimate is not None and estimate['confidence'] >= min_confidence:
+                time_offset = estimate['offset']
+            elif estimate is not None:
+                log(f"置信度低于{min_confidence:.0%}，不应用估计结果，使用初始偏移 {time_offset:+.1f} 秒")
         
-        for index, row in df.iterrows():
-            try:
-                # 更新进度
-                if progress_callback:
-                    progress_callback(f"第{index+1}行: 正在处理...", index, total_rows)
-                # 根据格式提取数据
-                if csv_format == 'no_header':
-                    image_name = str(row['filename']).strip()
-                    timestamp = str(row['timestamp']).strip()
-                    longitude = float(row['longitude'])
-                    latitude = float(row['latitude'])
-                    altitude = float(row['altitude']) if pd.notna(row['altitude']) else 0
-                    pitch = float(row['pitch']) if pd.notna(row['pitch']) else 0
-                    roll = float(row['roll']) if pd.notna(row['roll']) else 0
-                    yaw = float(row['yaw']) if pd.notna(row['yaw']) else 0
-                else:
-                    # 带表头的处理方式
-                    image_name = str(row.get('文件名', row.get('filename', ''))).strip()
-                    timestamp = str(row.get('时间', row.get('timestamp', ''))).strip()
-                    longitude = float(row.get('经度', row.get('longitude', 0)))
-                    latitude = float(row.get('纬度', row.get('latitude', 0)))
-                    altitude = float(row.get('高度', row.get('altitude', 0))) if pd.notna(row.get('高度', row.get('altitude', 0))) else 0
-                    pitch = float(row.get('Pitch', row.get('pitch', 0))) if pd.notna(row.get('Pitch', row.get('pitch', 0))) else 0
-                    roll = float(row.get('Roll', row.get('roll', 0))) if pd.notna(row.get('Roll', row.get('roll', 0))) else 0
-                    yaw = float(row.get('Yaw', row.get('yaw', row.get('方向角', 0)))) if pd.notna(row.get('Yaw', row.get('yaw', row.get('方向角', 0)))) else 0
-                
-                if not image_name:
-                    log(f"第{index+1}行: 文件名为空，跳过")
-                    skipped_count += 1
-                    continue
-                
-                # 构建完整的图像路径
-                image_path = os.path.join(image_folder, image_name)
-                
-                # 检查文件是否存在
-                if not os.path.isfile(image_path):
-                    if not image_path.lower().endswith(('.jpg', '.jpeg')):
-                        image_path = f"{image_path}.jpg"
-                    
-                    if not os.path.isfile(image_path):
-                        log(f"第{index+1}行: 文件不存在: {image_name}")
-                        failed_count += 1
-                        errors.append(f"文件不存在: {image_name}")
-                        continue
-                
-                # 处理图像
-                log(f"第{index+1}行: 处理 {image_name} ({latitude:.6f}, {longitude:.6f})")
-                
-                # 确定输出路径
-                output_path = None
-                if output_dir:
-                    output_path = os.path.join(output_dir, image_name)
-                
-                if set_gps_location(image_path, latitude, longitude, altitude, roll, pitch, yaw, timestamp, opt_file, output_path):
-                    success_count += 1
-                    if output_path:
-                        log(f"  ✓ 成功 (已保存至: {os.path.basename(output_dir)})")
-                    else:
-                        log(f"  ✓ 成功")
-                    # 更新完成进度
-                    if progress_callback:
-                        progress_callback(f"第{index+1}行: 处理完成", index + 1, total_rows)
-                else:
-                    failed_count += 1
-                    errors.append(f"EXIF写入失败: {image_name}")
-                    log(f"  ✗ 失败")
-                    # 更新失败进度
-                    if progress_callback:
-                        progress_callback(f"第{index+1}行: 处理失败", index + 1, total_rows)
-                    
-            except Exception as e:
-                failed_count += 1
-                errors.append(f"第{index+1}行处理错误: {str(e)}")
-                log(f"第{index+1}行: 错误 - {str(e)}")
-        
-        log("-" * 40)
-        log(f"处理完成: 成功={success_count}, 失败={failed_count}, 跳过={skipped_count}")
+        manifest = build_track_manifest(paths, names, capture_texts, capture_times, track, time_offset, max_gap)
         
+        no_time = int(np.isnan(capture_times).sum())
+        outside = int((~manifest['valid']).sum()) - no_time
+        if no_time:
+            log(f"⚠️ {no_time} 张图片没有拍摄时间(DateTimeOriginal)")
+        if outside:
+            log(f"⚠️ {outside} 张图片的拍摄时间不在轨迹范围内或轨迹中断超过{max_gap}秒")
+        if time_offset:
+            log(f"时间偏移: {time_offset:+.1f} 秒")
+        result = _process_manifests([(0, manifest)], manifest['count'], image_index, catalog, image_roots, log,
+                                    progress_callback, opt_file, output_dir, write_mode, fsync, workers, chunk_size,
+                                    executor, max_in_flight, should_stop, auto_camera, camera_dir, stats=stats,
+                                    in_place=in_place)
+        result['time_offset'] = time_offset
+        return result
     except Exception as e:
-        error_msg = f"读取CSV文件失败: {str(e)}"
+        error_msg = f"轨迹插值失败: {str(e)}"
         log(error_msg)
         return {'success': 0, 'failed': 1, 'skipped': 0, 'errors': [error_msg]}
+
+def export_geotags_to_csv(image_folder, csv_path, recursive=False, catalog_path=None, workers=DEFAULT_READ_WORKERS,
+                          progress_callback=None):
+    """将文件夹中图片已有的地理信息导出为CSV
     
-    return {
-        'success': success_count,
-        'failed': failed_count,
-        'skipped': skipped_count,
-        'errors': errors
-    }
+    只读取每张图片头部的EXIF/XMP段，输出格式与示例CSV相同，可直接用于process_images_from_csv，
+    例如把已处理的图片的POS导出备份，或修改后重新写入。
+    
+    Args:
+        image_folder: 图片文件夹路径，递归模式下可以是多个根目录的列表
+        csv_path: 输出CSV文件路径
+        recursive: 是否包含子文件夹，文件名列写入相对路径
+        catalog_path: 目录库SQLite文件路径
+        workers: 读取线程数
+        progress_callback: 进度回调函数
+    
+    Returns:
+        dict: {'exported': 导出数, 'missing': 没有经纬度的数量, 'failed': 读取失败的数量}
+    """
+    def log(message):
+        """日志输出函数"""
+        if progress_callback:
+            progress_callback(message)
+        else:
+            print(message)
+    
+    image_roots = [image_folder] if isinstance(image_folder, str) else list(image_folder)
+    for root in image_roots:
+        if not os.path.exists(root):
+            log(f"图像文件夹不存在: {root}")
+            return {'exported': 0, 'missing': 0, 'failed': 0}
+    
+    image_index, catalog = load_image_index(image_roots, recursive, catalog_path, log)
+    paths = sorted(image_index.paths)
+    names = [os.path.relpath(path, image_root_of(path, catalog, image_roots)) for path in paths]
+    log(f"读取 {len(paths)} 张图片的地理信息...")
+    return dump_geotags(paths, csv_path, names, workers, log)
+
+def benchmark_write_modes(image_path, repeat=5, opt_file=None):
+    """对比两种写入方式的速度（张/秒）
+
+    将同一张图片重复写入临时目录，分别统计lossless和reencode模式的吞吐量。
+
+    Args:
+        image_path: 用于测试的JPEG图片
+        repeat: 每种模式的重复次数
+        opt_file: OPT文件路径
+
+    Returns:
+        dict: {写入方式: 张/秒}
+    """
+    results = {}
+    temp_dir = tempfile.mkdtemp(prefix="gps_bench_")
+    try:
+        for mode in (WRITE_MODE_REENCODE, WRITE_MODE_LOSSLESS):
+            start = time.perf_counter()
+            for i in range(repeat):
+                output_path = os.path.join(temp_dir, f"{mode}_{i}.jpg")
+                set_gps_location(image_path, 39.9042135, 116.4074582, 100.25, 15.2, 8.7, 45.0,
+                                 '2024-08-18 10:30:00', opt_file, output_path, mode)
+            elapsed = time.perf_counter() - start
+            results[mode] = repeat / elapsed if elapsed > 0 else 0
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    for mode, rate in results.items():
+        print(f"{mode}: {rate:.2f} 张/秒")
+    if results.get(WRITE_MODE_REENCODE):
+        print(f"加速比: {results[WRITE_MODE_LOSSLESS] / results[WRITE_MODE_REENCODE]:.1f}x")
+    return results
 
 def create_sample_csv(csv_path):
     """创建一个示例CSV文件"""
@@ -522,6 +1120,201 @@ def create_sample_csv(csv_path):
     
     print(f"已创建示例CSV文件: {csv_path}")
 
+def build_arg_parser():
+    """命令行参数定义"""
+    parser = argparse.ArgumentParser(
+        description="按CSV清单批量为图片写入地理信息（非交互模式）。"
+                    "标准输出为JSON Lines：每张图片一行结果，最后一行为汇总统计；日志输出到标准错误。"
+                    "不带参数运行时进入交互菜单。")
+    parser.add_argument('csv_file', help="CSV清单文件")
+    parser.add_argument('image_folder', nargs='+', help="图片文件夹，递归模式下可以指定多个根目录")
+    parser.add_argument('-o', '--output-dir', help="输出文件夹，不指定时覆盖原图")
+    parser.add_argument('--opt', dest='opt_file', help="相机参数OPT文件")
+    parser.add_argument('--auto-camera', action='store_true', help="按图片EXIF自动选择相机参数目录中的OPT文件")
+    parser.add_argument('--camera-dir', default=DEFAULT_CAMERA_DIR,
+                        help=f"相机参数目录，用于自动选择和CSV相机参数列 (默认: {DEFAULT_CAMERA_DIR})")
+    parser.add_argument('--rig', help="多相机组配置JSON文件")
+    parser.add_argument('-j', '--workers', type=int, default=0, help="并行数，0表示CPU核数 (默认: 0)")
+    parser.add_argument('--executor', choices=(EXECUTOR_PROCESS, EXECUTOR_THREAD), default=EXECUTOR_PROCESS,
+                        help="并行方式：进程池或线程池（网络盘上的lossless写入建议使用thread）")
+    parser.add_argument('--max-in-flight', type=int, help="线程池模式下同时在途的最大任务数")
+    parser.add_argument('--chunk-size', type=int, help="每次分发给工作进程的任务数，默认自动计算")
+    parser.add_argument('--write-mode', choices=(WRITE_MODE_LOSSLESS, WRITE_MODE_REENCODE), default=DEFAULT_WRITE_MODE,
+                        help=f"写入方式 (默认: {DEFAULT_WRITE_MODE})")
+    parser.add_argument('--fsync', choices=(FSYNC_NONE, FSYNC_FILE, FSYNC_BATCH), default=DEFAULT_FSYNC,
+                        help=f"落盘方式 (默认: {DEFAULT_FSYNC}；覆盖原图时batch也逐个文件fsync)")
+    parser.add_argument('--in-place', action='store_true',
+                        help="覆盖原图且原有EXIF/XMP段空间足够时原地写入，不重写整个文件。"
+                             "更快但不是原子操作，中途断电可能损坏元数据")
+    parser.add_argument('-r', '--recursive', action='store_true', help="包含子文件夹中的图片")
+    parser.add_argument('--catalog', dest='catalog_path', help="递归模式使用的目录库SQLite文件")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS,
+                        help=f"流式读取CSV时每块的行数 (默认: {DEFAULT_CHUNK_ROWS})")
+    parser.add_argument('--journal', help="将每张图片的结果追加写入该JSON Lines文件")
+    parser.add_argument('--resume', action='store_true', help="跳过--journal中记录为成功的图片，从中断处继续")
+    parser.add_argument('-q', '--quiet', action='store_true', help="不输出日志，只输出JSON Lines")
+    return parser
+
+def load_journal(journal_path):
+    """
+    读取结果日志中已成功的记录，用于续传
+
+    Returns:
+        set: {(行号(从0开始), 文件名)}
+    """
+    completed = set()
+    if not os.path.exists(journal_path):
+        return completed
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # 上次中断时最后一行可能不完整
+            if record.get('type') == 'image' and record.get('status') == 'ok':
+                completed.add((record['row'] - 1, record['image']))
+    return completed
+
+def _result_record(result):
+    """将任务结果转换为JSON Lines中的一行"""
+    if result.get('skipped'):
+        status = 'skipped'
+    else:
+        status = 'ok' if result['success'] else 'failed'
+    return {
+        'type': 'image',
+        'row': result['index'] + 1,
+        'image': result['image_name'],
+        'status': status,
+        'output': result['output_path'],
+        'error': result['error'],
+        'ms': round(result['elapsed'] * 1000, 3),
+        'bytes': result['bytes'],
+    }
+
+def _detach_stdout():
+    """
+    把标准输出留给JSON Lines：复制一份原来的标准输出用于写结果，
+    再把文件描述符1指向标准错误，使日志和调试输出（包括工作进程中的print）不会混入结果
+
+    Returns:
+        tuple: (结果输出流, 恢复函数)
+    """
+    original = sys.stdout
+    original.flush()
+    try:
+        stdout_fd = original.fileno()
+        saved_fd = os.dup(stdout_fd)
+        os.dup2(sys.stderr.fileno(), stdout_fd)
+    except (AttributeError, OSError, ValueError):
+        # 标准输出不是真实文件（如被替换为StringIO）时只在Python层面重定向
+        sys.stdout = sys.stderr
+        return original, lambda: setattr(sys, 'stdout', original)
+    stream = open(os.dup(saved_fd), 'w', encoding='utf-8', buffering=1)
+    sys.stdout = sys.stderr
+    
+    def restore():
+        stream.close()
+        original.flush()
+        os.dup2(saved_fd, stdout_fd)
+        os.close(saved_fd)
+        sys.stdout = original
+    return stream, restore
+
+def run_cli(argv=None):
+    """
+    非交互命令行入口，适合定时任务和数据处理流水线
+
+    Returns:
+        int: 退出码，见EXIT_*
+    """
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.resume and not args.journal:
+        parser.error("--resume 需要同时指定 --journal")
+    
+    completed_rows = load_journal(args.journal) if args.resume else None
+    stop_requested = threading.Event()
+    
+    def request_stop(signum, frame):
+        stop_requested.set()
+    
+    previous_handlers = {}
+    for signum in (signal.SIGINT, getattr(signal, 'SIGTERM', None)):
+        if signum is not None:
+            previous_handlers[signum] = signal.signal(signum, request_stop)
+    
+    out, restore_stdout = _detach_stdout()
+    journal = open(args.journal, 'a', encoding='utf-8') if args.journal else None
+    try:
+        def log(message, current=None, total=None):
+            if current is None and not args.quiet:
+                print(message, file=sys.stderr)
+        
+        def emit(result):
+            line = json.dumps(_result_record(result), ensure_ascii=False) + "\n"
+            out.write(line)
+            if journal:
+                journal.write(line)
+        
+        if completed_rows:
+            log(f"续传: 结果日志中已有 {len(completed_rows)} 条成功记录")
+        stats = RunStats()
+        image_folder = args.image_folder[0] if len(args.image_folder) == 1 else args.image_folder
+        result = process_images_from_csv(
+            args.csv_file, image_folder, opt_file=args.opt_file, progress_callback=log,
+            output_dir=args.output_dir, write_mode=args.write_mode, fsync=args.fsync, workers=args.workers,
+            chunk_size=args.chunk_size, executor=args.executor, max_in_flight=args.max_in_flight,
+            should_stop=stop_requested.is_set, chunksize=args.chunk_rows, recursive=args.recursive,
+            catalog_path=args.catalog_path, auto_camera=args.auto_camera, camera_dir=args.camera_dir,
+            rig=args.rig, stats=stats, result_callback=emit, completed_rows=completed_rows,
+            in_place=args.in_place)
+        
+        # 只有写入流程的结果带有'elapsed'，没有时说明在开始处理前就已出错
+        if 'elapsed' not in result:
+            exit_code = EXIT_ERROR
+        elif stop_requested.is_set():
+            exit_code = EXIT_STOPPED
+        elif result['failed'] or result.get('manifest_error'):
+            # CSV后面某块读取出错时已处理的图片照常输出，剩余记录未处理，按失败退出
+            exit_code = EXIT_FAILURES
+        else:
+            exit_code = EXIT_OK
+        
+        # 计数取自运行统计（与逐张输出的记录一致），开始处理前出错时错误信息放在'error'中
+        snapshot = stats.snapshot()
+        elapsed = result.get('elapsed', 0.0)
+        error = result.get('manifest_error')
+        if exit_code == EXIT_ERROR and result['errors']:
+            error = result['errors'][0]
+        summary = {
+            'type': 'summary',
+            'exit_code': exit_code,
+            'stopped': stop_requested.is_set(),
+            'error': error,
+            'total': snapshot['total'],
+            'success': snapshot['success'],
+            'failed': snapshot['failed'],
+            'skipped': snapshot['skipped'],
+            'resumed': result.get('resumed', 0),
+            'elapsed': round(elapsed, 3),
+            'images_per_sec': round(snapshot['success'] / elapsed, 3) if elapsed > 0 else 0.0,
+            'read_mb_per_sec': round(snapshot['read_mb_per_sec'], 3),
+            'write_mb_per_sec': round(snapshot['write_mb_per_sec'], 3),
+            'latency_ms': stats.latency_percentiles(),
+            'stage_ms': {stage: round(ms, 3) for stage, ms in snapshot['stage_ms'].items()},
+            'error_count': len(result['errors']),
+            'errors': result['errors'][:CLI_MAX_ERRORS],
+        }
+        out.write(json.dumps(summary, ensure_ascii=False) + "\n")
+        return exit_code
+    finally:
+        if journal:
+            journal.close()
+        restore_stdout()
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+
 def main():
     """主函数"""
     print("=" * 40)
@@ -531,28 +1324,73 @@ def main():
     while True:
         print("\n请选择操作:")
         print("1. 批量处理图片")
-        print("2. 创建示例CSV文件")
-        print("3. 退出")
+        print("2. 按GPS轨迹和拍摄时间批量处理图片")
+        print("3. 创建示例CSV文件")
+        print("4. 写入方式性能对比")
+        print("5. 导出图片已有的地理信息到CSV")
+        print("6. 退出")
         
-        choice = input("\n请输入选择 (1-3): ").strip()
+        choice = input("\n请输入选择 (1-6): ").strip()
         
         if choice == '1':
             csv_file = input("请输入CSV文件路径: ").strip().strip('"')
             image_folder = input("请输入图像文件夹路径: ").strip().strip('"')
             
+            recursive = input("是否包含子文件夹? (y/N): ").strip().lower() == 'y'
+            auto_camera = input(f"是否按机型自动选择{DEFAULT_CAMERA_DIR}中的相机参数? (y/N): ").strip().lower() == 'y'
+            
             if csv_file and image_folder:
-                process_images_from_csv(csv_file, image_folder)
+                process_images_from_csv(csv_file, image_folder, recursive=recursive, auto_camera=auto_camera)
             else:
                 print("路径不能为空!")
                 
         elif choice == '2':
+            track_file = input("请输入轨迹文件路径 (CSV/GPX/KML/NMEA): ").strip().strip('"')
+            image_folder = input("请输入图像文件夹路径: ").strip().strip('"')
+            
+            recursive = input("是否包含子文件夹? (y/N): ").strip().lower() == 'y'
+            offset_text = input("相机时间与轨迹时间的偏移秒数 (轨迹时间 = 相机时间 + 偏移，默认0): ").strip()
+            try:
+                time_offset = float(offset_text) if offset_text else 0.0
+            except ValueError:
+                print("偏移秒数无效!")
+                continue
+            estimate_offset = input(f"是否在该偏移前后{DEFAULT_OFFSET_RANGE:.0f}秒内自动估计相机时钟偏移? (y/N): ").strip().lower() == 'y'
+            control_file = None
+            if estimate_offset:
+                control_file = input("控制照片CSV路径 (文件名,纬度,经度；直接回车按照片间距估计): ").strip().strip('"') or None
+            
+            if track_file and image_folder:
+                process_images_from_track(track_file, image_folder, recursive=recursive, time_offset=time_offset,
+                                          estimate_offset=estimate_offset, control_file=control_file)
+            else:
+                print("路径不能为空!")
+                
+        elif choice == '3':
             csv_path = input("请输入要创建的CSV文件路径 (如: sample.csv): ").strip().strip('"')
             if csv_path:
                 create_sample_csv(csv_path)
             else:
                 print("文件路径不能为空!")
                 
-        elif choice == '3':
+        elif choice == '4':
+            image_path = input("请输入测试图片路径: ").strip().strip('"')
+            if image_path and os.path.isfile(image_path):
+                benchmark_write_modes(image_path)
+            else:
+                print("图片不存在!")
+                
+        elif choice == '5':
+            image_folder = input("请输入图像文件夹路径: ").strip().strip('"')
+            csv_path = input("请输入导出的CSV文件路径: ").strip().strip('"')
+            recursive = input("是否包含子文件夹? (y/N): ").strip().lower() == 'y'
+            
+            if image_folder and csv_path:
+                export_geotags_to_csv(image_folder, csv_path, recursive=recursive)
+            else:
+                print("路径不能为空!")
+                
+        elif choice == '6':
             print("再见!")
             break
             
@@ -560,4 +1398,8 @@ def main():
             print("无效选择，请重新输入!")
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    # 带参数时为非交互命令行模式，否则进入交互菜单
+    if len(sys.argv) > 1:
+        sys.exit(run_cli())
     main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相机参数配置缓存
+每个OPT文件只解析一次，预先计算焦距、35mm等效焦距、EXIF有理数、DewarpData和XMP属性片段，
+按路径+修改时间缓存（LRU），批量处理时每张图片直接复用，不再重复解析XML。
+"""
+
+import os
+from collections import OrderedDict
+from fractions import Fraction
+from xml.sax.saxutils import quoteattr
+
+try:
+    from opt_converter import parse_opt_file, convert_opt_to_dji_dewarp
+    OPT_CONVERTER_AVAILABLE = True
+except ImportError:
+    OPT_CONVERTER_AVAILABLE = False
+
+# 最多缓存的相机参数数量，超出时淘汰最久未使用的
+PROFILE_CACHE_SIZE = 32
+
+# 已加载的相机参数（LRU）: {OPT文件绝对路径: CameraProfile}
+_profiles = OrderedDict()
+
+
+class CameraProfile:
+    """
+    一个相机（OPT文件）预先计算好的写入参数
+
+    Attributes:
+        path: OPT文件路径，由opt_data直接创建时为None
+        mtime_ns: 加载时OPT文件的修改时间
+        opt_data: parse_opt_file返回的原始参数
+        make/model/lens_model: OPT中记录的相机EXIF信息，未记录时为空字符串
+        width/height: 图像尺寸，未记录时为None
+        focal_length: 实际焦距(mm)，没有时为None
+        focal_length_35mm: 35mm等效焦距(mm)，传感器尺寸缺失时为None
+        focal_rational: EXIF FocalLength有理数(分子, 分母)
+        dewarp_data: DJI DewarpData字符串
+        xmp_attributes: 写入drone-dji命名空间的畸变和标定属性 {属性名: 值}
+        xmp_fragment: 相机相关的XMP属性片段，可直接拼接到rdf:Description中
+    """
+
+    def __init__(self, opt_data, path=None, mtime_ns=None):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.opt_data = opt_data or {}
+        self.name = self.opt_data.get('Name')
+        exif = self.opt_data.get('Exif') or {}
+        self.make = (exif.get('Make') or '').strip()
+        self.model = (exif.get('Model') or '').strip()
+        self.lens_model = (exif.get('LensModel') or '').strip()
+        self.width = self.opt_data.get('Width')
+        self.height = self.opt_data.get('Height')
+
+        self.focal_length = self.opt_data.get('FocalLength') or None
+        self.focal_length_35mm = None
+        self.focal_rational = None
+        if self.focal_length is not None:
+            fraction = Fraction(self.focal_length).limit_denominator(1000)
+            self.focal_rational = (fraction.numerator, fraction.denominator)
+            sensor_size = self.opt_data.get('SensorSize', 0)
+            if sensor_size and sensor_size > 0:
+                # 35mm等效焦距 = 实际焦距 × (35 / 传感器尺寸)
+                self.focal_length_35mm = int(round(self.focal_length * (35.0 / sensor_size)))
+
+        self.dewarp_data = None
+        self.xmp_attributes = {}
+        if 'Distortion' in self.opt_data and 'PrincipalPoint' in self.opt_data:
+            self.dewarp_data = convert_opt_to_dji_dewarp(self.opt_data) if OPT_CONVERTER_AVAILABLE else None
+            if self.dewarp_data:
+                self.xmp_attributes['drone-dji:DewarpData'] = self.dewarp_data
+                self.xmp_attributes['drone-dji:DewarpFlag'] = "0"  # 0表示需要校正
+            self.xmp_attributes['drone-dji:CalibratedFocalLength'] = str(self.opt_data['FocalLength'])
+            self.xmp_attributes['drone-dji:CalibratedOpticalCenterX'] = str(self.opt_data['PrincipalPoint']['X'])
+            self.xmp_attributes['drone-dji:CalibratedOpticalCenterY'] = str(self.opt_data['PrincipalPoint']['Y'])
+
+        self.xmp_fragment = self._render_fragment()
+
+    def _render_fragment(self):
+        """将焦距和畸变参数渲染为以换行开头的XMP属性片段"""
+        attributes = []
+        if self.focal_length is not None:
+            attributes.append(('exif:FocalLength', f"{self.focal_length}"))
+            if self.focal_length_35mm is not None:
+                attributes.append(('exif:FocalLengthIn35mmFilm', f"{self.focal_length_35mm}"))
+        attributes.extend(self.xmp_attributes.items())
+        return ''.join(f"\n    {name}={quoteattr(value)}" for name, value in attributes)
+
+    def describe_focal_length(self):
+        """焦距说明，供调用方写入日志；没有焦距时返回None"""
+        if self.focal_length_35mm is not None:
+            return (f"35mm等效焦距: {self.focal_length_35mm}mm (实际焦距: {self.focal_length}mm, "
+                    f"传感器尺寸: {self.opt_data.get('SensorSize')}mm)")
+        if self.focal_length is not None:
+            return "无法计算35mm等效焦距: 传感器尺寸缺失或无效"
+        return None
+
+    def __repr__(self):
+        return f"CameraProfile({self.name!r}, focal={self.focal_length}, path={self.path!r})"
+
+
+def get_camera_profile(opt_file):
+    """
+    获取OPT文件对应的相机参数，同一文件未修改时直接返回缓存
+
+    Args:
+        opt_file: OPT文件路径
+
+    Returns:
+        CameraProfile: 相机参数；没有OPT文件、文件不存在或解析失败时返回None
+    """
+    if not opt_file or not OPT_CONVERTER_AVAILABLE:
+        return None
+    key = os.path.abspath(opt_file)
+    try:
+        mtime_ns = os.stat(key).st_mtime_ns
+    except OSError:
+        return None
+
+    profile = _profiles.get(key)
+    if profile is not None and profile.mtime_ns == mtime_ns:
+        _profiles.move_to_end(key)
+        return profile
+
+    opt_data = parse_opt_file(key)
+    if not opt_data:
+        return None
+    profile = CameraProfile(opt_data, key, mtime_ns)
+    _profiles[key] = profile
+    _profiles.move_to_end(key)
+    while len(_profiles) > PROFILE_CACHE_SIZE:
+        _profiles.popitem(last=False)
+    return profile
+
+
+def clear_profile_cache():
+    """清空已加载的相机参数缓存"""
+    _profiles.clear()
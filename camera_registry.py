@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相机参数库
+索引cameraInfo目录中的所有OPT文件（EXIF Make/Model/LensModel和图像尺寸），
+按每张图片头部的EXIF和帧尺寸自动选择对应的相机参数，
+混合机型的任务一次处理完成。匹配结果按图片特征缓存，同一机型只计算一次。
+也可以由CSV中的相机参数列按文件名直接指定OPT文件。
+"""
+
+import os
+import sys
+
+from camera_profile import get_camera_profile
+from exif_reader import rational_to_float
+
+try:
+    from opt_converter import get_available_opt_files
+except ImportError:
+    get_available_opt_files = None
+
+# 默认的OPT文件目录
+DEFAULT_CAMERA_DIR = "cameraInfo"
+
+# OPT中表示“未记录”的取值
+UNKNOWN_VALUES = ('', '----', 'unknown')
+
+# 已建立的参数库: {目录绝对路径: CameraRegistry}
+_registries = {}
+
+# OPT文件名列表: {目录绝对路径: (目录修改时间, {小写文件名主干: OPT文件路径})}
+_opt_listings = {}
+
+
+def _normalize(value):
+    """统一EXIF字符串：bytes解码、去除结尾的\\x00和空白、转小写；未记录的值返回空字符串"""
+    if value is None:
+        return ''
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', errors='replace')
+    value = value.strip('\x00').strip().lower()
+    return '' if value in UNKNOWN_VALUES else value
+
+
+def image_camera_key(exif_dict, frame_size=None):
+    """
+    从EXIF字典和帧尺寸提取用于匹配相机的特征
+
+    Args:
+        exif_dict: piexif格式的EXIF字典
+        frame_size: JPEG帧头中的(宽, 高)，没有时使用EXIF中的像素尺寸
+
+    Returns:
+        tuple: (make, model, lens_model, 宽, 高, 焦距)
+    """
+    zeroth = exif_dict.get('0th') or {}
+    exif = exif_dict.get('Exif') or {}
+    width, height = frame_size or (exif.get(40962), exif.get(40963))  # PixelXDimension/PixelYDimension
+    focal = rational_to_float(exif.get(37386))  # FocalLength
+    return (_normalize(zeroth.get(271)), _normalize(zeroth.get(272)), _normalize(exif.get(42036)),
+            width, height, round(focal, 1) if focal else None)
+
+
+class CameraRegistry:
+    """
+    OPT相机参数库
+
+    Args:
+        directory: 存放OPT文件的目录
+    """
+
+    def __init__(self, directory=DEFAULT_CAMERA_DIR):
+        self.directory = os.path.abspath(directory)
+        try:
+            self.mtime_ns = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            self.mtime_ns = None
+        self.profiles = []
+        self._lookup = {}  # 图片特征 -> CameraProfile或None
+        self._load()
+
+    def _load(self):
+        """加载目录中的所有OPT文件，内容完全相同的文件（如default.opt）只保留一个"""
+        if get_available_opt_files is None or self.mtime_ns is None:
+            return
+        for opt_file in sorted(get_available_opt_files(self.directory)):
+            profile = get_camera_profile(opt_file)
+            if profile is None:
+                continue
+            if any(existing.opt_data == profile.opt_data for existing in self.profiles):
+                continue
+            self.profiles.append(profile)
+
+    def __len__(self):
+        return len(self.profiles)
+
+    @staticmethod
+    def _score(profile, make, model, lens_model, width, height):
+        """
+        计算相机参数与图片特征的匹配程度
+
+        Returns:
+            int: 一致的字段数；尺寸或已记录的字段与图片不一致时返回None
+        """
+        score = 0
+        if profile.width and profile.height and width and height:
+            if {profile.width, profile.height} != {width, height}:
+                return None
+            score += 1
+        for expected, actual in ((profile.make, make), (profile.model, model), (profile.lens_model, lens_model)):
+            expected = _normalize(expected)
+            if not expected or not actual:
+                continue
+            if expected != actual:
+                return None
+            score += 1
+        return score
+
+    def match(self, key):
+        """
+        按图片特征选择相机参数，结果按特征缓存
+
+        同样匹配的多个OPT（如同一机身配不同镜头）按焦距最接近的选择，
+        无法区分时返回None，由调用方使用默认OPT。
+
+        Args:
+            key: image_camera_key的返回值
+
+        Returns:
+            CameraProfile: 匹配的相机参数，没有匹配或无法确定时返回None
+        """
+        if key in self._lookup:
+            return self._lookup[key]
+
+        make, model, lens_model, width, height, focal = key
+        candidates = []
+        for profile in self.profiles:
+            score = self._score(profile, make, model, lens_model, width, height)
+            if score:
+                candidates.append((score, profile))
+
+        profile = None
+        if candidates:
+            best = max(score for score, _ in candidates)
+            candidates = [candidate for score, candidate in candidates if score == best]
+            if len(candidates) > 1 and focal:
+                distances = sorted((abs(candidate.focal_length - focal), index)
+                                   for index, candidate in enumerate(candidates) if candidate.focal_length)
+                if distances and (len(distances) == 1 or distances[0][0] < distances[1][0]):
+                    candidates = [candidates[distances[0][1]]]
+            if len(candidates) == 1:
+                profile = candidates[0]
+
+        self._lookup[key] = profile
+        return profile
+
+    def match_image(self, exif_dict, frame_size=None):
+        """按图片的EXIF字典和帧尺寸选择相机参数"""
+        return self.match(image_camera_key(exif_dict, frame_size))
+
+
+def get_camera_registry(directory=DEFAULT_CAMERA_DIR):
+    """
+    获取目录对应的相机参数库，目录内容变化（修改时间改变）时重新建立
+
+    Args:
+        directory: 存放OPT文件的目录
+
+    Returns:
+        CameraRegistry: 相机参数库
+    """
+    key = os.path.abspath(directory)
+    registry = _registries.get(key)
+    try:
+        mtime_ns = os.stat(key).st_mtime_ns
+    except OSError:
+        mtime_ns = None
+    if registry is None or registry.mtime_ns != mtime_ns:
+        registry = CameraRegistry(key)
+        _registries[key] = registry
+    return registry
+
+
+def _list_opt_files(directory):
+    """列出目录中的OPT文件，按目录修改时间缓存"""
+    key = os.path.abspath(directory)
+    try:
+        mtime_ns = os.stat(key).st_mtime_ns
+    except OSError:
+        return {}
+    cached = _opt_listings.get(key)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+    files = {}
+    with os.scandir(key) as entries:
+        for entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            if ext.lower() == '.opt' and entry.is_file():
+                files[stem.lower()] = entry.path
+    _opt_listings[key] = (mtime_ns, files)
+    return files
+
+
+def find_opt_file(profile_id, directory=DEFAULT_CAMERA_DIR):
+    """
+    将CSV中的相机参数ID解析为OPT文件路径
+
+    支持cameraInfo中的文件名（5100-35或5100-35.opt，不区分大小写），也可以直接写OPT文件路径。
+
+    Args:
+        profile_id: 相机参数ID
+        directory: 存放OPT文件的目录
+
+    Returns:
+        str: OPT文件路径，找不到时返回None
+    """
+    if not profile_id:
+        return None
+    profile_id = profile_id.strip()
+    if profile_id.lower().endswith('.opt') and os.path.isfile(profile_id):
+        return profile_id
+    stem = os.path.basename(profile_id)
+    if stem.lower().endswith('.opt'):
+        stem = stem[:-4]
+    return _list_opt_files(directory).get(stem.lower())
+
+
+def describe_registry(directory=DEFAULT_CAMERA_DIR):
+    """返回参数库中各相机的说明文字"""
+    lines = []
+    for profile in get_camera_registry(directory).profiles:
+        size = f"{profile.width}x{profile.height}" if profile.width else "尺寸未知"
+        camera = " ".join(value for value in (profile.make, profile.model) if value) or "机型未记录"
+        lines.append(f"{os.path.basename(profile.path)}: {camera}, {size}, 焦距 {profile.focal_length}mm")
+    return lines
+
+
+if __name__ == "__main__":
+    for line in describe_registry(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CAMERA_DIR):
+        print(line)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多相机组（倾斜摄影）配置工具
+一次曝光只有一条POS记录，按相机组配置展开为每个相机一张图片：
+每个相机有自己的文件名模式、OPT相机参数和安装角（偏航/俯仰/横滚偏移）。
+姿态合成对整个清单向量化计算：R_相机 = R_机体 · R_安装，旋转顺序为Z(Yaw)-Y(Pitch)-X(Roll)。
+
+配置文件为JSON，例如：
+{
+    "name": "五镜头倾斜相机",
+    "cameras": [
+        {"id": "nadir",    "pattern": "A/{name}", "opt": "6100-40"},
+        {"id": "forward",  "pattern": "B/{name}", "opt": "5100-35", "pitch": 45},
+        {"id": "backward", "pattern": "C/{name}", "opt": "5100-35", "pitch": -45},
+        {"id": "left",     "pattern": "D/{name}", "opt": "5100-35", "roll": -45},
+        {"id": "right",    "pattern": "E/{name}", "opt": "5100-35", "roll": 45}
+    ]
+}
+文件名模式中可以使用{name}(CSV中的文件名)、{stem}(不含扩展名)、{ext}(扩展名)和{camera}(相机ID)。
+"""
+
+import os
+import sys
+import json
+import string
+
+import numpy as np
+
+from manifest import normalize_angles
+
+# 文件名模式中可以使用的占位符
+PATTERN_FIELDS = ('name', 'stem', 'ext', 'camera')
+
+# 示例配置，python camera_rig.py sample <文件> 时写出
+SAMPLE_RIG = {
+    "name": "五镜头倾斜相机",
+    "cameras": [
+        {"id": "nadir", "pattern": "A/{name}", "opt": "6100-40", "yaw": 0, "pitch": 0, "roll": 0},
+        {"id": "forward", "pattern": "B/{name}", "opt": "5100-35", "yaw": 0, "pitch": 45, "roll": 0},
+        {"id": "backward", "pattern": "C/{name}", "opt": "5100-35", "yaw": 0, "pitch": -45, "roll": 0},
+        {"id": "left", "pattern": "D/{name}", "opt": "5100-35", "yaw": 0, "pitch": 0, "roll": -45},
+        {"id": "right", "pattern": "E/{name}", "opt": "5100-35", "yaw": 0, "pitch": 0, "roll": 45},
+    ]
+}
+
+
+def load_rig(rig):
+    """
+    读取并检查相机组配置
+
+    Args:
+        rig: JSON配置文件路径，或已加载的配置字典
+
+    Returns:
+        dict: {'name': 名称, 'cameras': [{'id', 'pattern', 'opt', 'yaw', 'pitch', 'roll'}...]}
+    """
+    if isinstance(rig, str):
+        with open(rig, 'r', encoding='utf-8-sig') as f:
+            rig = json.load(f)
+
+    cameras = rig.get('cameras') if isinstance(rig, dict) else None
+    if not cameras:
+        raise ValueError("相机组配置中没有相机(cameras)")
+
+    normalized = []
+    seen = set()
+    for i, camera in enumerate(cameras):
+        camera_id = str(camera.get('id') or f"camera{i+1}")
+        if camera_id in seen:
+            raise ValueError(f"相机组配置中相机ID重复: {camera_id}")
+        seen.add(camera_id)
+        pattern = camera.get('pattern')
+        if not pattern:
+            raise ValueError(f"相机 {camera_id} 缺少文件名模式(pattern)")
+        _check_pattern(pattern, camera_id)
+        try:
+            offsets = {key: float(camera.get(key) or 0) for key in ('yaw', 'pitch', 'roll')}
+        except (TypeError, ValueError):
+            raise ValueError(f"相机 {camera_id} 的安装角不是数字")
+        normalized.append({'id': camera_id, 'pattern': pattern, 'opt': camera.get('opt') or '', **offsets})
+    return {'name': rig.get('name', ''), 'cameras': normalized}
+
+
+def _check_pattern(pattern, camera_id):
+    """检查文件名模式只使用PATTERN_FIELDS中的占位符且大括号配对，不在处理每一行时才出错"""
+    if not isinstance(pattern, str):
+        raise ValueError(f"相机 {camera_id} 的文件名模式(pattern)不是字符串")
+    try:
+        fields = [field for _, field, _, _ in string.Formatter().parse(pattern) if field is not None]
+    except ValueError as e:
+        raise ValueError(f"相机 {camera_id} 的文件名模式无效: {pattern} ({e})")
+    for field in fields:
+        if field not in PATTERN_FIELDS:
+            raise ValueError(f"相机 {camera_id} 的文件名模式中有不支持的占位符 {{{field}}}，"
+                             f"只能使用 {', '.join('{' + name + '}' for name in PATTERN_FIELDS)}")
+
+
+def rotation_matrices(yaw, pitch, roll):
+    """
+    向量化计算Z-Y-X顺序的旋转矩阵
+
+    Args:
+        yaw, pitch, roll: 角度数组(度)，形状相同
+
+    Returns:
+        ndarray: 形状为(..., 3, 3)的旋转矩阵
+    """
+    y, p, r = (np.radians(np.asarray(angle, dtype=np.float64)) for angle in (yaw, pitch, roll))
+    cy, sy, cp, sp, cr, sr = np.cos(y), np.sin(y), np.cos(p), np.sin(p), np.cos(r), np.sin(r)
+    return np.stack([
+        np.stack([cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr], axis=-1),
+        np.stack([sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr], axis=-1),
+        np.stack([-sp, cp * sr, cp * cr], axis=-1),
+    ], axis=-2)
+
+
+def matrices_to_angles(matrices):
+    """
+    将旋转矩阵分解为Z-Y-X顺序的偏航、俯仰、横滚角
+
+    俯仰角为±90度（万向锁）时横滚角取0，偏航角吸收全部绕Z轴的旋转。
+
+    Returns:
+        tuple: (yaw, pitch, roll) 角度数组(度)，偏航角在0-360度范围
+    """
+    r00, r10, r20 = matrices[..., 0, 0], matrices[..., 1, 0], matrices[..., 2, 0]
+    r21, r22 = matrices[..., 2, 1], matrices[..., 2, 2]
+    pitch = np.degrees(np.arcsin(np.clip(-r20, -1.0, 1.0)))
+    locked = np.hypot(r00, r10) < 1e-9
+    yaw = np.where(locked, np.arctan2(-matrices[..., 0, 1], matrices[..., 1, 1]), np.arctan2(r10, r00))
+    roll = np.where(locked, 0.0, np.arctan2(r21, r22))
+    # 加0.0消除-0.0，避免写出"-0.0"
+    return normalize_angles(np.degrees(yaw)), pitch + 0.0, np.degrees(roll) + 0.0
+
+
+def compose_attitudes(yaw, pitch, roll, cameras):
+    """
+    将机体姿态与每个相机的安装角合成为相机姿态
+
+    Args:
+        yaw, pitch, roll: 机体姿态数组(度)，长度为N
+        cameras: load_rig返回的相机列表，长度为C
+
+    Returns:
+        tuple: (yaw, pitch, roll) 形状为(N, C)的相机姿态数组
+    """
+    body = rotation_matrices(yaw, pitch, roll)
+    mount = rotation_matrices([c['yaw'] for c in cameras], [c['pitch'] for c in cameras],
+                              [c['roll'] for c in cameras])
+    return matrices_to_angles(np.einsum('nij,cjk->ncik', body, mount))
+
+
+def _expand_name(name, camera):
+    """按相机的文件名模式生成图片文件名"""
+    if not name:
+        return ''
+    stem, ext = os.path.splitext(name)
+    return camera['pattern'].format(name=name, stem=stem, ext=ext, camera=camera['id'])
+
+
+def expand_manifest(manifest, rig):
+    """
+    将每条曝光记录展开为相机组中每个相机一条记录
+
+    Args:
+        manifest: compile_manifest的结果
+        rig: load_rig的结果
+
+    Returns:
+        dict: 与compile_manifest结构相同的清单，按(曝光, 相机)顺序排列，
+              另外包含'row'(原始行号)和'camera'(相机ID)
+    """
+    cameras = rig['cameras']
+    count = manifest['count']
+    camera_count = len(cameras)
+
+    yaw, pitch, roll = compose_attitudes(manifest['yaw'], manifest['pitch'], manifest['roll'], cameras)
+    yaw, pitch, roll = yaw.reshape(-1), pitch.reshape(-1), roll.reshape(-1)
+
+    def repeat(values):
+        """逐行重复camera_count次"""
+        if isinstance(values, np.ndarray):
+            return np.repeat(values, camera_count)
+        return [value for value in values for _ in range(camera_count)]
+
+    filename = np.array([_expand_name(name, camera) for name in manifest['filename'] for camera in cameras],
+                        dtype=object)
+    # 相机配置中指定的OPT优先，未指定时使用CSV中的相机参数列
+    profile = np.array([camera['opt'] or row_profile for row_profile in manifest['profile'] for camera in cameras],
+                       dtype=object)
+
+    expanded = {key: repeat(manifest[key]) for key in
+                ('latitude', 'longitude', 'altitude', 'timestamp', 'exif_time', 'valid',
+                 'lat_dms', 'lng_dms', 'altitude_rational')}
+    expanded.update({
+        'count': count * camera_count,
+        'mapping': manifest['mapping'],
+        'filename': filename,
+        'profile': profile,
+        'yaw': yaw,
+        'pitch': pitch,
+        'roll': roll,
+        'direction_rational': (yaw * 100).astype(np.int64).tolist(),
+        'row': np.repeat(manifest.get('row', np.arange(count)), camera_count),
+        'camera': np.tile(np.array([camera['id'] for camera in cameras], dtype=object), count),
+    })
+    return expanded
+
+
+def create_sample_rig(path):
+    """写出示例相机组配置文件"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(SAMPLE_RIG, f, ensure_ascii=False, indent=4)
+    print(f"已创建示例相机组配置: {path}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == 'sample':
+        create_sample_rig(sys.argv[2])
+    elif len(sys.argv) == 2:
+        config = load_rig(sys.argv[1])
+        print(f"相机组: {config['name']} ({len(config['cameras'])} 个相机)")
+        for camera in config['cameras']:
+            print(f"  {camera['id']}: {camera['pattern']}, OPT={camera['opt'] or '默认'}, "
+                  f"偏航{camera['yaw']:+.1f} 俯仰{camera['pitch']:+.1f} 横滚{camera['roll']:+.1f}")
+    else:
+        print("用法: python camera_rig.py <配置文件>  或  python camera_rig.py sample <输出文件>")
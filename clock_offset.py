@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相机时钟偏移估计工具
+相机时钟与GNSS时间通常相差几秒到几分钟（另有时区差），按拍摄时间插值前需要先对齐。
+在给定范围内扫描候选偏移，对所有候选和所有照片一次向量化插值并打分，先粗后细：
+  - 有控制照片（已知位置的照片）时，按插值位置与已知位置的中位误差打分；
+  - 没有时按位置一致性打分：航测相机按等距触发，偏移正确时相邻照片的间距最均匀。
+结果附带置信度：最优偏移与其他位置的次优偏移得分差距越大越可信，
+航线等时重复等无法区分的情况置信度接近0。
+"""
+
+import sys
+import warnings
+
+import numpy as np
+
+from gps_track import bracket_times, DEFAULT_MAX_GAP
+from manifest import read_manifest, compile_manifest
+
+# 默认在初始偏移前后各搜索的秒数
+DEFAULT_OFFSET_RANGE = 600.0
+
+# 粗扫描步长(秒)，细扫描在最优值附近按步长的1/20进行
+DEFAULT_OFFSET_STEP = 1.0
+
+# 每批计算的候选数×照片数上限，控制内存占用
+SCAN_BATCH_ELEMENTS = 2000000
+
+# 覆盖率低于该比例的候选偏移不参与比较
+MIN_COVERAGE = 0.5
+
+# 置信度低于该值时提示用户核对
+LOW_CONFIDENCE = 0.3
+
+# 每度纬度的长度(米)
+METERS_PER_DEGREE = 111320.0
+
+
+def _interpolate_positions(track, times, max_gap):
+    """向量化插值任意形状时刻的经纬度，返回局部平面坐标(米)和有效标记"""
+    left, right, weight, valid = bracket_times(track['time'], times, max_gap)
+    latitude = track['latitude'][left] + (track['latitude'][right] - track['latitude'][left]) * weight
+    longitude = track['longitude'][left] + (track['longitude'][right] - track['longitude'][left]) * weight
+    return _to_meters(track, latitude, longitude), valid
+
+
+def _to_meters(track, latitude, longitude):
+    """以轨迹中心为原点换算为东、北方向的米数（小范围等距近似）"""
+    latitude0 = track['_center'][0]
+    longitude0 = track['_center'][1]
+    east = (longitude - longitude0) * METERS_PER_DEGREE * np.cos(np.radians(latitude0))
+    north = (latitude - latitude0) * METERS_PER_DEGREE
+    return east, north
+
+
+def _spacing_scores(track, times, offsets, max_gap):
+    """
+    位置一致性得分：相邻照片间距相对中位间距的平均偏差，加上未覆盖照片的比例，越小越好
+
+    Args:
+        times: 排序后的拍摄时间(M)
+        offsets: 候选偏移(K)
+
+    Returns:
+        ndarray: 每个候选偏移的得分(K)，覆盖率不足时为inf
+    """
+    (east, north), valid = _interpolate_positions(track, times[None, :] + offsets[:, None], max_gap)
+    steps = np.hypot(np.diff(east, axis=1), np.diff(north, axis=1))
+    steps = np.where(valid[:, 1:] & valid[:, :-1], steps, np.nan)
+    # 完全没有覆盖的候选偏移整行为NaN，得分在下面置为inf，不需要警告
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median = np.nanmedian(steps, axis=1, keepdims=True)
+        irregularity = np.nanmean(np.abs(steps - median), axis=1) / median[:, 0]
+    coverage = valid.mean(axis=1)
+    scores = irregularity + (1.0 - coverage)
+    return np.where((coverage >= MIN_COVERAGE) & (median[:, 0] > 0) & np.isfinite(scores), scores, np.inf)
+
+
+def _control_scores(track, times, control, offsets, max_gap):
+    """
+    控制照片得分：插值位置与已知位置的中位水平误差(米)，越小越好
+
+    Returns:
+        ndarray: 每个候选偏移的得分(K)，覆盖率不足时为inf
+    """
+    (east, north), valid = _interpolate_positions(track, times[None, :] + offsets[:, None], max_gap)
+    known_east, known_north = _to_meters(track, control['latitude'], control['longitude'])
+    errors = np.hypot(east - known_east[None, :], north - known_north[None, :])
+    errors = np.where(valid, errors, np.nan)
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        scores = np.nanmedian(errors, axis=1)
+    coverage = valid.mean(axis=1)
+    return np.where((coverage >= MIN_COVERAGE) & np.isfinite(scores), scores, np.inf)
+
+
+def _scan(score, offsets, photo_count):
+    """按内存上限分批计算一组候选偏移的得分"""
+    batch = max(1, SCAN_BATCH_ELEMENTS // max(photo_count, 1))
+    return np.concatenate([score(offsets[start:start + batch]) for start in range(0, len(offsets), batch)])
+
+
+def _confidence(scores):
+    """
+    按粗扫描得分曲线计算置信度：最优值所在的谷底之外的最低得分（次优偏移）与最优得分的相对差距，0-1之间
+
+    航线等时重复时相差一条航线时间的偏移同样一致，次优得分接近最优，置信度接近0。
+    """
+    scores = np.where(np.isfinite(scores), scores, np.inf)
+    best = int(np.argmin(scores))
+    low = best
+    while low > 0 and scores[low - 1] >= scores[low]:
+        low -= 1
+    high = best
+    while high < len(scores) - 1 and scores[high + 1] >= scores[high]:
+        high += 1
+    others = np.concatenate([scores[:low], scores[high + 1:]])
+    others = others[np.isfinite(others)]
+    if len(others) == 0:
+        return 1.0
+    runner_up = others.min()
+    if runner_up <= 0:
+        return 0.0
+    return float(np.clip((runner_up - scores[best]) / runner_up, 0.0, 1.0))
+
+
+def estimate_time_offset(track, capture_times, initial_offset=0.0, search_range=DEFAULT_OFFSET_RANGE,
+                         step=DEFAULT_OFFSET_STEP, control=None, max_gap=DEFAULT_MAX_GAP):
+    """
+    估计相机时钟相对轨迹时间的偏移（轨迹时间 = 相机时间 + 偏移）
+
+    Args:
+        track: prepare_track整理后的轨迹
+        capture_times: 所有照片的拍摄时间秒数，NaN表示缺失
+        initial_offset: 搜索中心，例如已知的时区差
+        search_range: 在搜索中心前后各搜索的秒数
+        step: 粗扫描步长(秒)
+        control: 控制照片 {'time': 拍摄时间秒数, 'latitude', 'longitude'}，提供时按已知位置打分
+        max_gap: 轨迹中断的判断阈值(秒)
+
+    Returns:
+        dict: {'offset': 偏移秒数, 'confidence': 置信度0-1, 'score': 最优得分,
+               'method': 'control'或'spacing', 'residual': 控制照片中位误差(米，仅control方式),
+               'photos': 参与估计的照片数}；无法估计时返回None
+    """
+    track = dict(track)
+    track['_center'] = (float(np.mean(track['latitude'])), float(np.mean(track['longitude'])))
+
+    if control is not None and len(control['time']):
+        times = np.asarray(control['time'], dtype=np.float64)
+        usable = ~np.isnan(times)
+        times = times[usable]
+        known = {'latitude': np.asarray(control['latitude'], dtype=np.float64)[usable],
+                 'longitude': np.asarray(control['longitude'], dtype=np.float64)[usable]}
+        method = 'control'
+
+        def score(offsets):
+            return _control_scores(track, times, known, offsets, max_gap)
+    else:
+        times = np.sort(np.asarray(capture_times, dtype=np.float64))
+        times = times[~np.isnan(times)]
+        method = 'spacing'
+
+        def score(offsets):
+            return _spacing_scores(track, times, offsets, max_gap)
+
+    if len(times) < (1 if method == 'control' else 3):
+        return None
+
+    # 粗扫描整个范围，再在最优值前后一个步长内细扫描
+    coarse = np.arange(initial_offset - search_range, initial_offset + search_range + step / 2, step)
+    coarse_scores = _scan(score, coarse, len(times))
+    if not np.isfinite(coarse_scores).any():
+        return None
+    best = coarse[np.argmin(coarse_scores)]
+    fine = np.arange(best - step, best + step + step / 40, step / 20)
+    fine_scores = _scan(score, fine, len(times))
+    best_index = int(np.argmin(fine_scores))
+
+    result = {
+        'offset': round(float(fine[best_index]), 3),
+        'confidence': round(_confidence(coarse_scores), 3),
+        'score': float(fine_scores[best_index]),
+        'method': method,
+        'photos': len(times),
+    }
+    if method == 'control':
+        result['residual'] = result['score']
+    return result
+
+
+def load_control_photos(control_file, image_index, capture_times):
+    """
+    读取控制照片CSV（有表头，文件名、纬度、经度列与POS清单相同），按文件名对应到拍摄时间
+
+    Args:
+        control_file: 控制照片CSV文件路径
+        image_index: 图片目录索引
+        capture_times: {图片路径: 拍摄时间秒数}
+
+    Returns:
+        dict: {'time', 'latitude', 'longitude'}，只包含找到图片且坐标有效的控制照片
+    """
+    manifest = compile_manifest(read_manifest(control_file, 'with_header'), 'with_header')
+    rows = []
+    for name, latitude, longitude, valid in zip(manifest['filename'], manifest['latitude'],
+                                                manifest['longitude'], manifest['valid']):
+        path = image_index.resolve(name) if name and valid else None
+        if path is not None and path in capture_times:
+            rows.append((capture_times[path], latitude, longitude))
+    times, latitude, longitude = (np.array(column, dtype=np.float64) for column in zip(*rows)) if rows else \
+        (np.empty(0), np.empty(0), np.empty(0))
+    return {'time': times, 'latitude': latitude, 'longitude': longitude}
+
+
+def describe_offset(result):
+    """返回偏移估计结果的说明文字"""
+    if result is None:
+        return "无法估计时间偏移：拍摄时间与轨迹没有足够的重叠"
+    text = f"估计时间偏移: {result['offset']:+.2f} 秒，置信度 {result['confidence']:.0%}"
+    if result['method'] == 'control':
+        text += f"（按 {result['photos']} 张控制照片，中位误差 {result['residual']:.2f} 米）"
+    else:
+        text += f"（按 {result['photos']} 张照片的间距一致性）"
+    if result['confidence'] < LOW_CONFIDENCE:
+        text += "，置信度较低，请核对"
+    return text
+
+
+if __name__ == "__main__":
+    from gps_track import load_track, read_capture_times
+
+    if len(sys.argv) < 3:
+        print("用法: python clock_offset.py <轨迹文件> <照片> [照片 ...]")
+        sys.exit(1)
+    _, seconds = read_capture_times(sys.argv[2:])
+    print(describe_offset(estimate_time_offset(load_track(sys.argv[1]), seconds)))
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DJI XMP数据包生成工具
+纯Python生成drone-dji命名空间的XMP包（GPS、姿态角、畸变参数、标定焦距和主点），
+不依赖python-xmp-toolkit/exempi，打包版本中同样可用。
+每个相机（CameraProfile）预先渲染一次模板，逐张图片只填入位置、姿态和时间。
+"""
+
+from camera_profile import CameraProfile, get_camera_profile
+
+DJI_NS = "http://www.dji.com/drone-dji/1.0/"
+EXIF_NS = "http://ns.adobe.com/exif/1.0/"
+XMP_NS = "http://ns.adobe.com/xap/1.0/"
+
+# XMP包末尾预留的空白，便于以后原地更新（XMP规范建议2KB）
+XMP_PADDING = 2048
+
+PACKET_HEADER = '<?xpacket begin="\ufeff" id="W5M0MpCehiHzreSzNTczkc9d"?>\n'
+PACKET_TRAILER = '<?xpacket end="w"?>'
+
+# 每张图片变化的字段用{}占位，相机相关字段在{camera}处预先渲染
+PACKET_TEMPLATE = (
+    '<x:xmpmeta xmlns:x="adobe:ns:meta/">\n'
+    ' <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">\n'
+    '  <rdf:Description rdf:about=""\n'
+    f'    xmlns:drone-dji="{DJI_NS}"\n'
+    f'    xmlns:exif="{EXIF_NS}"\n'
+    f'    xmlns:xmp="{XMP_NS}"\n'
+    '{dates}'
+    '    drone-dji:GpsLatitude="{lat}"\n'
+    '    drone-dji:GpsLongtitude="{lng}"\n'  # DJI使用Longtitude而不是Longitude
+    '    drone-dji:AbsoluteAltitude="{alt}"'
+    '{attitude}'
+    '{camera}/>\n'
+    ' </rdf:RDF>\n'
+    '</x:xmpmeta>\n'
+)
+
+# 飞行器姿态角，没有姿态数据（如GPX轨迹）时整段省略
+ATTITUDE_TEMPLATE = (
+    '\n    drone-dji:FlightRollDegree="{roll}"'
+    '\n    drone-dji:FlightPitchDegree="{pitch}"'
+    '\n    drone-dji:FlightYawDegree="{yaw}"'
+)
+
+# 已渲染的相机模板缓存: {相机XMP属性片段: 模板字符串}
+_camera_templates = {}
+
+
+def get_camera_template(opt_file=None, opt_data=None, profile=None):
+    """
+    获取某个相机的XMP包模板，相同的相机参数只渲染一次
+
+    Args:
+        opt_file: OPT文件路径
+        opt_data: 已解析的相机参数，没有profile和opt_file时使用
+        profile: CameraProfile，提供时直接使用其预先渲染的XMP片段
+
+    Returns:
+        str: 只剩逐张图片字段待填充的模板
+    """
+    if profile is None:
+        profile = get_camera_profile(opt_file) if opt_file else None
+    if profile is None and opt_data:
+        profile = CameraProfile(opt_data)
+    camera = profile.xmp_fragment if profile is not None else ''
+
+    template = _camera_templates.get(camera)
+    if template is None:
+        # 相机片段中的花括号需要转义，避免被format解释
+        template = PACKET_TEMPLATE.replace('{camera}', camera.replace('{', '{{').replace('}', '}}'))
+        _camera_templates[camera] = template
+    return template
+
+
+def format_xmp_date(timestamp):
+    """将EXIF格式时间(YYYY:MM:DD HH:MM:SS)转换为XMP日期格式"""
+    dt_parts = timestamp.split(" ")
+    if len(dt_parts) != 2:
+        return None
+    return f"{dt_parts[0].replace(':', '-')}T{dt_parts[1]}"
+
+
+def build_dji_xmp_packet(lat, lng, alt, roll, pitch, yaw, timestamp=None, opt_file=None, opt_data=None, packet_size=None,
+                         profile=None):
+    """
+    生成DJI格式的XMP包
+
+    Args:
+        lat: 纬度
+        lng: 经度
+        alt: 高度
+        roll: 横滚角
+        pitch: 俯仰角
+        yaw: 偏航角；任一姿态角为None或NaN时不写入姿态
+        timestamp: EXIF格式的时间戳
+        opt_file: OPT文件路径
+        opt_data: 已解析的相机参数
+        packet_size: 指定包的总字节数（用于原地覆盖已有XMP段），
+                     不提供时使用默认的预留空白
+        profile: 已加载的CameraProfile，提供时不再查找OPT文件
+
+    Returns:
+        bytes: UTF-8编码的XMP包；指定packet_size但容纳不下时返回None
+    """
+    dates = ''
+    if timestamp:
+        xmp_date = format_xmp_date(timestamp)
+        if xmp_date:
+            dates = f'    xmp:CreateDate="{xmp_date}"\n    xmp:ModifyDate="{xmp_date}"\n'
+
+    attitude = ''
+    if not any(angle is None or angle != angle for angle in (roll, pitch, yaw)):
+        attitude = ATTITUDE_TEMPLATE.format(roll=roll, pitch=pitch, yaw=yaw)
+
+    body = get_camera_template(opt_file, opt_data, profile).format(
+        dates=dates, lat=lat, lng=lng, alt=alt, attitude=attitude)
+    content = (PACKET_HEADER + body).encode('utf-8')
+    trailer = PACKET_TRAILER.encode('ascii')
+
+    if packet_size is None:
+        padding = XMP_PADDING
+    else:
+        padding = packet_size - len(content) - len(trailer)
+        if padding < 0:
+            return None
+
+    # 空白按行填充，每行100个字符
+    lines, rest = divmod(padding, 100)
+    whitespace = (b' ' * 99 + b'\n') * lines + b' ' * rest
+    return content + whitespace + trailer
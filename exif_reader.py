@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仅读文件头的批量EXIF读取工具
+用jpeg_segments扫描JPEG标记段，只读取EXIF（以及需要时XMP）段的数据，直接解析TIFF目录，
+只解码请求的标签，不解析缩略图(IFD1)和其他无关字段；多个文件在线程池中并行读取，
+适合从成千上万张图片中读取拍摄时间、已有的地理信息或相机型号。
+也可以把图片中已有的地理信息导出为process_images_from_csv可以直接使用的CSV。
+"""
+
+import os
+import re
+import sys
+import csv
+import struct
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+from jpeg_segments import scan_jpeg_file, read_exif_bytes, read_xmp_packet, EXIF_HEADER
+
+# 默认读取线程数（读取以等待IO为主）
+DEFAULT_READ_WORKERS = 8
+
+# 标签名 -> (IFD, 标签号)，与piexif的分组一致
+TAGS = {
+    'Make': ('0th', 271),
+    'Model': ('0th', 272),
+    'DateTime': ('0th', 306),
+    'ExposureTime': ('Exif', 33434),
+    'DateTimeOriginal': ('Exif', 36867),
+    'SubSecTimeOriginal': ('Exif', 37521),
+    'FocalLength': ('Exif', 37386),
+    'UserComment': ('Exif', 37510),
+    'PixelXDimension': ('Exif', 40962),
+    'PixelYDimension': ('Exif', 40963),
+    'FocalLengthIn35mmFilm': ('Exif', 41989),
+    'LensModel': ('Exif', 42036),
+    'GPSLatitudeRef': ('GPS', 1),
+    'GPSLatitude': ('GPS', 2),
+    'GPSLongitudeRef': ('GPS', 3),
+    'GPSLongitude': ('GPS', 4),
+    'GPSAltitudeRef': ('GPS', 5),
+    'GPSAltitude': ('GPS', 6),
+    'GPSTimeStamp': ('GPS', 7),
+    'GPSImgDirection': ('GPS', 17),
+    'GPSDateStamp': ('GPS', 29),
+}
+
+# 从DJI XMP中读取的属性（drone-dji命名空间）
+XMP_TAGS = ('GpsLatitude', 'GpsLongtitude', 'AbsoluteAltitude', 'RelativeAltitude',
+            'FlightRollDegree', 'FlightPitchDegree', 'FlightYawDegree',
+            'GimbalRollDegree', 'GimbalPitchDegree', 'GimbalYawDegree')
+
+# 导出地理信息使用的标签
+GEOTAG_TAGS = ('GPSLatitudeRef', 'GPSLatitude', 'GPSLongitudeRef', 'GPSLongitude', 'GPSAltitudeRef', 'GPSAltitude',
+               'GPSImgDirection', 'DateTimeOriginal', 'DateTime', 'UserComment',
+               'FlightRollDegree', 'FlightPitchDegree', 'FlightYawDegree')
+
+# 导出CSV的列，与示例CSV相同
+GEOTAG_COLUMNS = ['文件名', '纬度', '经度', '高度', 'Roll', 'Pitch', 'Yaw', '时间']
+
+# TIFF目录中的子目录指针
+POINTER_TAGS = {'Exif': 34665, 'GPS': 34853}
+
+# TIFF数据类型 -> (每个值的字节数, struct格式)
+TYPE_FORMATS = {
+    1: (1, 'B'), 2: (1, None), 3: (2, 'H'), 4: (4, 'I'), 5: (8, 'II'), 6: (1, 'b'),
+    7: (1, None), 8: (2, 'h'), 9: (4, 'i'), 10: (8, 'ii'), 11: (4, 'f'), 12: (8, 'd'),
+}
+
+_XMP_ATTRIBUTE = re.compile(r'drone-dji:(\w+)\s*=\s*"([^"]*)"|<drone-dji:(\w+)>([^<]*)<')
+_ATTITUDE_COMMENT = re.compile(r'(Roll|Pitch|Yaw)=(-?[\d.]+)')
+
+
+def _decode_value(tiff, endian, value_type, count, value_field):
+    """按TIFF数据类型解码一个标签的值，格式与piexif一致（ASCII解码为字符串）"""
+    size, fmt = TYPE_FORMATS.get(value_type, (None, None))
+    if size is None:
+        return None
+    total = size * count
+    if total <= 4:
+        data = value_field[:total]
+    else:
+        offset = struct.unpack(endian + 'I', value_field)[0]
+        data = tiff[offset:offset + total]
+        if len(data) < total:
+            return None
+    if value_type == 2:
+        return data.split(b'\x00', 1)[0].decode('utf-8', errors='replace').strip()
+    if value_type == 7:
+        return bytes(data)
+    values = struct.unpack(endian + fmt * count, data)
+    if value_type in (5, 10):
+        values = tuple(zip(values[0::2], values[1::2]))
+    return values[0] if count == 1 else values
+
+
+def _read_ifd(tiff, endian, offset, wanted):
+    """读取一个IFD中需要的标签，返回{标签号: 值}"""
+    values = {}
+    if offset <= 0 or offset + 2 > len(tiff):
+        return values
+    count = struct.unpack(endian + 'H', tiff[offset:offset + 2])[0]
+    for index in range(count):
+        entry = offset + 2 + index * 12
+        if entry + 12 > len(tiff):
+            break
+        tag, value_type, value_count = struct.unpack(endian + 'HHI', tiff[entry:entry + 8])
+        if tag in wanted:
+            values[tag] = _decode_value(tiff, endian, value_type, value_count, tiff[entry + 8:entry + 12])
+    return values
+
+
+def decode_exif_tags(tiff, tags):
+    """
+    从EXIF的TIFF数据中解码指定的标签
+
+    Args:
+        tiff: 去掉"Exif\\0\\0"头的EXIF数据
+        tags: 标签名序列（见TAGS）
+
+    Returns:
+        dict: {标签名: 值}，没有的标签为None
+    """
+    result = dict.fromkeys(tags)
+    if not tiff or len(tiff) < 8:
+        return result
+    endian = '<' if tiff[:2] == b'II' else '>'
+    wanted = {}
+    for name in tags:
+        if name in TAGS:
+            ifd, tag = TAGS[name]
+            wanted.setdefault(ifd, {})[tag] = name
+
+    zeroth = _read_ifd(tiff, endian, struct.unpack(endian + 'I', tiff[4:8])[0],
+                       set(wanted.get('0th', ())) | set(POINTER_TAGS.values()))
+    found = {'0th': zeroth}
+    for ifd, pointer in POINTER_TAGS.items():
+        if ifd in wanted and isinstance(zeroth.get(pointer), int):
+            found[ifd] = _read_ifd(tiff, endian, zeroth[pointer], set(wanted[ifd]))
+    for ifd, names in wanted.items():
+        for tag, name in names.items():
+            result[name] = found.get(ifd, {}).get(tag)
+    return result
+
+
+def decode_xmp_tags(xmp, tags):
+    """从XMP数据包中读取drone-dji命名空间的属性，返回{属性名: 浮点数或字符串}"""
+    result = {}
+    if not xmp:
+        return result
+    text = xmp.decode('utf-8', errors='replace')
+    for match in _XMP_ATTRIBUTE.finditer(text):
+        name = match.group(1) or match.group(3)
+        if name in tags and name not in result:
+            value = match.group(2) if match.group(1) else match.group(4)
+            try:
+                result[name] = float(value)
+            except ValueError:
+                result[name] = value.strip()
+    return result
+
+
+def read_tags(image_path, tags=GEOTAG_TAGS):
+    """
+    读取一张图片的指定标签，只读取文件头
+
+    Args:
+        image_path: JPEG文件路径
+        tags: 标签名序列，可以包含TAGS中的EXIF标签和XMP_TAGS中的DJI XMP属性
+
+    Returns:
+        dict: {标签名: 值}，没有的标签为None
+    """
+    layout = scan_jpeg_file(image_path)
+    exif = read_exif_bytes(image_path, layout)
+    result = decode_exif_tags(exif[len(EXIF_HEADER):] if exif else None, [name for name in tags if name in TAGS])
+    if any(name in XMP_TAGS for name in tags):
+        values = decode_xmp_tags(read_xmp_packet(image_path, layout), tags)
+        result.update({name: values.get(name) for name in tags if name in XMP_TAGS})
+    return result
+
+
+def _read_tags_safe(image_path, tags):
+    try:
+        return read_tags(image_path, tags), None
+    except Exception as e:
+        return None, str(e)
+
+
+def iter_tags(paths, tags=GEOTAG_TAGS, workers=DEFAULT_READ_WORKERS):
+    """
+    在线程池中批量读取标签，按paths的顺序返回，同时在途的文件数有上限
+
+    Yields:
+        tuple: (路径, {标签名: 值}或None, 错误信息或None)
+    """
+    paths = iter(paths)
+    if workers <= 1:
+        for path in paths:
+            yield (path,) + _read_tags_safe(path, tags)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            batch = list(islice(paths, workers * 64))
+            if not batch:
+                break
+            for path, (values, error) in zip(batch, executor.map(lambda p: _read_tags_safe(p, tags), batch)):
+                yield path, values, error
+
+
+def read_tags_bulk(paths, tags=GEOTAG_TAGS, workers=DEFAULT_READ_WORKERS):
+    """批量读取标签，返回与paths顺序一致的{标签名: 值}列表，读取失败的为None"""
+    return [values for _, values, _ in iter_tags(paths, tags, workers)]
+
+
+def rational_to_float(value):
+    """EXIF有理数(分子, 分母)转换为浮点数，无效时返回None"""
+    try:
+        numerator, denominator = value
+        return numerator / denominator if denominator else None
+    except (TypeError, ValueError):
+        return None
+
+
+def dms_to_decimal(dms, ref):
+    """
+    EXIF度分秒有理数转换为十进制度数
+
+    Args:
+        dms: ((度, 1), (分, 1), (秒, 分母))
+        ref: 'N'/'S'/'E'/'W'
+
+    Returns:
+        float: 十进制度数，无效时返回None
+    """
+    try:
+        degrees, minutes, seconds = (rational_to_float(part) for part in dms)
+    except (TypeError, ValueError):
+        return None
+    if degrees is None or minutes is None or seconds is None:
+        return None
+    decimal = degrees + minutes / 60.0 + seconds / 3600.0
+    return -decimal if ref in ('S', 'W') else decimal
+
+
+def geotag_row(values):
+    """
+    将read_tags的结果转换为导出CSV的一行；没有经纬度时返回None
+
+    姿态角优先使用DJI XMP中的Flight*Degree，其次是本工具写入UserComment的"Roll=..,Pitch=..,Yaw=.."，
+    偏航角最后使用GPSImgDirection。
+    """
+    latitude = dms_to_decimal(values.get('GPSLatitude'), values.get('GPSLatitudeRef'))
+    longitude = dms_to_decimal(values.get('GPSLongitude'), values.get('GPSLongitudeRef'))
+    if latitude is None or longitude is None:
+        return None
+    altitude = rational_to_float(values.get('GPSAltitude')) or 0.0
+    if values.get('GPSAltitudeRef') == 1:
+        altitude = -altitude
+
+    comment = values.get('UserComment') or b''
+    if isinstance(comment, bytes):
+        comment = comment.decode('ascii', errors='ignore')
+    attitude = {name: float(value) for name, value in _ATTITUDE_COMMENT.findall(comment)}
+    for name in ('Roll', 'Pitch', 'Yaw'):
+        value = values.get(f'Flight{name}Degree')
+        if isinstance(value, float):
+            attitude[name] = value
+    if 'Yaw' not in attitude:
+        direction = rational_to_float(values.get('GPSImgDirection'))
+        if direction is not None:
+            attitude['Yaw'] = direction
+
+    timestamp = values.get('DateTimeOriginal') or values.get('DateTime') or ''
+    if len(timestamp) >= 19 and timestamp[4] == ':' and timestamp[7] == ':':
+        timestamp = f"{timestamp[:4]}-{timestamp[5:7]}-{timestamp[8:]}"
+
+    return [round(latitude, 8), round(longitude, 8), round(altitude, 3),
+            attitude.get('Roll', 0.0), attitude.get('Pitch', 0.0), attitude.get('Yaw', 0.0), timestamp]
+
+
+def dump_geotags(paths, csv_path, names=None, workers=DEFAULT_READ_WORKERS, log=print):
+    """
+    将图片中已有的地理信息导出为CSV，格式与示例CSV相同，可直接用于process_images_from_csv
+
+    Args:
+        paths: 图片路径序列
+        csv_path: 输出CSV路径
+        names: 写入"文件名"列的名称（如相对路径），默认为文件名
+        workers: 读取线程数
+        log: 日志输出函数
+
+    Returns:
+        dict: {'exported': 导出数, 'missing': 没有经纬度的数量, 'failed': 读取失败的数量}
+    """
+    paths = list(paths)
+    names = names or [os.path.basename(path) for path in paths]
+    stats = {'exported': 0, 'missing': 0, 'failed': 0}
+    with open(csv_path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(GEOTAG_COLUMNS)
+        for name, (path, values, error) in zip(names, iter_tags(paths, GEOTAG_TAGS, workers)):
+            if values is None:
+                log(f"读取失败: {name}: {error}")
+                stats['failed'] += 1
+                continue
+            row = geotag_row(values)
+            if row is None:
+                stats['missing'] += 1
+                continue
+            writer.writerow([name.replace(os.sep, '/')] + row)
+            stats['exported'] += 1
+    log(f"已导出 {stats['exported']} 张图片的地理信息到 {csv_path}，"
+        f"没有经纬度 {stats['missing']} 张，读取失败 {stats['failed']} 张")
+    return stats
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法: python exif_reader.py <图片> [图片 ...]")
+        sys.exit(1)
+    for path, values, error in iter_tags(sys.argv[1:], tuple(TAGS) + XMP_TAGS):
+        print(path)
+        if values is None:
+            print(f"  读取失败: {error}")
+            continue
+        for name, value in values.items():
+            if value is not None:
+                print(f"  {name}: {value}")
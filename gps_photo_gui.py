@@ -7,9 +7,13 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import os
 import threading
-import csv
+import multiprocessing
+import queue
 import time
-from batch_add_gps_info import process_images_from_csv, detect_csv_format
+from batch_add_gps_info import process_images_from_csv, detect_csv_format, load_image_index
+from image_index import analyze_matches, NEAR_MISS_LABELS
+from manifest import read_csv_head, count_csv_rows, mapping_column_names
+from run_stats import RunStats, STAGES, format_duration
 import pandas as pd
 
 # 尝试导入OPT文件转换模块
@@ -20,6 +24,25 @@ except ImportError:
     OPT_CONVERTER_AVAILABLE = False
     print("警告: 未找到opt_converter.py，无法使用相机畸变参数转换功能")
 
+# 界面刷新间隔(毫秒)：后台线程的事件放入队列，主线程按该间隔批量取出并更新界面，进度合并为每帧一次
+UI_REFRESH_MS = 50
+
+# 每帧最多处理的事件数，避免日志过多时一帧内阻塞界面
+MAX_EVENTS_PER_FRAME = 5000
+
+# 日志窗口只保留最后这么多行，更早的行从窗口删除；完整日志写入LOG_DIR下的日志文件
+LOG_VIEW_LINES = 2000
+LOG_DIR = "logs"
+
+# 运行状态面板的刷新间隔(毫秒)，按定时器读取统计快照，不按每张图片刷新
+DASHBOARD_REFRESH_MS = 500
+
+# 列映射对话框预览的数据行数，只读取文件开头这些行，总行数在后台统计
+PREVIEW_ROWS = 10
+
+# 按严重程度计数的日志标签及显示名称
+LOG_COUNTER_LABELS = (("success", "成功"), ("warning", "警告"), ("error", "错误"))
+
 class CSVColumnMappingDialog:
     """CSV列映射对话框"""
     def __init__(self, parent, csv_file):
@@ -27,21 +50,23 @@ class CSVColumnMappingDialog:
         self.csv_file = csv_file
         self.result = None
         self.columns = []
+        self.row_count = None
         
-        # 读取CSV文件获取列信息
+        # 只读取文件开头的几行获取列信息和预览数据，大文件也能立即打开
         try:
-            with open(csv_file, 'r', encoding='utf-8-sig') as f:
-                reader = csv.reader(f)
-                first_row = next(reader)
-                # 检查是否有表头
-                if any(keyword in first_row[0].lower() for keyword in 
-                       ['文件名', 'filename', '纬度', '经度', 'latitude', 'longitude']):
-                    self.columns = first_row
-                    self.has_header = True
-                else:
-                    # 如果没有表头，生成列号
-                    self.columns = [f"列{i+1}" for i in range(len(first_row))]
-                    self.has_header = False
+            self.head_rows = read_csv_head(csv_file, PREVIEW_ROWS + 1)
+            if not self.head_rows:
+                raise ValueError("CSV文件为空")
+            first_row = self.head_rows[0]
+            # 检查是否有表头
+            if any(keyword in first_row[0].lower() for keyword in 
+                   ['文件名', 'filename', '纬度', '经度', 'latitude', 'longitude']):
+                self.columns = first_row
+                self.has_header = True
+            else:
+                # 如果没有表头，生成列号
+                self.columns = mapping_column_names(len(first_row))
+                self.has_header = False
         except Exception as e:
             messagebox.showerror("错误", f"无法读取CSV文件: {e}")
             return
@@ -78,7 +103,15 @@ class CSVColumnMappingDialog:
         info_text += f"列数: {len(self.columns)}"
         
         info_label = ttk.Label(main_frame, text=info_text, foreground="gray")
-        info_label.pack(pady=(0, 10))
+        info_label.pack(pady=(0, 0))
+        
+        # 总行数在后台线程中按换行符统计，统计完成前显示"统计中"
+        self.row_count_label = ttk.Label(main_frame, text="数据行数: 统计中...", foreground="gray")
+        self.row_count_label.pack(pady=(0, 10))
+        thread = threading.Thread(target=self.count_rows_task)
+        thread.daemon = True
+        thread.start()
+        self.dialog.after(100, self.poll_row_count)
         
         # 列选择区域
         mapping_frame = ttk.LabelFrame(main_frame, text="字段映射", padding=10)
@@ -112,8 +145,15 @@ class CSVColumnMappingDialog:
                                           values=["不使用"] + self.columns, state="readonly", width=25)
         self.altitude_combo.grid(row=3, column=1, sticky=tk.W, padx=(10, 0), pady=5)
         
+        # 相机参数列选择（按行指定cameraInfo中的OPT文件，如5100-35）
+        ttk.Label(mapping_frame, text="相机参数列:", width=15).grid(row=4, column=0, sticky=tk.W, pady=5)
+        self.profile_var = tk.StringVar()
+        self.profile_combo = ttk.Combobox(mapping_frame, textvariable=self.profile_var, 
+                                         values=["不使用"] + self.columns, state="readonly", width=25)
+        self.profile_combo.grid(row=4, column=1, sticky=tk.W, padx=(10, 0), pady=5)
+        
         # 预览区域
-        preview_label_frame = ttk.LabelFrame(main_frame, text="CSV数据预览 (前10行)", padding=10)
+        preview_label_frame = ttk.LabelFrame(main_frame, text=f"CSV数据预览 (前{PREVIEW_ROWS}行)", padding=10)
         preview_label_frame.pack(fill=tk.BOTH, expand=True, pady=(10, 10))
         
         # 创建表格来显示CSV数据
@@ -188,29 +228,35 @@ class CSVColumnMappingDialog:
         # 读取并显示CSV数据
         self.load_csv_data()
     
+    def count_rows_task(self):
+        """后台统计CSV总行数（只数换行符，不解析内容）"""
+        try:
+            self.row_count = count_csv_rows(self.csv_file, self.has_header)
+        except Exception as e:
+            self.row_count = f"统计失败: {e}"
+    
+    def poll_row_count(self):
+        """在主线程中检查后台统计是否完成，完成后显示总行数"""
+        try:
+            if self.row_count is None:
+                self.dialog.after(100, self.poll_row_count)
+            else:
+                self.row_count_label.config(text=f"数据行数: {self.row_count}")
+        except tk.TclError:
+            pass  # 对话框已关闭
+    
     def load_csv_data(self):
-        """加载并显示CSV数据"""
+        """显示CSV开头的数据（打开对话框时已读取）"""
         try:
-            with open(self.csv_file, 'r', encoding='utf-8-sig') as f:
-                reader = csv.reader(f)
-                rows = list(reader)
-                
-                # 如果有表头，跳过第一行（已用作列标题）
-                data_rows = rows[1:] if self.has_header else rows
-                
-                # 只显示前10行数据
-                display_rows = data_rows[:10]
+            # 如果有表头，跳过第一行（已用作列标题）
+            data_rows = self.head_rows[1:] if self.has_header else self.head_rows
+            
+            for i, row in enumerate(data_rows[:PREVIEW_ROWS]):
+                # 确保行数据长度与列数匹配，只取前len(self.columns)个值
+                row_data = (row + [""] * len(self.columns))[:len(self.columns)]
                 
-                for i, row in enumerate(display_rows):
-                    # 确保行数据长度与列数匹配
-                    while len(row) < len(self.columns):
-                        row.append("")  # 补充空值
-                    
-                    # 只取前len(self.columns)个值
-                    row_data = row[:len(self.columns)]
-                    
-                    # 插入数据到表格
-                    self.preview_tree.insert("", "end", text=str(i+1), values=row_data)
+                # 插入数据到表格
+                self.preview_tree.insert("", "end", text=str(i+1), values=row_data)
                     
         except Exception as e:
             # 如果读取失败，显示错误信息
@@ -222,8 +268,12 @@ class CSVColumnMappingDialog:
         for i, col in enumerate(self.columns):
             col_lower = col.lower()
             
+            # 相机参数列检测（放在文件名之前，避免profile被当作文件名列）
+            if any(keyword in col_lower for keyword in ['相机', 'camera', 'profile', 'opt']):
+                self.profile_combo.current(i + 1)  # +1因为有"不使用"选项
+            
             # 文件名列检测
-            if any(keyword in col_lower for keyword in ['文件名', 'filename', 'file', 'name']):
+            elif any(keyword in col_lower for keyword in ['文件名', 'filename', 'file', 'name']):
                 self.filename_combo.current(i)
             
             # 纬度列检测  
@@ -248,6 +298,8 @@ class CSVColumnMappingDialog:
         selected = [self.filename_var.get(), self.latitude_var.get(), self.longitude_var.get()]
         if self.altitude_var.get() and self.altitude_var.get() != "不使用":
             selected.append(self.altitude_var.get())
+        if self.profile_var.get() and self.profile_var.get() != "不使用":
+            selected.append(self.profile_var.get())
         
         if len(selected) != len(set(selected)):
             messagebox.showwarning("警告", "不能选择相同的列！")
@@ -258,6 +310,7 @@ class CSVColumnMappingDialog:
             'latitude': self.latitude_var.get(), 
             'longitude': self.longitude_var.get(),
             'altitude': self.altitude_var.get() if self.altitude_var.get() != "不使用" else None,
+            'profile': self.profile_var.get() if self.profile_var.get() not in ("", "不使用") else None,
             'has_header': self.has_header
         }
         self.dialog.destroy()
@@ -286,15 +339,35 @@ class GPSPhotoApp:
         self.image_folder = tk.StringVar()
         self.opt_file_path = tk.StringVar()
         self.output_folder = tk.StringVar()
+        self.rig_file_path = tk.StringVar()
+        self.recursive_scan = tk.BooleanVar(value=False)
+        self.auto_camera = tk.BooleanVar(value=False)
+        self.in_place = tk.BooleanVar(value=False)
+        # 并行进程数，默认与命令行一致为CPU核数
+        self.worker_count = tk.IntVar(value=os.cpu_count() or 1)
         self.processing = False
         self.should_stop = False
         
+        # 后台线程不直接操作界面，而是把事件放入队列，由主线程定时批量处理
+        self.events = queue.Queue()
+        
+        # 当前处理的运行统计，运行状态面板定时读取
+        self.run_stats = None
+        
+        # 日志窗口当前行数、各严重程度的消息数和完整日志文件
+        self.log_view_lines = 0
+        self.log_counts = {tag: 0 for tag, _ in LOG_COUNTER_LABELS}
+        self.log_total = 0
+        self.log_file = None
+        self.log_file_path = None
+        
         # CSV列映射
         self.csv_column_mapping = {
             'filename': None,
             'latitude': None, 
             'longitude': None,
-            'altitude': None
+            'altitude': None,
+            'profile': None
         }
         
         # 默认加载cameraInfo/default.opt
@@ -305,6 +378,7 @@ class GPSPhotoApp:
         # 设置样式和UI
         self.setup_styles()
         self.setup_ui()
+        self.root.after(UI_REFRESH_MS, self.drain_events)
     
     def setup_styles(self):
         """设置自定义样式"""
@@ -396,6 +470,7 @@ class GPSPhotoApp:
         opt_entry = ttk.Entry(files_frame, textvariable=self.opt_file_path, width=50)
         opt_entry.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=(10, 10), pady=8)
         ttk.Button(files_frame, text="浏览", style="Accent.TButton", command=self.select_opt_file).grid(row=0, column=2, pady=8, padx=5)
+        ttk.Checkbutton(files_frame, text="按机型自动选择", variable=self.auto_camera).grid(row=0, column=3, pady=8, padx=5)
         
         # CSV文件选择
         ttk.Label(files_frame, text="CSV文件:").grid(row=1, column=0, sticky=tk.W, pady=8)
@@ -406,11 +481,26 @@ class GPSPhotoApp:
         ttk.Label(files_frame, text="航片文件夹:").grid(row=2, column=0, sticky=tk.W, pady=8)
         ttk.Entry(files_frame, textvariable=self.image_folder, width=50).grid(row=2, column=1, sticky=(tk.W, tk.E), padx=(10, 10), pady=8)
         ttk.Button(files_frame, text="浏览", style="Accent.TButton", command=self.select_image_folder).grid(row=2, column=2, pady=8, padx=5)
+        ttk.Checkbutton(files_frame, text="包含子文件夹", variable=self.recursive_scan).grid(row=2, column=3, pady=8, padx=5)
         
         # 导出位置选择
         ttk.Label(files_frame, text="导出位置:").grid(row=3, column=0, sticky=tk.W, pady=8)
         ttk.Entry(files_frame, textvariable=self.output_folder, width=50).grid(row=3, column=1, sticky=(tk.W, tk.E), padx=(10, 10), pady=8)
         ttk.Button(files_frame, text="浏览", style="Accent.TButton", command=self.select_output_folder).grid(row=3, column=2, pady=8, padx=5)
+        # 覆盖原图时原地改写元数据段，更快但不是原子操作
+        ttk.Checkbutton(files_frame, text="原地写入(非原子)", variable=self.in_place).grid(row=3, column=3, pady=8, padx=5)
+        
+        # 多相机组配置（可选，一条POS记录展开为每个相机一张图片）
+        ttk.Label(files_frame, text="相机组配置:").grid(row=4, column=0, sticky=tk.W, pady=8)
+        ttk.Entry(files_frame, textvariable=self.rig_file_path, width=50).grid(row=4, column=1, sticky=(tk.W, tk.E), padx=(10, 10), pady=8)
+        ttk.Button(files_frame, text="浏览", style="Accent.TButton", command=self.select_rig_file).grid(row=4, column=2, pady=8, padx=5)
+        
+        # 并行进程数
+        workers_frame = ttk.Frame(files_frame)
+        workers_frame.grid(row=4, column=3, sticky=tk.W, pady=8, padx=5)
+        ttk.Label(workers_frame, text="并行数:").pack(side=tk.LEFT)
+        ttk.Spinbox(workers_frame, from_=1, to=max(64, os.cpu_count() or 1), width=4,
+                    textvariable=self.worker_count).pack(side=tk.LEFT, padx=(5, 0))
         
         # 文件信息显示区域
         info_frame = ttk.LabelFrame(main_frame, text="处理日志", padding=(15, 10))
@@ -423,6 +513,10 @@ class GPSPhotoApp:
         self.info_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5)
         self.info_text.config(background="#F8F9FA", foreground="#212529")
         
+        # 日志计数：各严重程度的消息数，窗口只显示最后LOG_VIEW_LINES行
+        self.log_counter_label = ttk.Label(info_frame, text="", font=("Arial", 9))
+        self.log_counter_label.grid(row=1, column=0, sticky=tk.W, padx=5)
+        
         # 确保滚动文本组件已经初始化
         self.root.update()
         
@@ -469,6 +563,14 @@ class GPSPhotoApp:
         self.progress_label = ttk.Label(progress_frame, text="0 / 0", font=("Arial", 9))
         self.progress_label.grid(row=1, column=0, pady=(0, 5))
         
+        # 运行状态：速度、读写吞吐量、在途任务数、剩余时间和各阶段平均耗时
+        dashboard_frame = ttk.LabelFrame(progress_frame, text="运行状态", padding=(10, 5))
+        dashboard_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), padx=5, pady=(0, 5))
+        self.throughput_label = ttk.Label(dashboard_frame, text="速度: -", font=("Consolas", 9))
+        self.throughput_label.grid(row=0, column=0, sticky=tk.W)
+        self.stage_label = ttk.Label(dashboard_frame, text="阶段平均耗时: -", font=("Consolas", 9))
+        self.stage_label.grid(row=1, column=0, sticky=tk.W)
+        
         # 状态栏
         status_frame = ttk.Frame(main_frame, relief=tk.SUNKEN, borderwidth=1)
         status_frame.grid(row=6, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 0))
@@ -518,6 +620,17 @@ class GPSPhotoApp:
             self.log(f"✅ 已选择相机参数文件: {os.path.basename(filename)}")
             self.show_opt_info(filename)
             
+    def select_rig_file(self):
+        """选择多相机组配置文件"""
+        filename = filedialog.askopenfilename(
+            title="选择相机组配置文件",
+            filetypes=[("JSON文件", "*.json"), ("所有文件", "*.*")],
+            initialdir="cameraInfo"
+        )
+        if filename:
+            self.rig_file_path.set(filename)
+            self.log(f"✅ 已选择相机组配置: {os.path.basename(filename)}")
+            
     def select_output_folder(self):
         """选择导出位置文件夹"""
         folder = filedialog.askdirectory(title="选择导出位置")
@@ -597,157 +710,251 @@ class GPSPhotoApp:
             messagebox.showerror("错误", "请先设置CSV列映射！")
             return
         
+        try:
+            workers = self.worker_count.get()
+        except tk.TclError:
+            workers = 0
+        if workers < 1:
+            messagebox.showerror("错误", "并行数必须是正整数！")
+            return
+        
+        # Tk变量只能在主线程中读取，启动线程前取出全部设置
+        settings = {
+            'csv_file': self.csv_path.get(),
+            'image_folder': self.image_folder.get(),
+            'opt_file': self.opt_file_path.get() or None,
+            'output_dir': self.output_folder.get() or None,
+            'recursive': self.recursive_scan.get(),
+            'auto_camera': self.auto_camera.get(),
+            'rig': self.rig_file_path.get() or None,
+            'in_place': self.in_place.get(),
+            'workers': workers,
+            'column_mapping': dict(self.csv_column_mapping),
+        }
+        
         def process_task():
             try:
                 self.log("=" * 50)
                 self.log("开始处理图片...")
-                self.status_label.config(text="处理中...", foreground="orange")
-                self.progress.config(value=0)
+                self.update_status("处理中...", "orange")
+                self.update_progress(0, 0)
                 
-                # 读取CSV文件
-                df = pd.read_csv(self.csv_path.get(), encoding='utf-8-sig')
+                def progress_callback(message, current=None, total=None):
+                    """处理进度回调：记录日志并更新进度条（均经事件队列交给主线程）"""
+                    if current is None:
+                        self.log(message)
+                    elif total:
+                        self.update_progress(current, total)
                 
-                # 如果没有表头，使用列号
-                if not self.csv_column_mapping['has_header']:
-                    column_count = len(df.columns)
-                    df.columns = [f"列{i+1}" for i in range(column_count)]
-                
-                total_rows = len(df)
-                success_count = 0
-                failed_count = 0
-                
-                for index, row in df.iterrows():
-                    if self.should_stop:
-                        self.log("处理已停止")
-                        break
-                    
-                    try:
-                        # 根据用户映射提取数据
-                        filename = str(row[self.csv_column_mapping['filename']]).strip()
-                        latitude = float(row[self.csv_column_mapping['latitude']])
-                        longitude = float(row[self.csv_column_mapping['longitude']])
-                        
-                        # 海拔是可选的
-                        altitude = 0
-                        if self.csv_column_mapping['altitude']:
-                            try:
-                                altitude = float(row[self.csv_column_mapping['altitude']])
-                            except:
-                                altitude = 0
-                        
-                        if not filename:
-                            self.log(f"第{index+1}行: 文件名为空，跳过")
-                            continue
-                        
-                        # 构建图片路径
-                        image_path = os.path.join(self.image_folder.get(), filename)
-                        if not os.path.isfile(image_path):
-                            if not image_path.lower().endswith(('.jpg', '.jpeg')):
-                                image_path = f"{image_path}.jpg"
-                            
-                            if not os.path.isfile(image_path):
-                                self.log(f"第{index+1}行: 文件不存在: {filename}")
-                                failed_count += 1
-                                continue
-                        
-                        # 处理图像
-                        self.log(f"第{index+1}行: 处理 {filename} ({latitude:.6f}, {longitude:.6f})")
-                        
-                        # 确定输出路径
-                        output_path = None
-                        if self.output_folder.get():
-                            output_path = os.path.join(self.output_folder.get(), filename)
-                        
-                        # 导入处理函数
-                        from batch_add_gps_info import set_gps_location
-                        
-                        if set_gps_location(image_path, latitude, longitude, altitude, 0, 0, 0, 
-                                           None, self.opt_file_path.get() if self.opt_file_path.get() else None, 
-                                           output_path):
-                            success_count += 1
-                            if output_path:
-                                self.log(f"  ✅ 成功 (已保存至: {os.path.basename(self.output_folder.get())})")
-                            else:
-                                self.log(f"  ✅ 成功")
-                        else:
-                            failed_count += 1
-                            self.log(f"  ❌ 失败")
-                        
-                        # 更新进度
-                        progress = (index + 1) / total_rows * 100
-                        self.progress.config(value=progress)
-                        self.root.update()
-                        
-                    except Exception as e:
-                        failed_count += 1
-                        self.log(f"第{index+1}行: 错误 - {str(e)}")
+                # 清单按列映射一次性编译后批量处理
+                result = process_images_from_csv(
+                    settings['csv_file'],
+                    settings['image_folder'],
+                    opt_file=settings['opt_file'],
+                    progress_callback=progress_callback,
+                    output_dir=settings['output_dir'],
+                    column_mapping=settings['column_mapping'],
+                    should_stop=lambda: self.should_stop,
+                    recursive=settings['recursive'],
+                    auto_camera=settings['auto_camera'],
+                    rig=settings['rig'],
+                    stats=self.run_stats,
+                    in_place=settings['in_place'],
+                    workers=settings['workers']
+                )
+                success_count = result['success']
+                failed_count = result['failed']
                 
                 self.log("=" * 50)
                 self.log(f"处理完成: 成功={success_count}, 失败={failed_count}")
-                self.status_label.config(text=f"完成: 成功{success_count}个, 失败{failed_count}个", 
-                                       foreground="green" if failed_count == 0 else "orange")
+                self.update_status(f"完成: 成功{success_count}个, 失败{failed_count}个",
+                                   "green" if failed_count == 0 else "orange")
                 
             except Exception as e:
                 self.log(f"❌ 处理失败: {str(e)}")
-                self.status_label.config(text="处理失败", foreground="red")
+                self.update_status("处理失败", "red")
             
             finally:
                 self.processing = False
-                self.process_button.config(text="开始处理")
+                self.call_in_ui(self.process_button.config, text="开始处理", state="normal")
         
-        # 启动处理线程
+        # 启动处理线程，运行状态面板按定时器刷新
         self.processing = True
         self.should_stop = False
         self.process_button.config(text="停止处理")
+        self.run_stats = RunStats()
+        self.root.after(DASHBOARD_REFRESH_MS, self.update_dashboard)
         thread = threading.Thread(target=process_task)
         thread.daemon = True
         thread.start()
     
+    def post_event(self, kind, *args):
+        """从任意线程发送界面事件，由主线程在drain_events中处理"""
+        self.events.put((kind, args))
+    
+    def call_in_ui(self, func, *args, **kwargs):
+        """在主线程中调用界面函数（如按钮的config），可以从后台线程调用"""
+        self.post_event("call", func, args, kwargs)
+    
     def log(self, message):
-        """添加日志消息"""
-        # 确保info_text已经初始化
-        if hasattr(self, 'info_text') and self.info_text:
-            # 根据消息类型设置不同颜色
-            tag = None
-            
-            if isinstance(message, str):
-                if message.startswith("✅") or "成功" in message:
-                    tag = "success"
-                elif message.startswith("❌") or "失败" in message or "错误" in message:
-                    tag = "error"
-                elif message.startswith("⚠️") or "警告" in message:
-                    tag = "warning"
-                elif message.startswith("=") or message.startswith("-"):
-                    tag = "separator"
-                elif "开始" in message:
-                    tag = "info"
+        """添加日志消息（线程安全）"""
+        self.post_event("log", message, time.time())
+    
+    def update_status(self, message, color="black"):
+        """更新状态栏（线程安全）"""
+        self.post_event("status", message, color)
+    
+    def update_progress(self, current, total):
+        """更新进度条（线程安全），一帧内的多次更新只显示最后一次"""
+        self.post_event("progress", current, total)
+    
+    @staticmethod
+    def log_tag(message):
+        """根据消息内容选择日志颜色标签"""
+        if not isinstance(message, str):
+            return ""
+        if message.startswith("✅") or "成功" in message:
+            return "success"
+        if message.startswith("❌") or "失败" in message or "错误" in message:
+            return "error"
+        if message.startswith("⚠️") or "警告" in message:
+            return "warning"
+        if message.startswith("=") or message.startswith("-"):
+            return "separator"
+        if "开始" in message:
+            return "info"
+        return ""
+    
+    def drain_events(self):
+        """主线程定时批量处理事件队列：日志合并为一次插入，进度只取最后一次，然后重新调度"""
+        lines = []
+        progress = None
+        status = None
+        try:
+            for _ in range(MAX_EVENTS_PER_FRAME):
+                try:
+                    kind, args = self.events.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == "log":
+                    lines.append(args)
+                elif kind == "progress":
+                    progress = args
+                elif kind == "status":
+                    status = args
+                elif kind == "call":
+                    # 先输出之前的日志，保持事件顺序
+                    self.flush_log_lines(lines)
+                    lines = []
+                    func, call_args, call_kwargs = args
+                    func(*call_args, **call_kwargs)
             
-            # 插入文本
-            self.info_text.insert(tk.END, message + "\n", tag if tag else "")
-            # 插入文本
-            self.info_text.insert(tk.END, message + "\n", tag if tag else "")
+            self.flush_log_lines(lines)
+            if progress is not None:
+                current, total = progress
+                self.progress.config(value=current / total * 100 if total else 0)
+                self.progress_label.config(text=f"{current} / {total}")
+            if status is not None:
+                message, color = status
+                self.status_label.config(text=message, foreground=color)
+        except tk.TclError:
+            return  # 窗口已关闭
+        except Exception as e:
+            print(f"界面更新出错: {e}")
+        self.root.after(UI_REFRESH_MS, self.drain_events)
+    
+    def flush_log_lines(self, lines):
+        """
+        输出一批日志：全部写入日志文件并计数，窗口中只插入最后LOG_VIEW_LINES行（一次插入，只滚动一次），
+        超出的旧行从窗口顶部删除，使内存和插入耗时不随处理量增长
+
+        Args:
+            lines: [(消息, 时间戳)]
+        """
+        if not lines:
+            return
+        self.write_log_file(lines)
+        chunks = []
+        for message, _ in lines:
+            tag = self.log_tag(message)
+            if tag in self.log_counts:
+                self.log_counts[tag] += 1
+            chunks.append((f"{message}\n", tag))
+        self.log_total += len(lines)
+        
+        if hasattr(self, 'info_text') and self.info_text:
+            visible = chunks[-LOG_VIEW_LINES:]
+            self.info_text.insert(tk.END, *[item for chunk in visible for item in chunk])
+            self.log_view_lines += sum(text.count("\n") for text, _ in visible)
+            excess = self.log_view_lines - LOG_VIEW_LINES
+            if excess > 0:
+                self.info_text.delete("1.0", f"{excess + 1}.0")
+                self.log_view_lines -= excess
             self.info_text.see(tk.END)
-            
+        self.update_log_counters()
+    
+    def write_log_file(self, lines):
+        """将日志追加写入日志文件（首次写入时在LOG_DIR下创建），写入失败时只提示一次"""
+        if self.log_file is None and self.log_file_path is None:
+            self.log_file_path = os.path.join(LOG_DIR, f"gps_photo_{time.strftime('%Y%m%d_%H%M%S')}.log")
             try:
-                self.root.update()
-            except:
-                pass  # 防止界面更新时出错
+                os.makedirs(LOG_DIR, exist_ok=True)
+                self.log_file = open(self.log_file_path, 'a', encoding='utf-8')
+            except OSError as e:
+                print(f"无法创建日志文件 {self.log_file_path}: {e}")
+        if self.log_file is None:
+            return
+        try:
+            self.log_file.write("".join(
+                f"{time.strftime('%H:%M:%S', time.localtime(timestamp))} {message}\n" for message, timestamp in lines))
+            self.log_file.flush()
+        except OSError as e:
+            print(f"写入日志文件失败: {e}")
+            self.close_log_file()
+    
+    def close_log_file(self):
+        """关闭日志文件"""
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+    
+    def update_log_counters(self):
+        """刷新日志计数标签"""
+        if not hasattr(self, 'log_counter_label'):
+            return
+        counts = "  ".join(f"{label}: {self.log_counts[tag]}" for tag, label in LOG_COUNTER_LABELS)
+        text = f"{counts}  共 {self.log_total} 条"
+        if self.log_total > self.log_view_lines:
+            text += f"（窗口显示最后 {LOG_VIEW_LINES} 行"
+            text += f"，完整日志: {self.log_file_path}）" if self.log_file is not None else "）"
+        self.log_counter_label.config(text=text)
+    
+    def update_dashboard(self):
+        """定时读取运行统计并刷新运行状态面板，处理结束后再刷新一次并停止"""
+        if self.run_stats is None:
+            return
+        snapshot = self.run_stats.snapshot()
+        self.throughput_label.config(text=(
+            f"速度: {snapshot['recent_images_per_sec']:.1f} 张/秒  "
+            f"读取: {snapshot['read_mb_per_sec']:.2f} MB/秒  写入: {snapshot['write_mb_per_sec']:.2f} MB/秒  "
+            f"在途: {snapshot['in_flight']}  已用: {format_duration(snapshot['elapsed'])}  "
+            f"剩余: {format_duration(snapshot['eta'])}"))
+        self.stage_label.config(text="阶段平均耗时: " + "  ".join(
+            f"{label} {snapshot['stage_ms'][stage]:.2f}ms" for stage, label in STAGES))
+        if self.processing:
+            self.root.after(DASHBOARD_REFRESH_MS, self.update_dashboard)
     
     def clear_log(self):
-        """清空日志"""
+        """清空日志窗口和计数（日志文件保留）"""
         if hasattr(self, 'info_text') and self.info_text:
             self.info_text.delete(1.0, tk.END)
-    
-    def update_status(self, message, color="black"):
-        """更新状态栏"""
-        self.status_label.config(text=message, foreground=color)
-        try:
-            self.root.update()
-        except:
-            pass  # 防止界面更新时出错
+        self.log_view_lines = 0
+        self.log_counts = {tag: 0 for tag, _ in LOG_COUNTER_LABELS}
+        self.log_total = 0
+        self.update_log_counters()
     
     def preview_files(self):
-        """预览文件信息"""
+        """预览文件信息（匹配分析在后台线程中进行，不阻塞界面）"""
         csv_file = self.csv_path.get()
         image_dir = self.image_folder.get()
         
@@ -763,6 +970,29 @@ class GPSPhotoApp:
             messagebox.showerror("错误", "图片文件夹不存在")
             return
         
+        self.preview_button.config(state="disabled")
+        self.update_status("正在分析文件匹配...", "orange")
+        thread = threading.Thread(target=self.preview_task,
+                                  args=(csv_file, image_dir, self.recursive_scan.get()))
+        thread.daemon = True
+        thread.start()
+    
+    def read_csv_filenames(self, csv_file, csv_format):
+        """只读取CSV中的文件名列（优先使用列映射中的文件名列，否则为第一列）"""
+        header = None if csv_format == 'no_header' else 0
+        column = 0
+        mapped = self.csv_column_mapping.get('filename')
+        if mapped:
+            if csv_format == 'no_header' and mapped.startswith("列"):
+                column = int(mapped[1:]) - 1
+            elif csv_format != 'no_header':
+                column = mapped
+        df = pd.read_csv(csv_file, header=header, usecols=[column], dtype=str, encoding='utf-8-sig')
+        names = df.iloc[:, 0].dropna().str.strip()
+        return names[names != ''].tolist()
+    
+    def preview_task(self, csv_file, image_dir, recursive):
+        """后台预览任务：显示CSV前几行，并用哈希索引分析文件匹配情况"""
         try:
             self.log("=" * 50)
             self.log("开始预览文件信息...")
@@ -771,89 +1001,86 @@ class GPSPhotoApp:
             csv_format = detect_csv_format(csv_file)
             self.log(f"CSV格式: {csv_format}")
             
-            # 读取CSV文件
-            df = pd.read_csv(csv_file, header=None if csv_format == 'no_header' else 0)
-            csv_count = len(df)
-            self.log(f"CSV文件记录数: {csv_count}")
-            
-            # 显示前5行CSV数据
+            # 显示前5行CSV数据，只读取需要显示的部分
+            df = pd.read_csv(csv_file, header=None if csv_format == 'no_header' else 0,
+                             nrows=5, encoding='utf-8-sig')
             self.log("CSV数据预览 (前5行):")
-            for i, row in df.head().iterrows():
-                if csv_format == 'no_header':
-                    # 无表头格式：显示完整数据包括姿态角
-                    filename = row[0] if len(row) > 0 else "N/A"
-                    timestamp = row[1] if len(row) > 1 else "N/A"
-                    longitude = row[2] if len(row) > 2 else "N/A"
-                    latitude = row[3] if len(row) > 3 else "N/A"
-                    altitude = row[4] if len(row) > 4 else "N/A"
-                    pitch = row[5] if len(row) > 5 else "N/A"
-                    roll = row[6] if len(row) > 6 else "N/A"
-                    yaw = row[7] if len(row) > 7 else "N/A"
-                    
-                    self.log(f"  {i+1}: {filename} | {timestamp}")
-                    self.log(f"     经度:{longitude} 纬度:{latitude} 高度:{altitude}")
-                    self.log(f"     Pitch:{pitch} Roll:{roll} Yaw:{yaw}")
-                else:
-                    # 有表头格式：显示完整数据
-                    filename = row.iloc[0] if len(row) > 0 else "N/A"
-                    timestamp = row.iloc[1] if len(row) > 1 else "N/A"
-                    longitude = row.iloc[2] if len(row) > 2 else "N/A"
-                    latitude = row.iloc[3] if len(row) > 3 else "N/A"
-                    altitude = row.iloc[4] if len(row) > 4 else "N/A"
-                    pitch = row.iloc[5] if len(row) > 5 else "N/A"
-                    roll = row.iloc[6] if len(row) > 6 else "N/A"
-                    yaw = row.iloc[7] if len(row) > 7 else "N/A"
-                    
-                    self.log(f"  {i+1}: {filename} | {timestamp}")
-                    self.log(f"     经度:{longitude} 纬度:{latitude} 高度:{altitude}")
-                    self.log(f"     Pitch:{pitch} Roll:{roll} Yaw:{yaw}")
-            
-            # 统计图片文件
-            image_files = [f for f in os.listdir(image_dir)
-                           if f.lower().endswith(('.jpg', '.jpeg'))]
-            image_count = len(image_files)
-            self.log(f"图片文件数量: {image_count}")
+            for i, row in df.iterrows():
+                values = [row.iloc[j] if len(row) > j else "N/A" for j in range(8)]
+                filename, timestamp, longitude, latitude, altitude, pitch, roll, yaw = values
+                self.log(f"  {i+1}: {filename} | {timestamp}")
+                self.log(f"     经度:{longitude} 纬度:{latitude} 高度:{altitude}")
+                self.log(f"     Pitch:{pitch} Roll:{roll} Yaw:{yaw}")
             
-            # 匹配分析
-            if csv_format == 'no_header':
-                csv_files = df[0].tolist()  # 第一列是文件名
-            else:
-                csv_files = df.iloc[:, 0].tolist()  # 第一列是文件名
-            
-            matched = []
-            unmatched_csv = []
-            unmatched_images = []
+            csv_files = self.read_csv_filenames(csv_file, csv_format)
+            csv_count = len(csv_files)
+            self.log(f"CSV文件记录数: {csv_count}")
             
-            for csv_file_name in csv_files:
-                if csv_file_name in image_files:
-                    matched.append(csv_file_name)
-                else:
-                    unmatched_csv.append(csv_file_name)
-                
-            for image_file in image_files:
-                if image_file not in csv_files:
-                    unmatched_images.append(image_file)
+            # 统计图片文件（勾选包含子文件夹时使用目录库）
+            image_index, _ = load_image_index(image_dir, recursive, log=self.log)
+            image_count = len(image_index.paths)
+            self.log(f"图片文件数量: {image_count}")
             
-            # 显示匹配结果
-            self.log(f"\n匹配结果:")
-            if len(matched) == csv_count == image_count:
-                self.log(f"✅ 完美匹配: {len(matched)} 个文件")
-                self.update_status("文件匹配完美", "green")
-            else:
-                self.log(f"⚠️  匹配文件: {len(matched)} 个")
-                if unmatched_csv:
-                    self.log(f"❌ CSV中无对应图片: {len(unmatched_csv)} 个")
-                if unmatched_images:
-                    self.log(f"❌ 图片无对应CSV: {len(unmatched_images)} 个")
-                self.update_status("文件匹配不完整", "orange")
+            # 匹配分析：按批分析并回报进度
+            def progress_callback(done, total):
+                self.update_status(f"正在分析文件匹配... {done}/{total}", "orange")
             
+            result = analyze_matches(csv_files, image_index, progress_callback)
+            self.report_matches(result, csv_count, image_count, image_dir)
             self.log("预览完成")
         
         except Exception as e:
             error_msg = f"预览失败: {str(e)}"
             self.log(error_msg)
-            messagebox.showerror("错误", error_msg)
             self.update_status("预览失败", "red")
+        
+        finally:
+            self.call_in_ui(self.preview_button.config, state="normal")
+    
+    def report_matches(self, result, csv_count, image_count, image_dir, limit=10):
+        """显示匹配结果，近似匹配逐类列出前几个示例（在后台线程中调用，不读取Tk变量）"""
+        near_misses = result['near_misses']
+        near_count = sum(len(items) for items in near_misses.values())
+        
+        self.log(f"\n匹配结果:")
+        if result['matched'] == csv_count == image_count:
+            self.log(f"✅ 完美匹配: {result['matched']} 个文件")
+            self.update_status("文件匹配完美", "green")
+            return
+        
+        self.log(f"⚠️  匹配文件: {result['matched']} 个")
+        for kind, items in near_misses.items():
+            if not items:
+                continue
+            self.log(f"⚠️  {NEAR_MISS_LABELS[kind]}（处理时可自动匹配）: {len(items)} 个")
+            for name, path in items[:limit]:
+                self.log(f"     {name} → {os.path.relpath(path, image_dir)}")
+            if len(items) > limit:
+                self.log(f"     ... 等 {len(items)} 个")
+        
+        for key, label in (('ambiguous', "❌ 文件名在多个子文件夹中重复"),
+                           ('missing', "❌ CSV中无对应图片"),
+                           ('duplicates', "⚠️  CSV中重复的文件名")):
+            items = result[key]
+            if items:
+                self.log(f"{label}: {len(items)} 个")
+                for name in items[:limit]:
+                    self.log(f"     {name}")
+                if len(items) > limit:
+                    self.log(f"     ... 等 {len(items)} 个")
+        
+        unmatched_images = result['unmatched_images']
+        if unmatched_images:
+            self.log(f"❌ 图片无对应CSV: {len(unmatched_images)} 个")
+            for path in unmatched_images[:limit]:
+                self.log(f"     {os.path.basename(path)}")
+            if len(unmatched_images) > limit:
+                self.log(f"     ... 等 {len(unmatched_images)} 个")
+        
+        if not result['missing'] and not result['ambiguous'] and not unmatched_images:
+            self.update_status(f"文件均可匹配（{near_count} 个名称有差异）", "orange")
+        else:
+            self.update_status("文件匹配不完整", "orange")
 
     def toggle_processing(self):
         """切换处理状态：开始/停止处理"""
@@ -931,6 +1158,7 @@ def main():
         
         print("启动主循环...")
         root.mainloop()
+        app.close_log_file()
         return 0
     except Exception as e:
         import traceback
@@ -940,4 +1168,6 @@ def main():
         return 1
 
 if __name__ == "__main__":
+    # 打包为exe后并行处理的工作进程也从这里启动
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+GPS轨迹插值工具
+没有逐张照片的POS记录、只有连续的GNSS/POS轨迹（CSV、GPX、KML、NMEA）时，按每张照片EXIF中的拍摄时间
+(DateTimeOriginal)在轨迹上插值得到位置、高度和姿态。
+拍摄时间由exif_reader只读取文件头部的EXIF段并在线程池中批量读取；插值对所有照片一次向量化计算：
+先排序拍摄时间，用np.searchsorted找到前后两个轨迹点，位置、高度、俯仰和横滚线性插值，
+偏航角按最短角度差插值，跨越0/360度时不会插值到反方向。
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from manifest import (compile_manifest, resolve_column_mapping, timestamps_to_seconds, normalize_angles,
+                      seconds_to_exif_times)
+from exif_reader import read_tags, iter_tags, DEFAULT_READ_WORKERS
+from track_parsers import get_track_parser
+
+# 轨迹中按时间插值的字段
+TRACK_FIELDS = ('latitude', 'longitude', 'altitude', 'roll', 'pitch', 'yaw')
+
+# 两个轨迹点间隔超过该秒数时不插值（轨迹中断），None表示不限制
+DEFAULT_MAX_GAP = 10.0
+
+
+# 读取拍摄时间使用的标签
+CAPTURE_TIME_TAGS = ('DateTimeOriginal', 'SubSecTimeOriginal', 'DateTime')
+
+
+def _capture_time(values):
+    """从read_tags的结果中取拍摄时间，返回(EXIF格式时间字符串或None, 小数秒)"""
+    if not values:
+        return None, 0.0
+    text = values.get('DateTimeOriginal') or values.get('DateTime')
+    if not text:
+        return None, 0.0
+    subsec = (values.get('SubSecTimeOriginal') or '') if values.get('DateTimeOriginal') else ''
+    fraction = float(f"0.{subsec}") if subsec.isdigit() else 0.0
+    return text, fraction
+
+
+def read_capture_time(image_path):
+    """
+    读取照片的拍摄时间，只读取文件头部的EXIF段
+
+    依次使用DateTimeOriginal(含SubSecTimeOriginal)和DateTime。
+
+    Returns:
+        tuple: (EXIF格式时间字符串或None, 小数秒)
+    """
+    try:
+        return _capture_time(read_tags(image_path, CAPTURE_TIME_TAGS))
+    except Exception:
+        return None, 0.0
+
+
+def read_capture_times(paths, workers=DEFAULT_READ_WORKERS):
+    """
+    在线程池中读取一批照片的拍摄时间
+
+    Args:
+        paths: 照片路径序列
+        workers: 读取线程数
+
+    Returns:
+        tuple: (EXIF格式时间字符串数组(缺失为空字符串), float64秒数数组(缺失为NaN))
+    """
+    texts = []
+    fractions = []
+    for _, values, _ in iter_tags(paths, CAPTURE_TIME_TAGS, workers):
+        text, fraction = _capture_time(values)
+        texts.append(text or '')
+        fractions.append(fraction)
+    texts = np.array(texts, dtype=object)
+    return texts, timestamps_to_seconds(texts) + np.array(fractions, dtype=np.float64)
+
+
+def load_track_csv(track_file):
+    """
+    读取CSV格式的轨迹，表头与POS清单相同（时间、经度、纬度、高度、Pitch、Roll、Yaw），不需要文件名列
+
+    Returns:
+        dict: 按时间排序的轨迹 {'time': 秒数数组, 'latitude', 'longitude', 'altitude', 'roll', 'pitch', 'yaw',
+              'attitude': 是否包含姿态}
+    """
+    df = pd.read_csv(track_file, encoding='utf-8-sig')
+    mapping = resolve_column_mapping(df.columns, 'with_header')
+    for field in ('timestamp', 'latitude', 'longitude'):
+        if mapping[field] is None:
+            raise ValueError(f"轨迹文件缺少{field}列")
+
+    def column(field):
+        if mapping[field] is None:
+            return np.zeros(len(df), dtype=np.float64)
+        return pd.to_numeric(df[mapping[field]], errors='coerce').to_numpy(dtype=np.float64)
+
+    track = {'time': timestamps_to_seconds(df[mapping['timestamp']].astype(str).str.strip().to_numpy(dtype=object))}
+    track.update({field: column(field) for field in TRACK_FIELDS})
+    track['attitude'] = any(mapping[field] is not None for field in ('roll', 'pitch', 'yaw'))
+    return prepare_track(track)
+
+
+def load_track(track_file):
+    """
+    按扩展名读取轨迹文件：GPX、KML、NMEA由track_parsers流式解析，其他按CSV读取
+
+    Returns:
+        dict: prepare_track整理后的轨迹
+    """
+    parser = get_track_parser(track_file)
+    if parser is None:
+        return load_track_csv(track_file)
+    return prepare_track(parser(track_file))
+
+
+def prepare_track(track):
+    """
+    整理轨迹：去掉时间或坐标无效的点，按时间排序，同一时刻只保留第一个点；
+    所有点都没有时间时抛出ValueError
+
+    Returns:
+        dict: 整理后的轨迹
+    """
+    time = np.asarray(track['time'], dtype=np.float64)
+    if len(time) and np.isnan(time).all():
+        raise ValueError(f"轨迹的{len(time)}个点都没有时间（如KML的LineString只有坐标），无法按拍摄时间插值，"
+                         f"请使用带时间的轨迹（GPX、KML gx:Track、NMEA或CSV）")
+    keep = ~(np.isnan(time) | np.isnan(track['latitude']) | np.isnan(track['longitude']))
+    order = np.argsort(time[keep], kind='stable')
+    prepared = dict(track)
+    prepared['time'] = time[keep][order]
+    for field in TRACK_FIELDS:
+        values = np.asarray(track[field], dtype=np.float64)[keep][order]
+        prepared[field] = np.nan_to_num(values) if field not in ('latitude', 'longitude') else values
+    unique = np.concatenate(([True], np.diff(prepared['time']) > 0))
+    if not unique.all():
+        prepared['time'] = prepared['time'][unique]
+        for field in TRACK_FIELDS:
+            prepared[field] = prepared[field][unique]
+    if len(prepared['time']) < 2:
+        raise ValueError("轨迹中有效的点少于2个，无法插值")
+    return prepared
+
+
+def bracket_times(track_time, times, max_gap=DEFAULT_MAX_GAP):
+    """
+    用np.searchsorted找到每个时刻前后的两个轨迹点
+
+    Args:
+        track_time: 排序后的轨迹时间
+        times: 任意形状的时刻数组
+        max_gap: 前后两个轨迹点间隔超过该秒数时视为无效
+
+    Returns:
+        tuple: (前一点下标, 后一点下标, 插值权重, 是否有效)，形状与times相同；无效时权重为0
+    """
+    right = np.clip(np.searchsorted(track_time, times, side='right'), 1, len(track_time) - 1)
+    left = right - 1
+    span = track_time[right] - track_time[left]
+    weight = np.clip((times - track_time[left]) / span, 0.0, 1.0)
+    valid = (times >= track_time[0]) & (times <= track_time[-1])  # NaN比较为False
+    if max_gap is not None:
+        valid &= span <= max_gap
+    return left, right, np.where(valid, weight, 0.0), valid
+
+
+def interpolate_track(track, times, max_gap=DEFAULT_MAX_GAP):
+    """
+    在轨迹上按时间向量化插值
+
+    Args:
+        track: prepare_track整理后的轨迹
+        times: 需要插值的时刻(秒数数组)，可以无序，NaN表示时间缺失
+        max_gap: 前后两个轨迹点间隔超过该秒数时不插值，None表示不限制
+
+    Returns:
+        dict: 与times顺序一致的TRACK_FIELDS数组，以及'valid'(时间在轨迹范围内且轨迹未中断)
+    """
+    times = np.asarray(times, dtype=np.float64)
+    order = np.argsort(times, kind='stable')  # NaN排在最后
+    left, right, weight, valid = bracket_times(track['time'], times[order], max_gap)
+
+    interpolated = {}
+    for field in TRACK_FIELDS:
+        start, end = track[field][left], track[field][right]
+        if field == 'yaw':
+            # 取-180到180度之间的最短角度差，350度到10度之间经过0度而不是180度
+            delta = np.mod(end - start + 180.0, 360.0) - 180.0
+            values = normalize_angles(start + delta * weight)
+        else:
+            values = start + (end - start) * weight
+        interpolated[field] = values
+
+    result = {}
+    for field, values in list(interpolated.items()) + [('valid', valid)]:
+        restored = np.empty_like(values)
+        restored[order] = values
+        result[field] = restored
+    for field in ('latitude', 'longitude'):
+        result[field] = np.where(result['valid'], result[field], np.nan)
+    return result
+
+
+def build_track_manifest(paths, names, capture_texts, capture_times, track, time_offset=0.0,
+                         max_gap=DEFAULT_MAX_GAP):
+    """
+    为一批照片插值并编译为与compile_manifest结构相同的清单，交给现有写入流程处理
+
+    Args:
+        paths: 照片完整路径
+        names: 照片显示名称（相对路径）
+        capture_texts: EXIF格式拍摄时间字符串（相机本地时间），DateTimeOriginal保持不变
+        capture_times: 拍摄时间秒数
+        track: prepare_track整理后的轨迹
+        time_offset: 相机时间加上该秒数得到轨迹时间（时区差和相机时钟误差）
+        max_gap: 轨迹中断的判断阈值(秒)
+
+    Returns:
+        dict: 编译好的清单，另外包含'path'(照片路径)和'gps_time'(由轨迹时间得到的EXIF格式GPS时间，
+              GPX/KML/NMEA轨迹为UTC，用于GPSDateStamp/GPSTimeStamp)；
+              轨迹不含姿态时roll、pitch、yaw为NaN，direction_rational为None
+    """
+    track_times = np.asarray(capture_times, dtype=np.float64) + time_offset
+    values = interpolate_track(track, track_times, max_gap)
+    df = pd.DataFrame({
+        'filename': names,
+        'timestamp': capture_texts,
+        'latitude': values['latitude'],
+        'longitude': values['longitude'],
+        'altitude': values['altitude'],
+        'roll': values['roll'],
+        'pitch': values['pitch'],
+        'yaw': values['yaw'],
+    })
+    manifest = compile_manifest(df, 'with_header')
+    if not track['attitude']:
+        # 轨迹不含姿态时姿态角为NaN，写入时跳过方向和姿态，而不是写入0（正北、水平）
+        for field in ('roll', 'pitch', 'yaw'):
+            manifest[field] = np.full(manifest['count'], np.nan)
+        manifest['direction_rational'] = [None] * manifest['count']
+    manifest['path'] = np.array(paths, dtype=object)
+    manifest['gps_time'] = seconds_to_exif_times(track_times)
+    return manifest
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("用法: python gps_track.py <轨迹文件(CSV/GPX/KML/NMEA)> <照片> [照片 ...]")
+        sys.exit(1)
+    track = load_track(sys.argv[1])
+    photos = sys.argv[2:]
+    texts, seconds = read_capture_times(photos)
+    result = interpolate_track(track, seconds)
+    for i, photo in enumerate(photos):
+        if result['valid'][i]:
+            print(f"{os.path.basename(photo)}: {texts[i]} -> ({result['latitude'][i]:.7f}, "
+                  f"{result['longitude'][i]:.7f}, {result['altitude'][i]:.2f}) 偏航{result['yaw'][i]:.1f}")
+        else:
+            print(f"{os.path.basename(photo)}: {texts[i] or '无拍摄时间'} -> 不在轨迹范围内")
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片目录持久化目录库
+递归记录一个或多个根目录下的所有JPEG文件（大小和修改时间），保存在SQLite中。
+再次运行时只重新扫描修改时间发生变化的目录，未变化的目录只需一次stat，
+几十万张图片的任务重跑时不必重新遍历整个目录树。
+"""
+
+import os
+import sys
+import sqlite3
+
+from image_index import ImageIndex, IMAGE_EXTENSIONS
+
+# 默认的目录库位置，多个任务共用，按根目录区分
+DEFAULT_CATALOG_PATH = os.path.join(os.path.expanduser('~'), '.gps_photo_tool', 'catalog.sqlite3')
+
+# 记录的图片扩展名，按优先级排列；与ImageIndex一致只记录JPEG，无损写入只支持JPEG
+CATALOG_EXTENSIONS = IMAGE_EXTENSIONS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS directories_parent ON directories(parent);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_directory ON files(directory);
+"""
+
+
+class ImageCatalog:
+    """
+    递归图片目录库
+
+    Args:
+        roots: 根目录路径或路径列表
+        db_path: SQLite文件路径，默认为用户目录下的共用目录库
+        extensions: 记录的图片扩展名
+    """
+
+    def __init__(self, roots, db_path=None, extensions=CATALOG_EXTENSIONS):
+        if isinstance(roots, str):
+            roots = [roots]
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.db_path = db_path or DEFAULT_CATALOG_PATH
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.stats = {'directories': 0, 'rescanned': 0, 'removed': 0}
+        self._index = None
+
+        directory = os.path.dirname(os.path.abspath(self.db_path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        """关闭数据库连接"""
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def refresh(self):
+        """
+        增量更新目录库：只重新扫描修改时间变化的目录
+
+        目录的修改时间在其中增删或重命名文件、子目录时改变，
+        未变化的目录直接沿用库中记录的文件和子目录。
+
+        Returns:
+            dict: {'directories': 检查的目录数, 'rescanned': 重新扫描的目录数, 'removed': 删除的目录数}
+        """
+        self.stats = {'directories': 0, 'rescanned': 0, 'removed': 0}
+        with self.conn:
+            for root in self.roots:
+                self._refresh_root(root)
+        self._index = None
+        return dict(self.stats)
+
+    def _load_directories(self, root):
+        """读取库中该根目录下已记录的目录：{路径: 修改时间}和{父目录: [子目录]}"""
+        mtimes = {}
+        children = {}
+        for path, parent, mtime_ns in self.conn.execute(
+                "SELECT path, parent, mtime_ns FROM directories WHERE path = ? OR substr(path, 1, ?) = ?",
+                (root, len(root) + 1, root + os.sep)):
+            mtimes[path] = mtime_ns
+            children.setdefault(parent, []).append(path)
+        return mtimes, children
+
+    def _refresh_root(self, root):
+        """从根目录开始逐层检查目录的修改时间"""
+        mtimes, known_children = self._load_directories(root)
+        stack = [(root, None)]
+        while stack:
+            path, parent = stack.pop()
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                self._forget(path)
+                continue
+            self.stats['directories'] += 1
+
+            if mtimes.get(path) == mtime_ns:
+                children = known_children.get(path, [])
+            else:
+                children = self._rescan(path, parent, mtime_ns)
+                for child in set(known_children.get(path, [])) - set(children):
+                    self._forget(child)
+            stack.extend((child, path) for child in children)
+
+    def _rescan(self, path, parent, mtime_ns):
+        """重新扫描一个目录中的图片文件，返回其子目录列表"""
+        self.stats['rescanned'] += 1
+        files = []
+        children = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            children.append(entry.path)
+                        elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in self.extensions:
+                            stat = entry.stat()
+                            files.append((entry.path, path, entry.name, stat.st_size, stat.st_mtime_ns))
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"警告: 无法读取目录 {path}: {e}")
+            return []
+
+        self.conn.execute("DELETE FROM files WHERE directory = ?", (path,))
+        self.conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", files)
+        # 记录扫描前取得的修改时间，扫描过程中目录若有变化，下次运行会再次扫描
+        self.conn.execute("INSERT OR REPLACE INTO directories VALUES (?, ?, ?)", (path, parent, mtime_ns))
+        return children
+
+    def _forget(self, path):
+        """删除已不存在的目录及其下所有记录"""
+        self.stats['removed'] += 1
+        prefix = path + os.sep
+        self.conn.execute("DELETE FROM directories WHERE path = ? OR substr(path, 1, ?) = ?",
+                          (path, len(prefix), prefix))
+        self.conn.execute("DELETE FROM files WHERE directory = ? OR substr(directory, 1, ?) = ?",
+                          (path, len(prefix), prefix))
+
+    def record_written(self, paths):
+        """
+        记录本工具写入后的文件和目录状态
+
+        写入通过临时文件加重命名完成，会改变所在目录的修改时间。写入结束后更新这些文件的大小和
+        修改时间，并在目录中的图片文件名与库中记录一致时更新目录的修改时间，
+        下次运行不会因为本工具自己的写入而重新扫描；列出文件名不需要逐个stat。
+        有其他程序增删了图片的目录保持原记录，下次运行时重新扫描。
+
+        Args:
+            paths: 写入的图片路径，不在各根目录下的路径忽略
+
+        Returns:
+            int: 更新了修改时间的目录数
+        """
+        files = []
+        directories = set()
+        for path in paths:
+            path = os.path.abspath(path)
+            name = os.path.basename(path)
+            if self.root_of(path) is None or os.path.splitext(name)[1].lower() not in self.extensions:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((path, os.path.dirname(path), name, stat.st_size, stat.st_mtime_ns))
+            directories.add(os.path.dirname(path))
+
+        updated = 0
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", files)
+            for directory in directories:
+                try:
+                    # 先取修改时间再列出文件，期间若有变化，下次运行仍会重新扫描
+                    mtime_ns = os.stat(directory).st_mtime_ns
+                    with os.scandir(directory) as entries:
+                        names = {entry.name for entry in entries
+                                 if os.path.splitext(entry.name)[1].lower() in self.extensions
+                                 and entry.is_file()}
+                except OSError:
+                    continue
+                recorded = {name for name, in self.conn.execute(
+                    "SELECT name FROM files WHERE directory = ?", (directory,))}
+                if names == recorded:
+                    updated += self.conn.execute("UPDATE directories SET mtime_ns = ? WHERE path = ?",
+                                                 (mtime_ns, directory)).rowcount
+        self._index = None
+        return updated
+
+    def iter_files(self):
+        """
+        遍历库中各根目录下的文件
+
+        Yields:
+            tuple: (根目录, 完整路径, 文件名, 大小, 修改时间)
+        """
+        for root in self.roots:
+            prefix = root + os.sep
+            for path, name, size, mtime_ns in self.conn.execute(
+                    "SELECT path, name, size, mtime_ns FROM files "
+                    "WHERE directory = ? OR substr(directory, 1, ?) = ? ORDER BY path",
+                    (root, len(prefix), prefix)):
+                yield root, path, name, size, mtime_ns
+
+    def index(self):
+        """
+        将目录库加载为内存索引，CSV中的文件名按索引解析
+
+        Returns:
+            ImageIndex: 包含各根目录下所有图片的索引，支持带子目录的文件名
+        """
+        if self._index is None:
+            index = ImageIndex(extensions=self.extensions)
+            for root, path, name, _, _ in self.iter_files():
+                # 旧版本目录库中可能记录了其他扩展名的文件
+                if os.path.splitext(name)[1].lower() in self.extensions:
+                    index.add(name, path, os.path.relpath(path, root))
+            self._index = index
+        return self._index
+
+    def root_of(self, path):
+        """返回文件所在的根目录"""
+        for root in self.roots:
+            if path == root or path.startswith(root + os.sep):
+                return root
+        return None
+
+
+def open_catalog(roots, db_path=None, refresh=True):
+    """
+    打开目录库并增量更新
+
+    Args:
+        roots: 根目录路径或路径列表
+        db_path: SQLite文件路径
+        refresh: 是否立即增量更新
+
+    Returns:
+        ImageCatalog: 目录库
+    """
+    catalog = ImageCatalog(roots, db_path)
+    if refresh:
+        catalog.refresh()
+    return catalog
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法: python image_catalog.py <根目录> [根目录 ...]")
+        sys.exit(1)
+    with open_catalog(sys.argv[1:], refresh=False) as catalog:
+        stats = catalog.refresh()
+        print(f"检查目录: {stats['directories']}, 重新扫描: {stats['rescanned']}, 删除: {stats['removed']}")
+        print(f"图片文件: {len(catalog.index())}")
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片目录索引工具
+用一次os.scandir遍历建立内存索引，CSV中的文件名按索引O(1)解析，
+支持大小写不敏感、扩展名变体(.JPG/.jpeg)以及不带扩展名的文件名，
+避免在网络盘上对每一行都调用os.path.isfile。
+"""
+
+import os
+
+# 按优先级排列：同名的.jpg和.jpeg同时存在时优先匹配.jpg
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg')
+
+# 文件名匹配方式
+MATCH_EXACT = 'exact'          # 完全一致
+MATCH_CASE = 'case'            # 只有大小写不同
+MATCH_EXTENSION = 'extension'  # 扩展名不同(.jpg/.jpeg)
+MATCH_SUFFIX = 'suffix'        # CSV中缺少扩展名
+MATCH_AMBIGUOUS = 'ambiguous'  # 在多个目录中重复，无法确定
+
+# 近似匹配的说明文字
+NEAR_MISS_LABELS = {
+    MATCH_CASE: '大小写不同',
+    MATCH_EXTENSION: '扩展名不同',
+    MATCH_SUFFIX: '缺少扩展名',
+}
+
+
+def _is_jpeg(path):
+    """是否为JPEG扩展名"""
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+
+class ImageIndex:
+    """
+    图片文件名索引
+
+    Args:
+        folder: 图片文件夹路径或路径列表（不递归），提供时立即扫描；为None时由调用方通过add添加文件
+        extensions: 参与扩展名变体和文件名主干匹配的扩展名
+    """
+
+    def __init__(self, folder=None, extensions=IMAGE_EXTENSIONS):
+        self.folder = folder
+        self.folders = [] if folder is None else [folder] if isinstance(folder, str) else list(folder)
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.exact = {}      # 原始文件名 -> 完整路径
+        self.folded = {}     # 小写文件名 -> 完整路径
+        self.stems = {}      # 小写文件名主干 -> 完整路径（仅图片文件）
+        self.relative = {}   # 小写相对路径（/分隔） -> 完整路径，用于CSV中带子目录的文件名
+        self.relative_stems = {}  # 小写相对路径主干 -> 完整路径
+        self.ambiguous = set()  # 在多个目录中重复出现的小写文件名或主干
+        self.paths = []         # 所有图片文件的完整路径
+        self._stem_ranks = {}
+        self._relative_ranks = {}
+        if folder is not None:
+            self._scan()
+
+    def _scan(self):
+        """遍历一次各文件夹建立索引，DirEntry自带文件类型，不需要额外stat"""
+        for folder in self.folders:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        if not entry.is_file():
+                            continue
+                    except OSError:
+                        continue
+                    self.add(entry.name, entry.path)
+
+    def _stem_key(self, folded):
+        """图片扩展名去掉后作为主干；其他情况（不带扩展名等）整个名字作为主干"""
+        stem, ext = os.path.splitext(folded)
+        return stem if ext in self.extensions else folded
+
+    def add(self, name, path, relative=None):
+        """
+        向索引中添加一个文件
+
+        Args:
+            name: 文件名
+            path: 完整路径
+            relative: 相对于扫描根目录的路径，递归目录中使用
+        """
+        folded = name.lower()
+        directory = os.path.dirname(path)
+        existing = self.folded.get(folded)
+        if existing is not None and os.path.dirname(existing) != directory:
+            self.ambiguous.add(folded)
+        self.exact.setdefault(name, path)
+        # 大小写不同的重名文件只在区分大小写的文件系统上出现，保留第一个
+        self.folded.setdefault(folded, path)
+
+        ext = os.path.splitext(folded)[1]
+        if ext not in self.extensions:
+            return
+        self.paths.append(path)
+        rank = self.extensions.index(ext)
+        stem = self._stem_key(folded)
+        existing = self.stems.get(stem)
+        if existing is not None and (os.path.dirname(existing) != directory or
+                                     _is_jpeg(existing) != _is_jpeg(path)):
+            # 不同目录中的同名文件，或同一目录中同名的JPEG和TIFF，都无法确定是哪一张
+            self.ambiguous.add(stem)
+        else:
+            self._add_ranked(self.stems, self._stem_ranks, stem, rank, path)
+
+        if relative:
+            relative = relative.replace('\\', '/').lower()
+            self.relative.setdefault(relative, path)
+            parent = relative.rsplit('/', 1)[0] if '/' in relative else ''
+            key = f"{parent}/{stem}"
+            existing = self.relative_stems.get(key)
+            if existing is not None and _is_jpeg(existing) != _is_jpeg(path):
+                self.ambiguous.add(key)
+            self._add_ranked(self.relative_stems, self._relative_ranks, key, rank, path)
+
+    @staticmethod
+    def _add_ranked(table, ranks, key, rank, path):
+        """按扩展名优先级登记主干，同一目录中.jpg优先于.jpeg"""
+        if key in ranks and ranks[key] <= rank:
+            return
+        ranks[key] = rank
+        table[key] = path
+
+    def __len__(self):
+        return len(self.exact)
+
+    def __contains__(self, name):
+        return self.resolve(name) is not None
+
+    def image_names(self):
+        """返回索引中所有图片文件名"""
+        return [os.path.basename(path) for path in self.paths]
+
+    def is_ambiguous(self, name):
+        """文件名是否在多个目录中重复，需要在CSV中写明子目录"""
+        folded = (name or '').lower()
+        return folded in self.ambiguous or self._stem_key(folded) in self.ambiguous
+
+    def resolve(self, name):
+        """
+        将CSV中的文件名解析为实际文件路径
+
+        依次尝试：精确匹配、大小写不敏感匹配、按文件名主干匹配
+        （IMG_001、IMG_001.JPG都可以匹配img_001.jpeg）。
+
+        Args:
+            name: CSV中的文件名
+
+        Returns:
+            str: 实际文件路径，找不到或在多个目录中重复时返回None
+        """
+        return self.match(name)[0]
+
+    def match(self, name):
+        """
+        解析文件名并给出匹配方式
+
+        Args:
+            name: CSV中的文件名
+
+        Returns:
+            tuple: (实际文件路径或None, 匹配方式MATCH_*；找不到时为None)
+        """
+        if not name:
+            return None, None
+
+        normalized = name.replace('\\', '/')
+        if '/' in normalized:
+            return self._match_relative(name, normalized)
+
+        folded = name.lower()
+        if folded in self.ambiguous:
+            return None, MATCH_AMBIGUOUS
+        path = self.exact.get(name)
+        if path is not None:
+            return path, MATCH_EXACT
+        path = self.folded.get(folded)
+        if path is not None:
+            return path, MATCH_CASE
+
+        key = self._stem_key(folded)
+        if key in self.ambiguous:
+            return None, MATCH_AMBIGUOUS
+        path = self.stems.get(key)
+        if path is None:
+            return None, None
+        return path, self._variant_kind(folded)
+
+    def _variant_kind(self, folded):
+        """按主干匹配时区分扩展名不同和缺少扩展名"""
+        return MATCH_EXTENSION if os.path.splitext(folded)[1] in self.extensions else MATCH_SUFFIX
+
+    def _match_relative(self, name, normalized):
+        """解析带子目录的文件名"""
+        if not self.relative:
+            # 单层目录索引不包含子目录，退回到逐个检查
+            path = self._probe(name)
+            if path is None:
+                return None, None
+            return path, MATCH_EXACT if path.endswith(name) else MATCH_SUFFIX
+        # 只去掉开头的"./"，不能用lstrip，否则".hidden/"之类以点开头的目录名会被破坏
+        while normalized.startswith('./'):
+            normalized = normalized[2:]
+        folded = normalized.lower()
+        path = self.relative.get(folded)
+        if path is not None:
+            exact = path.replace('\\', '/').endswith(normalized)
+            return path, MATCH_EXACT if exact else MATCH_CASE
+        parent, base = folded.rsplit('/', 1) if '/' in folded else ('', folded)
+        key = f"{parent}/{self._stem_key(base)}"
+        if key in self.ambiguous:
+            return None, MATCH_AMBIGUOUS
+        path = self.relative_stems.get(key)
+        if path is None:
+            return None, None
+        return path, self._variant_kind(base)
+
+    def _probe(self, name):
+        """与原来的逻辑一致：依次在各文件夹中检查原文件名，再尝试补上.jpg"""
+        for folder in self.folders:
+            path = os.path.join(folder, name)
+            if os.path.isfile(path):
+                return path
+            if not path.lower().endswith(self.extensions):
+                path = f"{path}.jpg"
+                if os.path.isfile(path):
+                    return path
+        return None
+
+
+def analyze_matches(names, index, progress_callback=None, batch_size=5000):
+    """
+    分析CSV文件名与图片文件的对应关系，全部使用哈希查找
+
+    Args:
+        names: CSV中的文件名序列
+        index: ImageIndex
+        progress_callback: 进度回调函数(已分析数, 总数)，每批调用一次
+        batch_size: 每批分析的文件名数量
+
+    Returns:
+        dict: {'total': CSV文件名数, 'matched': 完全一致的数量,
+               'near_misses': {匹配方式: [(CSV文件名, 实际路径)]},
+               'missing': [找不到的文件名], 'ambiguous': [重复的文件名],
+               'duplicates': [CSV中重复出现的文件名], 'unmatched_images': [没有对应CSV记录的图片路径]}
+    """
+    names = list(names)
+    result = {
+        'total': len(names),
+        'matched': 0,
+        'near_misses': {kind: [] for kind in NEAR_MISS_LABELS},
+        'missing': [],
+        'ambiguous': [],
+        'duplicates': [],
+        'unmatched_images': [],
+    }
+    resolved = set()
+    seen = set()
+    for start in range(0, len(names), batch_size):
+        for name in names[start:start + batch_size]:
+            if name in seen:
+                result['duplicates'].append(name)
+                continue
+            seen.add(name)
+            path, kind = index.match(name)
+            if path is not None:
+                resolved.add(path)
+            if kind == MATCH_EXACT:
+                result['matched'] += 1
+            elif kind in NEAR_MISS_LABELS:
+                result['near_misses'][kind].append((name, path))
+            elif kind == MATCH_AMBIGUOUS:
+                result['ambiguous'].append(name)
+            else:
+                result['missing'].append(name)
+        if progress_callback:
+            progress_callback(min(start + batch_size, len(names)), len(names))
+    result['unmatched_images'] = [path for path in index.paths if path not in resolved]
+    return result
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JPEG标记段解析工具
+基于mmap扫描JPEG文件头部的标记段（SOI、APP0、APP1 EXIF/XMP、APP2等）和SOS位置，
+只读取元数据所在的少量字节，图像压缩数据通过一次整体拷贝写出。
+供写入、校验读取和预览等功能共用。
+"""
+
+import os
+import sys
+import mmap
+import shutil
+import struct
+import tempfile
+from collections import namedtuple
+from contextlib import contextmanager
+
+# APP1段的标识头
+EXIF_HEADER = b'Exif\x00\x00'
+XMP_HEADER = b'http://ns.adobe.com/xap/1.0/\x00'
+XMP_EXTENSION_HEADER = b'http://ns.adobe.com/xmp/extension/\x00'
+# XMP包尾，原地写入时补充的空白必须位于它之前
+XMP_PACKET_TRAILER = b'<?xpacket end'
+
+# 常用标记
+MARKER_SOI = 0xD8
+MARKER_EOI = 0xD9
+MARKER_SOS = 0xDA
+MARKER_APP0 = 0xE0
+MARKER_APP1 = 0xE1
+MARKER_APP2 = 0xE2
+
+# 帧头标记（SOF0-SOF15，不含DHT/JPG/DAC）
+SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# 单个标记段的最大负载长度（长度字段为16位，包含自身2字节）
+MAX_SEGMENT_PAYLOAD = 0xFFFF - 2
+
+# 标记段信息: marker为标记字节(如0xE1)，offset为0xFF所在位置，
+# payload_offset/payload_length为长度字段之后的数据位置和长度
+JpegSegment = namedtuple('JpegSegment', ['marker', 'offset', 'payload_offset', 'payload_length', 'kind'])
+
+
+def _segment_kind(marker, head):
+    """根据标记和负载开头判断标记段类型"""
+    if marker == MARKER_APP0:
+        return 'app0'
+    if marker == MARKER_APP1:
+        if head.startswith(EXIF_HEADER):
+            return 'exif'
+        if head.startswith(XMP_HEADER):
+            return 'xmp'
+        if head.startswith(XMP_EXTENSION_HEADER):
+            return 'xmp_extension'
+        return 'app1'
+    if marker == MARKER_APP2:
+        return 'app2'
+    return f'0x{marker:02X}'
+
+
+def scan_segments(buffer):
+    """
+    扫描JPEG数据中SOS之前的所有标记段
+
+    Args:
+        buffer: 支持切片的JPEG数据（mmap、bytes等）
+
+    Returns:
+        dict: {'segments': [JpegSegment...], 'sos_offset': SOS标记位置,
+               'exif': EXIF段或None, 'xmp': XMP段或None,
+               'app0': APP0段或None, 'app2': [APP2段...],
+               'frame_size': 帧头中的(宽, 高)或None}
+    """
+    size = len(buffer)
+    if size < 4 or buffer[0:2] != b'\xff\xd8':
+        raise ValueError("不是有效的JPEG文件")
+
+    segments = []
+    layout = {'segments': segments, 'sos_offset': None, 'exif': None, 'xmp': None, 'app0': None, 'app2': [],
+              'frame_size': None}
+    head = 2
+    while head + 2 <= size:
+        if buffer[head] != 0xFF:
+            raise ValueError(f"JPEG标记段结构损坏 (偏移 {head})")
+        marker = buffer[head + 1]
+        if marker == 0xFF:  # 填充字节
+            head += 1
+            continue
+        if marker == MARKER_SOS:
+            layout['sos_offset'] = head
+            break
+        if marker == MARKER_EOI:
+            break
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # 无长度字段的独立标记
+            head += 2
+            continue
+        if head + 4 > size:
+            break
+        length = struct.unpack('>H', buffer[head + 2:head + 4])[0]
+        if length < 2 or head + 2 + length > size:
+            raise ValueError(f"JPEG标记段长度无效 (偏移 {head})")
+        payload_offset = head + 4
+        kind = _segment_kind(marker, bytes(buffer[payload_offset:payload_offset + len(XMP_EXTENSION_HEADER)]))
+        segment = JpegSegment(marker, head, payload_offset, length - 2, kind)
+        segments.append(segment)
+        if kind == 'exif' and layout['exif'] is None:
+            layout['exif'] = segment
+        elif kind == 'xmp' and layout['xmp'] is None:
+            layout['xmp'] = segment
+        elif kind == 'app0' and layout['app0'] is None:
+            layout['app0'] = segment
+        elif kind == 'app2':
+            layout['app2'].append(segment)
+        elif marker in SOF_MARKERS and layout['frame_size'] is None and length >= 7:
+            height, width = struct.unpack('>HH', buffer[payload_offset + 1:payload_offset + 5])
+            layout['frame_size'] = (width, height)
+        head += 2 + length
+
+    if layout['sos_offset'] is None:
+        raise ValueError("未找到SOS标记，JPEG文件不完整")
+    return layout
+
+
+def scan_jpeg_file(image_path):
+    """
+    使用mmap扫描JPEG文件的标记段，不把整个文件读入内存
+
+    Args:
+        image_path: JPEG文件路径
+
+    Returns:
+        dict: scan_segments的结果，另外包含'file_size'
+    """
+    with open(image_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size < 4:
+            raise ValueError("不是有效的JPEG文件")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            layout = scan_segments(mm)
+    layout['file_size'] = file_size
+    return layout
+
+
+def read_segment_payload(image_path, segment):
+    """读取单个标记段的负载数据"""
+    with open(image_path, 'rb') as f:
+        f.seek(segment.payload_offset)
+        return f.read(segment.payload_length)
+
+
+def read_exif_bytes(image_path, layout=None):
+    """
+    只读取APP1/EXIF段的数据
+
+    Returns:
+        bytes: 以b"Exif\\x00\\x00"开头的EXIF数据，没有EXIF段时返回None
+    """
+    if layout is None:
+        layout = scan_jpeg_file(image_path)
+    if layout['exif'] is None:
+        return None
+    return read_segment_payload(image_path, layout['exif'])
+
+
+def read_xmp_packet(image_path, layout=None):
+    """
+    只读取APP1/XMP段中的XMP包
+
+    Returns:
+        bytes: XMP包内容（不含标识头），没有XMP段时返回None
+    """
+    if layout is None:
+        layout = scan_jpeg_file(image_path)
+    if layout['xmp'] is None:
+        return None
+    return read_segment_payload(image_path, layout['xmp'])[len(XMP_HEADER):]
+
+
+def load_exif_dict(image_path, layout=None):
+    """
+    读取EXIF并解析为piexif字典，只读取文件头部的EXIF段
+
+    Returns:
+        dict: piexif格式的EXIF字典，没有EXIF时返回空字典结构
+    """
+    import piexif
+
+    exif_bytes = read_exif_bytes(image_path, layout)
+    if not exif_bytes:
+        return {"0th": {}, "Exif": {}, "GPS": {}, "Interop": {}, "1st": {}, "thumbnail": None}
+    return piexif.load(exif_bytes)
+
+
+def build_app1_segment(payload):
+    """将负载数据封装为APP1标记段"""
+    if len(payload) > MAX_SEGMENT_PAYLOAD:
+        raise ValueError(f"APP1数据过大({len(payload)}字节)，超出单个标记段的限制")
+    return b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload
+
+
+def pad_payload(payload, padding):
+    """在负载末尾补零，为以后的原地更新预留空间（不超过单个标记段的上限）"""
+    if padding <= 0:
+        return payload
+    target = min(len(payload) + padding, MAX_SEGMENT_PAYLOAD)
+    return payload + b'\x00' * (target - len(payload))
+
+
+def build_metadata_header(buffer, layout, exif_bytes=None, xmp_bytes=None):
+    """
+    生成替换元数据后的文件头部（SOS之前的全部字节）
+
+    新的EXIF段放在SOI（以及JFIF APP0）之后，XMP段紧随其后；
+    传入的EXIF/XMP会替换原有的对应段，未传入的保持原样。
+
+    Args:
+        buffer: 原始JPEG数据（mmap或bytes）
+        layout: scan_segments的结果
+        exif_bytes: 新的EXIF数据（以b"Exif\\x00\\x00"开头），None表示保留原有EXIF
+        xmp_bytes: 新的XMP包（不含标识头），None表示保留原有XMP
+
+    Returns:
+        bytes: 文件头部字节
+    """
+    new_segments = []
+    if exif_bytes is not None:
+        new_segments.append(build_app1_segment(exif_bytes))
+    if xmp_bytes is not None:
+        new_segments.append(build_app1_segment(XMP_HEADER + xmp_bytes))
+
+    kept = []
+    insert_at = 0
+    for segment in layout['segments']:
+        if segment.kind == 'exif' and exif_bytes is not None:
+            continue
+        if segment.kind in ('xmp', 'xmp_extension') and xmp_bytes is not None:
+            continue
+        if segment.kind == 'app0' and not kept:
+            insert_at = 1  # 元数据段放在JFIF APP0之后
+        kept.append(bytes(buffer[segment.offset:segment.payload_offset + segment.payload_length]))
+
+    kept[insert_at:insert_at] = new_segments
+    return b'\xff\xd8' + b''.join(kept)
+
+
+@contextmanager
+def atomic_output(save_path, fsync=False, mode_source=None):
+    """
+    原子写入：在目标目录中写临时文件，完成后重命名为目标文件
+
+    写入过程中出错或中断时目标文件保持原样，临时文件被删除。
+
+    Args:
+        save_path: 目标文件路径
+        fsync: 重命名前是否将临时文件刷新到磁盘
+        mode_source: 复制文件权限的来源文件，默认使用已存在的目标文件
+
+    Yields:
+        str: 临时文件路径，调用方向其中写入完整内容
+    """
+    directory = os.path.dirname(os.path.abspath(save_path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(save_path)}.", suffix='.tmp', dir=directory)
+    os.close(fd)
+    try:
+        yield temp_path
+        source = save_path if os.path.exists(save_path) else mode_source
+        if source and os.path.exists(source):
+            shutil.copymode(source, temp_path)
+        if fsync:
+            fsync_file(temp_path)
+        os.replace(temp_path, save_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def fsync_file(path):
+    """将文件内容刷新到磁盘"""
+    fd = os.open(path, os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_directory(directory):
+    """将目录项（如重命名结果）刷新到磁盘；Windows不支持打开目录，直接跳过"""
+    if os.name == 'nt':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def sync_files(paths):
+    """
+    批量刷新文件到磁盘，用于整批处理结束后统一落盘
+
+    逐个fsync本批写入的文件，再对其所在目录各fsync一次使重命名持久化，
+    只刷新本次写入的数据，不影响系统中其他进程的脏页。
+
+    注意：未fsync就重命名的文件在批量刷新前断电时可能为空或被截断，
+    因此覆盖原图时应在重命名前fsync临时文件（见atomic_output的fsync参数），
+    批量刷新只适合写入新文件。
+    """
+    directories = set()
+    for path in paths:
+        if os.path.exists(path):
+            fsync_file(path)
+            directories.add(os.path.dirname(os.path.abspath(path)))
+    for directory in directories:
+        fsync_directory(directory)
+
+
+def rewrite_jpeg_metadata(image_path, save_path, exif_bytes=None, xmp_bytes=None, exif_padding=0, fsync=False):
+    """
+    重写JPEG的元数据段，图像压缩数据原样拷贝
+
+    只读取SOS之前的文件头部，SOS之后的数据通过一次整体拷贝写入目标目录中的
+    临时文件，完成后原子重命名，覆盖原图时中途失败也不会损坏原文件。
+
+    Args:
+        image_path: 原始JPEG路径
+        save_path: 输出路径，可以与原始路径相同
+        exif_bytes: 新的EXIF数据，None表示保留原有EXIF
+        xmp_bytes: 新的XMP包，None表示保留原有XMP
+        exif_padding: EXIF段末尾预留的空字节数，便于以后原地更新
+        fsync: 重命名前是否将文件刷新到磁盘
+    """
+    if exif_bytes is not None:
+        exif_bytes = pad_payload(exif_bytes, exif_padding)
+
+    with open(image_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < 4:
+            raise ValueError("不是有效的JPEG文件")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            layout = scan_segments(mm)
+            header = build_metadata_header(mm, layout, exif_bytes, xmp_bytes)
+            with atomic_output(save_path, fsync, mode_source=image_path) as temp_path:
+                with open(temp_path, 'wb') as out, memoryview(mm) as view:
+                    out.write(header)
+                    out.write(view[layout['sos_offset']:])
+
+
+def patch_metadata_in_place(image_path, exif_bytes, layout=None, xmp_bytes=None, fsync=False):
+    """
+    原地覆盖已有的EXIF段（以及XMP段），不重写整个文件
+
+    只有当原有各段的空间都足够容纳新数据时才写入，EXIF剩余空间补零，
+    XMP剩余空间在包尾<?xpacket end?>之前补空白；标记段长度不变，因此文件其余部分无需移动。
+    带有扩展XMP段的文件总是返回False，由rewrite_jpeg_metadata整体重写并删除旧的扩展段。
+
+    注意：这不是原子操作——EXIF和XMP分两次定位写入，没有临时文件也无法回滚，
+    写入中途断电或出错时文件可能只更新了一部分。调用方应传入fsync=True，
+    并只在可以接受这一风险时使用；需要原子替换时使用rewrite_jpeg_metadata。
+
+    Args:
+        image_path: JPEG文件路径
+        exif_bytes: 新的EXIF数据（以b"Exif\\x00\\x00"开头）
+        layout: 已扫描的标记段结构，不提供时重新扫描
+        xmp_bytes: 新的XMP包（不含标识头），None表示不修改XMP
+        fsync: 写入后是否刷新到磁盘
+
+    Returns:
+        bool: 成功原地写入返回True，空间不足、缺少对应段或有扩展XMP段时返回False
+    """
+    if layout is None:
+        layout = scan_jpeg_file(image_path)
+    if any(segment.kind == 'xmp_extension' for segment in layout['segments']):
+        return False
+
+    writes = []
+    segment = layout['exif']
+    if segment is None or len(exif_bytes) > segment.payload_length:
+        return False
+    writes.append((segment.payload_offset, exif_bytes + b'\x00' * (segment.payload_length - len(exif_bytes))))
+
+    if xmp_bytes is not None:
+        segment = layout['xmp']
+        payload = XMP_HEADER + xmp_bytes
+        if segment is None or len(payload) > segment.payload_length:
+            return False
+        # 空白填在包尾之前，保持xpacket包装完整；没有包尾时填在根元素之后
+        padding = b' ' * (segment.payload_length - len(payload))
+        trailer = payload.rfind(XMP_PACKET_TRAILER)
+        if trailer < 0:
+            trailer = len(payload)
+        writes.append((segment.payload_offset, payload[:trailer] + padding + payload[trailer:]))
+
+    with open(image_path, 'r+b') as f:
+        for offset, payload in writes:
+            f.seek(offset)
+            f.write(payload)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    return True
+
+
+def describe_jpeg(image_path):
+    """打印JPEG标记段结构，用于预览和排查"""
+    layout = scan_jpeg_file(image_path)
+    print(f"文件: {image_path}")
+    print(f"大小: {layout['file_size']} 字节")
+    for segment in layout['segments']:
+        print(f"  0xFF{segment.marker:02X}  偏移={segment.offset:<8d} 长度={segment.payload_length:<6d} 类型={segment.kind}")
+    print(f"  SOS偏移: {layout['sos_offset']} (元数据头部占 {layout['sos_offset']} 字节)")
+    return layout
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法: python jpeg_segments.py <图片路径> [...]")
+    for path in sys.argv[1:]:
+        try:
+            describe_jpeg(path)
+        except Exception as e:
+            print(f"解析失败: {path}: {e}")
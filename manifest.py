@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CSV清单编译工具
+一次性解析列映射，把整个CSV清单转换为按列存放的数组，
+并用NumPy/pandas向量化预先计算度分秒有理数、标准化偏航角和EXIF时间字符串，
+避免逐行iterrows、逐格回退查找列名和pd.notna判断。
+"""
+
+import csv
+import queue
+import threading
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+# 无表头格式的固定列顺序：文件名,时间,经度,纬度,高度,Pitch,Roll,Yaw
+NO_HEADER_COLUMNS = ['filename', 'timestamp', 'longitude', 'latitude', 'altitude', 'pitch', 'roll', 'yaw']
+
+# 有表头格式中各字段可用的列名，按优先级排列
+HEADER_ALIASES = {
+    'filename': ['文件名', 'filename'],
+    'timestamp': ['时间', 'timestamp'],
+    'longitude': ['经度', 'longitude'],
+    'latitude': ['纬度', 'latitude'],
+    'altitude': ['高度', 'altitude'],
+    'pitch': ['Pitch', 'pitch'],
+    'roll': ['Roll', 'roll'],
+    'yaw': ['Yaw', 'yaw', '方向角'],
+    'profile': ['相机', 'camera', 'profile', 'OPT'],
+}
+
+# 流式读取时每块的行数
+DEFAULT_CHUNK_ROWS = 50000
+
+# 支持的时间格式
+TIMESTAMP_FORMATS = [
+    '%Y-%m-%d %H:%M:%S',      # 标准格式：2024-08-18 10:30:00
+    '%Y-%m-%d_%H:%M:%S',      # 下划线格式：2020-10-18_12:19:00
+    '%Y/%m/%d %H:%M:%S',      # 斜杠格式
+    '%Y-%m-%d %H-%M-%S',      # 连字符格式
+    '%Y:%m:%d %H:%M:%S',      # EXIF格式（已预先转换的时间）
+    '%Y-%m-%d %H:%M:%S.%f',   # 带小数秒（轨迹文件常用）
+    '%Y-%m-%dT%H:%M:%S',      # ISO格式
+    '%Y-%m-%dT%H:%M:%S.%f',
+]
+
+
+def mapping_column_names(column_count):
+    """列映射对话框中无表头CSV使用的列名：列1、列2..."""
+    return [f"列{i+1}" for i in range(column_count)]
+
+
+def _name_columns(df, csv_format, column_mapping=None):
+    """按格式设置DataFrame的列名"""
+    if csv_format != 'no_header':
+        return df
+    if column_mapping:
+        df.columns = mapping_column_names(len(df.columns))
+    elif len(df.columns) >= len(NO_HEADER_COLUMNS):
+        df.columns = NO_HEADER_COLUMNS + list(df.columns[len(NO_HEADER_COLUMNS):])
+    else:
+        raise ValueError(f"CSV列数不足，需要至少8列，实际只有{len(df.columns)}列")
+    return df
+
+
+def read_manifest(csv_file, csv_format, column_mapping=None):
+    """
+    读取CSV清单为DataFrame，并按格式设置列名
+
+    Args:
+        csv_file: CSV文件路径
+        csv_format: 'with_header'或'no_header'
+        column_mapping: 用户列映射（GUI），无表头时列名为"列1"、"列2"...
+
+    Returns:
+        DataFrame: CSV数据
+    """
+    header = None if csv_format == 'no_header' else 'infer'
+    df = pd.read_csv(csv_file, header=header, encoding='utf-8-sig')
+    return _name_columns(df, csv_format, column_mapping)
+
+
+def count_csv_rows(csv_file, has_header=True, block_size=1024 * 1024):
+    """
+    按块统计换行符快速估算CSV的数据行数，不解析内容
+
+    Args:
+        csv_file: CSV文件路径
+        has_header: 第一行是否为表头
+        block_size: 每次读取的字节数
+
+    Returns:
+        int: 数据行数
+    """
+    count = 0
+    last = b'\n'
+    with open(csv_file, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            count += block.count(b'\n')
+            last = block[-1:]
+    if last != b'\n':
+        count += 1  # 最后一行没有换行符
+    if has_header and count > 0:
+        count -= 1
+    return count
+
+
+def read_csv_head(csv_file, rows=10):
+    """
+    只读取CSV开头的若干行（用于预览和识别列），不读取文件其余部分
+
+    Args:
+        csv_file: CSV文件路径
+        rows: 读取的行数（包括表头）
+
+    Returns:
+        list: 每行的字段列表
+    """
+    with open(csv_file, 'r', encoding='utf-8-sig', newline='') as f:
+        return list(islice(csv.reader(f), rows))
+
+
+def iter_manifest_chunks(csv_file, csv_format, column_mapping=None, chunksize=DEFAULT_CHUNK_ROWS, prefetch=2):
+    """
+    流式分块读取并编译CSV清单
+
+    后台线程按块解析CSV并调用compile_manifest，最多预读prefetch块，
+    调用方处理当前块的同时后续块仍在解析，内存占用与文件大小无关。
+
+    Args:
+        csv_file: CSV文件路径
+        csv_format: 'with_header'或'no_header'
+        column_mapping: 用户列映射（GUI）
+        chunksize: 每块的行数，None表示一次读取整个文件
+        prefetch: 最多预读的块数
+
+    Yields:
+        tuple: (该块第一行的行号, compile_manifest的结果)
+    """
+    chunks = queue.Queue(maxsize=max(1, prefetch))
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def reader():
+        try:
+            header = None if csv_format == 'no_header' else 'infer'
+            if chunksize:
+                frames = pd.read_csv(csv_file, header=header, encoding='utf-8-sig', chunksize=chunksize)
+            else:
+                frames = [pd.read_csv(csv_file, header=header, encoding='utf-8-sig')]
+            offset = 0
+            for df in frames:
+                df = _name_columns(df, csv_format, column_mapping)
+                if not put((offset, compile_manifest(df, csv_format, column_mapping))):
+                    return
+                offset += len(df)
+            put(done)
+        except Exception as e:
+            put(e)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def resolve_column_mapping(columns, csv_format, column_mapping=None):
+    """
+    确定每个字段对应的列名，只在编译开始时解析一次
+
+    Args:
+        columns: DataFrame的列名
+        csv_format: 'with_header'或'no_header'
+        column_mapping: 用户列映射，提供时优先使用
+
+    Returns:
+        dict: {字段名: 列名或None}
+    """
+    columns = list(columns)
+    if column_mapping:
+        return {field: column_mapping.get(field) if column_mapping.get(field) in columns else None
+                for field in HEADER_ALIASES}
+    if csv_format == 'no_header':
+        return {field: field if field in columns else None for field in HEADER_ALIASES}
+    resolved = {}
+    for field, aliases in HEADER_ALIASES.items():
+        resolved[field] = next((alias for alias in aliases if alias in columns), None)
+    return resolved
+
+
+def _numeric_column(df, column, default=None):
+    """将列转换为float64数组，无法解析的值为NaN；default不为None时NaN替换为默认值"""
+    if column is None:
+        values = np.full(len(df), np.nan if default is None else default, dtype=np.float64)
+    else:
+        values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64)
+    if default is not None:
+        values = np.where(np.isnan(values), default, values)
+    return values
+
+
+def _string_column(df, column):
+    """将列转换为去除首尾空白的字符串数组，缺失值为空字符串"""
+    if column is None:
+        return np.full(len(df), '', dtype=object)
+    series = df[column]
+    return series.astype(str).str.strip().where(series.notna(), '').to_numpy(dtype=object)
+
+
+def parse_timestamps(values):
+    """
+    向量化按TIMESTAMP_FORMATS依次解析时间字符串
+
+    Args:
+        values: 时间字符串数组
+
+    Returns:
+        Series: datetime64[ns]时间，无法解析的为NaT
+    """
+    text = pd.Series(values, dtype=object)
+    parsed = pd.Series(pd.NaT, index=text.index, dtype='datetime64[ns]')
+    for fmt in TIMESTAMP_FORMATS:
+        missing = parsed.isna()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(text[missing], format=fmt, errors='coerce')
+    return parsed
+
+
+def timestamps_to_seconds(values):
+    """
+    向量化将时间字符串转换为秒数（1970年起，不做时区换算），便于插值计算
+
+    Returns:
+        ndarray: float64秒数数组，无法解析的为NaN
+    """
+    parsed = parse_timestamps(values)
+    seconds = parsed.to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+    return np.where(parsed.isna().to_numpy(), np.nan, seconds)
+
+
+def convert_timestamps(values):
+    """
+    向量化解析时间字符串，统一转换为EXIF格式
+
+    Args:
+        values: 时间字符串数组
+
+    Returns:
+        ndarray: EXIF格式时间字符串数组，无法解析的为None
+    """
+    return _format_exif_times(parse_timestamps(values))
+
+
+def seconds_to_exif_times(seconds):
+    """
+    向量化将秒数（1970年起，不做时区换算）转换为EXIF格式时间字符串，不足一秒的部分舍去
+
+    Returns:
+        ndarray: EXIF格式时间字符串数组，NaN为None
+    """
+    return _format_exif_times(pd.Series(pd.to_datetime(np.asarray(seconds, dtype=np.float64), unit='s')))
+
+
+def _format_exif_times(parsed):
+    """datetime64 Series格式化为EXIF时间字符串数组，NaT为None"""
+    # datetime_as_string得到"YYYY-MM-DDTHH:MM:SS"，直接改写分隔符字符为EXIF格式，比逐个strftime快得多
+    valid = parsed.notna().to_numpy()
+    text = np.datetime_as_string(parsed.to_numpy(dtype='datetime64[s]'), unit='s').astype('U19')
+    codes = text.view(np.uint32).reshape(-1, 19)
+    codes[:, [4, 7]] = ord(':')
+    codes[:, 10] = ord(' ')
+    formatted = codes.reshape(-1).view('U19').astype(object)
+    return np.where(valid, formatted, None)
+
+
+def normalize_angles(values):
+    """向量化标准化角度到0-360度范围"""
+    normalized = np.mod(values, 360.0)
+    # 极小的负数取模后会得到360.0，需要归零
+    return np.where(normalized >= 360.0, normalized - 360.0, normalized)
+
+
+def dms_rationals(values):
+    """
+    向量化将十进制度数转换为度分秒有理数，与decimal_to_dms的结果一致
+
+    Returns:
+        list: 每个值对应[(度, 1), (分, 1), (秒*100, 100)]
+    """
+    absolute = np.abs(values)
+    degrees = np.floor(absolute)
+    minutes_float = (absolute - degrees) * 60
+    minutes = np.floor(minutes_float)
+    seconds = np.trunc((minutes_float - minutes) * 60 * 100)
+    table = np.stack([degrees, minutes, seconds], axis=1).astype(np.int64).tolist()
+    return [[(d, 1), (m, 1), (s, 100)] for d, m, s in table]
+
+
+def compile_manifest(df, csv_format, column_mapping=None):
+    """
+    将CSV清单编译为按列存放的数组，并预先计算写入EXIF所需的值
+
+    Args:
+        df: read_manifest读取的DataFrame
+        csv_format: 'with_header'或'no_header'
+        column_mapping: 用户列映射（GUI）
+
+    Returns:
+        dict: 各字段数组（filename、latitude、longitude、altitude、roll、pitch、yaw、
+              timestamp、exif_time、profile）以及预计算的EXIF值（lat_dms、lng_dms、altitude_rational、
+              direction_rational）、坐标有效标记valid
+    """
+    mapping = resolve_column_mapping(df.columns, csv_format, column_mapping)
+
+    latitude = _numeric_column(df, mapping['latitude'], 0.0 if mapping['latitude'] is None else None)
+    longitude = _numeric_column(df, mapping['longitude'], 0.0 if mapping['longitude'] is None else None)
+    valid = ~(np.isnan(latitude) | np.isnan(longitude))
+    safe_latitude = np.where(valid, latitude, 0.0)
+    safe_longitude = np.where(valid, longitude, 0.0)
+
+    altitude = _numeric_column(df, mapping['altitude'], 0.0)
+    roll = _numeric_column(df, mapping['roll'], 0.0)
+    pitch = _numeric_column(df, mapping['pitch'], 0.0)
+    yaw = normalize_angles(_numeric_column(df, mapping['yaw'], 0.0))
+
+    timestamp = _string_column(df, mapping['timestamp'])
+    exif_time = convert_timestamps(timestamp)
+
+    return {
+        'count': len(df),
+        'mapping': mapping,
+        'filename': _string_column(df, mapping['filename']),
+        'latitude': latitude,
+        'longitude': longitude,
+        'altitude': altitude,
+        'roll': roll,
+        'pitch': pitch,
+        'yaw': yaw,
+        'timestamp': timestamp,
+        'exif_time': exif_time,
+        'profile': _string_column(df, mapping['profile']),
+        'valid': valid,
+        'lat_dms': dms_rationals(safe_latitude),
+        'lng_dms': dms_rationals(safe_longitude),
+        'altitude_rational': (np.abs(altitude) * 100).astype(np.int64).tolist(),
+        'direction_rational': (yaw * 100).astype(np.int64).tolist(),
+    }
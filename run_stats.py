@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量处理的运行统计
+写入流程在主线程中按结果累加轻量计数（完成数、读写字节数、各阶段耗时、在途任务数），
+界面或命令行按定时器读取快照计算速度、吞吐量、阶段平均耗时和剩余时间，不按每张图片刷新。
+"""
+
+import time
+import threading
+from array import array
+
+import numpy as np
+
+# 处理阶段及显示名称，按处理顺序排列
+STAGES = (
+    ('resolve', "查找文件"),
+    ('read', "读取EXIF"),
+    ('exif', "生成EXIF"),
+    ('xmp', "生成XMP"),
+    ('write', "写入文件"),
+)
+
+# 计算实时速度的时间窗口(秒)，ETA按该窗口内的速度估算
+RATE_WINDOW = 10.0
+
+# 输出的单张耗时百分位
+LATENCY_PERCENTILES = (50, 90, 95, 99)
+
+
+class RunStats:
+    """线程安全的运行计数，写入流程调用record_*累加，界面调用snapshot读取"""
+
+    def __init__(self, total=0):
+        self._lock = threading.Lock()
+        self.total = total
+        self.started = time.perf_counter()
+        self.completed = 0
+        self.success = 0
+        self.failed = 0
+        self.skipped = 0
+        self.submitted = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.stage_seconds = {stage: 0.0 for stage, _ in STAGES}
+        self.stage_counts = {stage: 0 for stage, _ in STAGES}
+        self.latencies = array('d')
+        # (时间, 完成数)采样，用于计算最近RATE_WINDOW秒内的速度
+        self._samples = [(self.started, 0)]
+
+    def start(self, total):
+        """开始处理时设置记录总数并重新计时"""
+        with self._lock:
+            self.total = total
+            self.started = time.perf_counter()
+            self._samples = [(self.started, 0)]
+
+    def record_submitted(self):
+        """一个任务交给写入线程/进程"""
+        with self._lock:
+            self.submitted += 1
+
+    def record_stage(self, stage, seconds):
+        """累加主线程中某个阶段的耗时（如查找文件）"""
+        with self._lock:
+            self.stage_seconds[stage] += seconds
+            self.stage_counts[stage] += 1
+
+    def record_skipped(self, failed=False):
+        """生成任务阶段跳过或失败的记录（未交给写入线程/进程）"""
+        with self._lock:
+            self.completed += 1
+            if failed:
+                self.failed += 1
+            else:
+                self.skipped += 1
+
+    def record_result(self, result):
+        """
+        累加一个任务结果
+
+        Args:
+            result: _process_job的结果，包含'success'、'elapsed'、'bytes'，以及可选的'bytes_read'和'stages'
+        """
+        with self._lock:
+            self.completed += 1
+            if result['success']:
+                self.success += 1
+            else:
+                self.failed += 1
+            self.bytes_written += result.get('bytes', 0)
+            self.bytes_read += result.get('bytes_read', 0)
+            for stage, seconds in (result.get('stages') or {}).items():
+                if stage in self.stage_seconds:
+                    self.stage_seconds[stage] += seconds
+                    self.stage_counts[stage] += 1
+            self.latencies.append(result['elapsed'])
+
+    def snapshot(self):
+        """
+        读取当前统计
+
+        Returns:
+            dict: 完成数、速度(张/秒，整体和最近RATE_WINDOW秒)、读写MB/秒、在途任务数、
+                  各阶段平均耗时(毫秒)和剩余时间(秒，无法估计时为None)
+        """
+        now = time.perf_counter()
+        with self._lock:
+            elapsed = now - self.started
+            self._samples.append((now, self.completed))
+            while len(self._samples) > 2 and now - self._samples[1][0] >= RATE_WINDOW:
+                self._samples.pop(0)
+            window_time, window_count = self._samples[0]
+            recent_rate = (self.completed - window_count) / (now - window_time) if now > window_time else 0.0
+            rate = self.completed / elapsed if elapsed > 0 else 0.0
+            remaining = max(self.total - self.completed, 0)
+            current_rate = recent_rate or rate
+            return {
+                'total': self.total,
+                'completed': self.completed,
+                'success': self.success,
+                'failed': self.failed,
+                'skipped': self.skipped,
+                'elapsed': elapsed,
+                'images_per_sec': rate,
+                'recent_images_per_sec': recent_rate,
+                'read_mb_per_sec': self.bytes_read / elapsed / 1024 / 1024 if elapsed > 0 else 0.0,
+                'write_mb_per_sec': self.bytes_written / elapsed / 1024 / 1024 if elapsed > 0 else 0.0,
+                'in_flight': self.submitted - len(self.latencies),
+                'stage_ms': {stage: self.stage_seconds[stage] / self.stage_counts[stage] * 1000
+                             if self.stage_counts[stage] else 0.0 for stage, _ in STAGES},
+                'eta': remaining / current_rate if current_rate > 0 else None,
+            }
+
+    def latency_percentiles(self):
+        """单张处理耗时的百分位(毫秒)，{'p50': ..., 'p90': ...}；没有结果时为空字典"""
+        with self._lock:
+            if not self.latencies:
+                return {}
+            values = np.percentile(np.frombuffer(self.latencies, dtype=np.float64), LATENCY_PERCENTILES) * 1000
+        return {f"p{p}": round(float(v), 3) for p, v in zip(LATENCY_PERCENTILES, values)}
+
+
+def format_duration(seconds):
+    """秒数格式化为"时:分:秒"，None时返回"--:--:--" """
+    if seconds is None:
+        return "--:--:--"
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
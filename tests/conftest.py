@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""测试公共工具：生成小尺寸JPEG和CSV清单"""
+
+import os
+import sys
+
+import pytest
+import piexif
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CSV_HEADER = "文件名,时间,经度,纬度,高度,Pitch,Roll,Yaw\n"
+
+
+def make_jpeg(path, size=(64, 48), color=(120, 80, 40), datetime_original=None, exif=True):
+    """生成测试JPEG，可选带DateTimeOriginal的EXIF"""
+    image = Image.new('RGB', size, color)
+    kwargs = {'quality': 90}
+    if exif:
+        exif_dict = {'0th': {piexif.ImageIFD.Make: b"TestCam"}, 'Exif': {}, 'GPS': {}, '1st': {}}
+        if datetime_original:
+            exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal] = datetime_original.encode('ascii')
+        kwargs['exif'] = piexif.dump(exif_dict)
+    image.save(path, 'JPEG', **kwargs)
+    return str(path)
+
+
+def write_csv(path, rows, header=True):
+    """rows为CSV行字符串列表"""
+    with open(path, 'w', encoding='utf-8') as f:
+        if header:
+            f.write(CSV_HEADER)
+        for row in rows:
+            f.write(row + "\n")
+    return str(path)
+
+
+@pytest.fixture
+def image_folder(tmp_path):
+    """包含IMG_001.jpg ~ IMG_006.jpg的文件夹"""
+    folder = tmp_path / "images"
+    folder.mkdir()
+    for i in range(1, 7):
+        make_jpeg(folder / f"IMG_{i:03d}.jpg", datetime_original=f"2024:08:18 10:30:{i:02d}")
+    return folder
+
+
+def csv_row(i, lat=30.5, lng=114.3):
+    """第i张图片的标准CSV行"""
+    return f"IMG_{i:03d}.jpg,2024-08-18 10:30:{i:02d},{lng + i * 0.001},{lat + i * 0.001},100.5,-90,0,{i * 10}"
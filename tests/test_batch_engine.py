@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""批处理引擎测试：并行方式、相机参数"""
+
+import piexif
+import pytest
+
+from conftest import write_csv, csv_row
+from batch_add_gps_info import process_images_from_csv, EXECUTOR_PROCESS, EXECUTOR_THREAD
+
+OPT_FILE = "cameraInfo/6100-40.opt"
+
+
+@pytest.mark.parametrize('executor', [EXECUTOR_PROCESS, EXECUTOR_THREAD])
+def test_parallel_executors(tmp_path, image_folder, executor):
+    csv_file = write_csv(tmp_path / "pos.csv", [csv_row(i) for i in range(1, 7)])
+    output_dir = tmp_path / "out"
+    result = process_images_from_csv(csv_file, str(image_folder), output_dir=str(output_dir), workers=2,
+                                     executor=executor, progress_callback=lambda *args: None)
+    assert (result['success'], result['failed']) == (6, 0)
+    assert sum(stat['images'] for stat in result['workers'].values()) == 6
+    exif = piexif.load(str(output_dir / "IMG_003.jpg"))
+    assert exif['GPS'][piexif.GPSIFD.GPSLatitudeRef] == b"N"
+
+
+def test_focal_length_written_without_per_image_output(tmp_path, image_folder, capfd, request):
+    opt_file = str(request.config.rootpath / OPT_FILE)
+    csv_file = write_csv(tmp_path / "pos.csv", [csv_row(1), csv_row(2)])
+    output_dir = tmp_path / "out"
+    result = process_images_from_csv(csv_file, str(image_folder), opt_file=opt_file, output_dir=str(output_dir),
+                                     workers=2, progress_callback=lambda *args: None)
+    assert result['success'] == 2
+    out, err = capfd.readouterr()
+    for message in ("写入实际焦距", "写入35mm等效焦距", "EXIF焦距字段检查"):
+        assert message not in out + err
+    exif = piexif.load(str(output_dir / "IMG_001.jpg"))
+    assert piexif.ExifIFD.FocalLength in exif['Exif']
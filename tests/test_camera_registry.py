@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""相机参数库测试"""
+
+import os
+
+import pytest
+
+from camera_registry import get_camera_registry, find_opt_file, image_camera_key, CameraRegistry
+
+OPT_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
+<OpticalProperties version="1.0">
+	<Name>{name}</Name>
+	<ImageDimensions><Width>{width}</Width><Height>{height}</Height></ImageDimensions>
+	<SensorSize>35.7</SensorSize>
+	<FocalLength>{focal}</FocalLength>
+	<Exif><Make>{make}</Make><Model>{model}</Model><LensModel>{lens}</LensModel></Exif>
+</OpticalProperties>
+"""
+
+
+def write_opt(directory, stem, make="SONY", model="ILCE-7RM4", lens="", width=9504, height=6336, focal=35.0):
+    path = directory / f"{stem}.opt"
+    path.write_text(OPT_TEMPLATE.format(name=stem, make=make, model=model, lens=lens, width=width, height=height,
+                                        focal=focal), encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def camera_dir(tmp_path):
+    directory = tmp_path / "cameras"
+    directory.mkdir()
+    write_opt(directory, "7r4-35", focal=35.0)
+    write_opt(directory, "7r4-50", focal=50.0)
+    write_opt(directory, "a5100", model="ILCE-5100", width=6000, height=4000, focal=20.0)
+    return directory
+
+
+def key(model, width, height, focal=None, make="SONY"):
+    return (make.lower(), model.lower(), '', width, height, focal)
+
+
+def test_image_camera_key():
+    exif = {'0th': {271: b"SONY\x00", 272: "  ILCE-5100 "}, 'Exif': {37386: (201, 10), 40962: 6000, 40963: 4000}}
+    assert image_camera_key(exif) == ("sony", "ilce-5100", "", 6000, 4000, 20.1)
+    assert image_camera_key(exif, (4000, 6000))[3:5] == (4000, 6000)
+    assert image_camera_key({}) == ("", "", "", None, None, None)
+
+
+def test_match_by_model_and_size(camera_dir):
+    registry = CameraRegistry(str(camera_dir))
+    assert len(registry) == 3
+    assert os.path.basename(registry.match(key("ILCE-5100", 6000, 4000)).path) == "a5100.opt"
+    # 竖拍时宽高互换
+    assert os.path.basename(registry.match(key("ILCE-5100", 4000, 6000)).path) == "a5100.opt"
+    assert registry.match(key("ILCE-5100", 9504, 6336)) is None
+    assert registry.match(key("ILCE-6100", 6000, 4000)) is None
+
+
+def test_same_body_resolved_by_focal_length(camera_dir):
+    registry = CameraRegistry(str(camera_dir))
+    assert os.path.basename(registry.match(key("ILCE-7RM4", 9504, 6336, 48.0)).path) == "7r4-50.opt"
+    assert os.path.basename(registry.match(key("ILCE-7RM4", 9504, 6336, 36.0)).path) == "7r4-35.opt"
+    # 没有焦距时无法区分
+    assert registry.match(key("ILCE-7RM4", 9504, 6336)) is None
+
+
+def test_registry_rebuilt_when_directory_changes(camera_dir):
+    registry = get_camera_registry(str(camera_dir))
+    assert get_camera_registry(str(camera_dir)) is registry
+    write_opt(camera_dir, "extra", model="ILCE-6400", width=6000, height=4000)
+    stat = os.stat(camera_dir)
+    os.utime(camera_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    rebuilt = get_camera_registry(str(camera_dir))
+    assert rebuilt is not registry and len(rebuilt) == 4
+
+
+def test_find_opt_file(camera_dir):
+    expected = str(camera_dir / "a5100.opt")
+    assert find_opt_file("a5100", str(camera_dir)) == expected
+    assert find_opt_file("A5100.OPT", str(camera_dir)) == expected
+    assert find_opt_file(expected, str(camera_dir)) == expected
+    assert find_opt_file("missing", str(camera_dir)) is None
+    assert find_opt_file("", str(camera_dir)) is None
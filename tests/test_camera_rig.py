@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""多相机组配置测试"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from manifest import compile_manifest
+from camera_rig import load_rig, expand_manifest, compose_attitudes, SAMPLE_RIG
+
+
+def rig_with(pattern, **camera):
+    return {'cameras': [dict({'id': 'nadir', 'pattern': pattern}, **camera)]}
+
+
+def test_load_sample_rig_from_file(tmp_path):
+    path = tmp_path / "rig.json"
+    path.write_text(json.dumps(SAMPLE_RIG, ensure_ascii=False), encoding='utf-8')
+    rig = load_rig(str(path))
+    assert [camera['id'] for camera in rig['cameras']] == ['nadir', 'forward', 'backward', 'left', 'right']
+    assert rig['cameras'][1]['pitch'] == 45.0
+
+
+@pytest.mark.parametrize('pattern', ["A/{nmae}", "A/{name", "A/{}", "A/{0}", "A/{name.upper}"])
+def test_invalid_pattern_names_camera(pattern):
+    with pytest.raises(ValueError, match="nadir"):
+        load_rig(rig_with(pattern))
+
+
+def test_all_placeholders_and_escaped_braces():
+    rig = load_rig(rig_with("{camera}/{stem}_{{x}}{ext}"))
+    assert rig['cameras'][0]['pattern'] == "{camera}/{stem}_{{x}}{ext}"
+
+
+@pytest.mark.parametrize('config, message', [
+    ({'cameras': []}, "没有相机"),
+    ({'cameras': [{'id': 'a', 'pattern': 'A/{name}'}, {'id': 'a', 'pattern': 'B/{name}'}]}, "重复"),
+    ({'cameras': [{'id': 'a'}]}, "缺少文件名模式"),
+    ({'cameras': [{'id': 'a', 'pattern': 'A/{name}', 'pitch': 'x'}]}, "安装角"),
+])
+def test_invalid_config(config, message):
+    with pytest.raises(ValueError, match=message):
+        load_rig(config)
+
+
+def test_compose_attitudes():
+    cameras = load_rig(SAMPLE_RIG)['cameras']
+    yaw, pitch, roll = compose_attitudes([90.0], [0.0], [0.0], cameras)
+    assert yaw[0] == pytest.approx([90.0] * 5)
+    assert pitch[0] == pytest.approx([0.0, 45.0, -45.0, 0.0, 0.0])
+    assert roll[0] == pytest.approx([0.0, 0.0, 0.0, -45.0, 45.0])
+
+
+def test_expand_manifest():
+    df = pd.DataFrame({'文件名': ["IMG_001.jpg", ""], '时间': ["2024-08-18 10:30:00"] * 2,
+                       '经度': [114.0, 114.1], '纬度': [30.0, 30.1], '高度': [100.0, 100.0],
+                       'Pitch': [0.0, 0.0], 'Roll': [0.0, 0.0], 'Yaw': [10.0, 20.0]})
+    rig = load_rig({'cameras': [{'id': 'n', 'pattern': 'A/{name}'},
+                                {'id': 'f', 'pattern': 'B/{stem}_{camera}{ext}', 'opt': 'cam', 'pitch': 45}]})
+    expanded = expand_manifest(compile_manifest(df, 'with_header'), rig)
+    assert expanded['count'] == 4
+    assert list(expanded['filename']) == ["A/IMG_001.jpg", "B/IMG_001_f.jpg", "", ""]
+    assert expanded['row'].tolist() == [0, 0, 1, 1]
+    assert list(expanded['camera']) == ['n', 'f', 'n', 'f']
+    assert list(expanded['profile'])[1] == 'cam'
+    assert np.allclose(expanded['pitch'], [0.0, 45.0, 0.0, 45.0])
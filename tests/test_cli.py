@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""非交互命令行测试"""
+
+import json
+import os
+
+from conftest import write_csv, csv_row
+from batch_add_gps_info import run_cli, EXIT_OK, EXIT_FAILURES, EXIT_ERROR
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(capfd, argv):
+    exit_code = run_cli(argv)
+    out, _ = capfd.readouterr()
+    records = [json.loads(line) for line in out.splitlines()]
+    return exit_code, records[:-1], records[-1]
+
+
+def test_success_summary(tmp_path, image_folder, capfd):
+    csv_file = write_csv(tmp_path / "pos.csv", [csv_row(i) for i in range(1, 4)])
+    exit_code, images, summary = run(capfd, [csv_file, str(image_folder), '-o', str(tmp_path / "out"), '-q'])
+    assert exit_code == EXIT_OK
+    assert [r['status'] for r in images] == ['ok'] * 3
+    assert summary['exit_code'] == EXIT_OK
+    assert (summary['success'], summary['failed'], summary['skipped']) == (3, 0, 0)
+    assert summary['error'] is None
+
+
+def test_missing_image_fails(tmp_path, image_folder, capfd):
+    csv_file = write_csv(tmp_path / "pos.csv", [csv_row(1), csv_row(9)])
+    exit_code, images, summary = run(capfd, [csv_file, str(image_folder), '-o', str(tmp_path / "out"), '-q'])
+    assert exit_code == EXIT_FAILURES
+    assert [r['status'] for r in images] == ['ok', 'failed']
+    assert (summary['success'], summary['failed']) == (1, 1)
+
+
+def test_mid_stream_manifest_error(tmp_path, image_folder, capfd):
+    rows = [csv_row(i) for i in range(1, 5)] + ['IMG_005.jpg,"2024-08-18 10:30:05,114.3,30.5,100,-90,0,0', csv_row(6)]
+    csv_file = write_csv(tmp_path / "pos.csv", rows)
+    exit_code, images, summary = run(capfd, [csv_file, str(image_folder), '-o', str(tmp_path / "out"),
+                                             '--chunk-rows', '2', '-q'])
+    assert exit_code == EXIT_FAILURES
+    assert len(images) == 4
+    assert (summary['success'], summary['failed']) == (4, 0)
+    assert summary['exit_code'] == EXIT_FAILURES
+    assert summary['error'] and "列数不足" not in summary['error']
+
+
+def test_missing_folder_is_error(tmp_path, capfd):
+    csv_file = write_csv(tmp_path / "pos.csv", [csv_row(1)])
+    exit_code, images, summary = run(capfd, [csv_file, str(tmp_path / "nowhere"), '-q'])
+    assert exit_code == EXIT_ERROR
+    assert images == []
+    assert summary['error']
+
+
+def test_resume_skips_journal_successes(tmp_path, image_folder, capfd):
+    csv_file = write_csv(tmp_path / "pos.csv", [csv_row(i) for i in range(1, 4)])
+    journal = str(tmp_path / "run.jsonl")
+    argv = [csv_file, str(image_folder), '-o', str(tmp_path / "out"), '--journal', journal, '-q']
+    assert run(capfd, argv)[0] == EXIT_OK
+    exit_code, images, summary = run(capfd, argv + ['--resume'])
+    assert exit_code == EXIT_OK
+    assert images == []
+    assert summary['resumed'] == 3
+
+
+def test_in_place_option(tmp_path, image_folder, capfd):
+    csv_file = write_csv(tmp_path / "pos.csv", [csv_row(1)])
+    path = image_folder / "IMG_001.jpg"
+    argv = [csv_file, str(image_folder), '-q', '--in-place']
+    assert run(capfd, argv)[0] == EXIT_OK
+    inode = path.stat().st_ino
+    # 默认batch落盘方式下也原地写入
+    assert run(capfd, argv)[0] == EXIT_OK
+    assert path.stat().st_ino == inode
+    assert run(capfd, argv[:-1])[0] == EXIT_OK
+    assert path.stat().st_ino != inode
+
+
+def test_opt_file_keeps_stdout_json(tmp_path, image_folder, capfd):
+    csv_file = write_csv(tmp_path / "pos.csv", [csv_row(1)])
+    opt_file = os.path.join(REPO_ROOT, "cameraInfo", "default.opt")
+    exit_code = run_cli([csv_file, str(image_folder), '-o', str(tmp_path / "out"), '--opt', opt_file])
+    out, err = capfd.readouterr()
+    assert exit_code == EXIT_OK
+    assert [json.loads(line)['type'] for line in out.splitlines()] == ['image', 'summary']
+    assert "35mm" in err
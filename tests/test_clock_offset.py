@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""相机时钟偏移估计测试"""
+
+import numpy as np
+import pytest
+
+from gps_track import prepare_track
+from clock_offset import estimate_time_offset, describe_offset, _confidence, LOW_CONFIDENCE
+
+TRUE_OFFSET = 37.0
+
+
+@pytest.fixture
+def track():
+    """速度变化的直线航线，1Hz"""
+    time = np.arange(0.0, 600.0)
+    speed = 5.0 + 4.0 * np.sin(time / 40.0)
+    north = np.cumsum(speed)
+    return prepare_track({
+        'time': time + 1.7e9,
+        'latitude': 30.0 + north / 111320.0,
+        'longitude': np.full(len(time), 114.0),
+        'altitude': np.full(len(time), 100.0),
+        'roll': np.zeros(len(time)), 'pitch': np.zeros(len(time)), 'yaw': np.zeros(len(time)),
+    })
+
+
+def distance_triggered(track, spacing=40.0):
+    """按固定距离拍照的拍摄时间（相机时间 = 轨迹时间 - TRUE_OFFSET）"""
+    north = (track['latitude'] - track['latitude'][0]) * 111320.0
+    targets = np.arange(spacing, north[-1] - spacing, spacing)
+    return np.interp(targets, north, track['time'])[10:60] - TRUE_OFFSET
+
+
+def test_spacing_estimate(track):
+    result = estimate_time_offset(track, distance_triggered(track), search_range=120.0)
+    assert result['method'] == 'spacing'
+    assert result['offset'] == pytest.approx(TRUE_OFFSET, abs=0.5)
+    assert result['confidence'] > LOW_CONFIDENCE
+
+
+def test_control_estimate(track):
+    track_times = track['time'][[100, 200, 300]] + 0.25
+    control = {
+        'time': track_times - TRUE_OFFSET,
+        'latitude': np.interp(track_times, track['time'], track['latitude']),
+        'longitude': np.full(3, 114.0),
+    }
+    result = estimate_time_offset(track, [], search_range=120.0, control=control)
+    assert result['method'] == 'control'
+    assert result['offset'] == pytest.approx(TRUE_OFFSET, abs=0.1)
+    assert result['residual'] < 1.0
+    assert "控制照片" in describe_offset(result)
+
+
+def test_no_overlap_returns_none(track):
+    times = distance_triggered(track) - 10000.0
+    assert estimate_time_offset(track, times, search_range=60.0) is None
+    assert estimate_time_offset(track, [1.7e9, np.nan]) is None
+    assert describe_offset(None).startswith("无法估计")
+
+
+def test_confidence():
+    single = np.abs(np.arange(-10.0, 11.0)) + 1.0
+    assert _confidence(single) == 1.0
+    # 两个同样深的谷（航线等时重复）：置信度为0
+    repeated = np.array([5.0, 1.0, 5.0, 6.0, 5.0, 1.0, 5.0])
+    assert _confidence(repeated) == 0.0
+    shallow = np.array([5.0, 1.0, 5.0, 6.0, 5.0, 2.0, 5.0, np.inf])
+    assert _confidence(shallow) == pytest.approx(0.5)
+
+
+def test_low_confidence_warning():
+    result = {'offset': 1.0, 'confidence': LOW_CONFIDENCE / 2, 'method': 'spacing', 'photos': 10}
+    assert "置信度较低" in describe_offset(result)
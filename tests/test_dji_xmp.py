@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""DJI XMP数据包生成测试"""
+
+import os
+from xml.etree import ElementTree
+
+import pytest
+
+import dji_xmp
+from camera_profile import get_camera_profile
+from dji_xmp import build_dji_xmp_packet, get_camera_template, XMP_PADDING, PACKET_TRAILER, DJI_NS, EXIF_NS
+
+CAMERA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cameraInfo")
+
+
+def description(packet):
+    """解析XMP包，返回rdf:Description元素"""
+    root = ElementTree.fromstring(packet)
+    return root.find('.//{http://www.w3.org/1999/02/22-rdf-syntax-ns#}Description')
+
+
+def test_templates_are_cached_per_profile(monkeypatch):
+    monkeypatch.setattr(dji_xmp, '_camera_templates', {})
+    first = get_camera_profile(os.path.join(CAMERA_DIR, "5100-25.opt"))
+    second = get_camera_profile(os.path.join(CAMERA_DIR, "6100-40.opt"))
+    assert first.xmp_fragment != second.xmp_fragment
+    template = get_camera_template(profile=first)
+    assert get_camera_template(profile=first) is template
+    assert get_camera_template(profile=second) is not template
+    assert len(dji_xmp._camera_templates) == 2
+
+    packets = [build_dji_xmp_packet(30.5, 114.3, 100.0, 1.0, -90.0, 45.0, "2024:08:18 10:30:00", profile=profile)
+               for profile in (first, second)]
+    focal = [description(packet).get(f'{{{EXIF_NS}}}FocalLength') for packet in packets]
+    assert focal == [str(first.focal_length), str(second.focal_length)]
+    for packet in packets:
+        element = description(packet)
+        assert element.get(f'{{{DJI_NS}}}FlightYawDegree') == "45.0"
+        assert element.get(f'{{{DJI_NS}}}GpsLatitude') == "30.5"
+        assert element.get('{http://ns.adobe.com/xap/1.0/}CreateDate') == "2024-08-18T10:30:00"
+
+
+def test_padding_is_inside_packet_wrapper():
+    packet = build_dji_xmp_packet(30.5, 114.3, 100.0, 0.0, 0.0, 0.0)
+    trailer = PACKET_TRAILER.encode('ascii')
+    assert packet.startswith(b'<?xpacket begin=')
+    assert packet.endswith(trailer)
+    body_end = packet.index(b'</x:xmpmeta>') + len(b'</x:xmpmeta>\n')
+    padding = packet[body_end:-len(trailer)]
+    assert len(padding) == XMP_PADDING
+    assert padding.strip() == b''
+    assert description(packet) is not None
+
+
+def test_fixed_packet_size():
+    packet = build_dji_xmp_packet(30.5, 114.3, 100.0, 0.0, 0.0, 0.0, packet_size=4096)
+    assert len(packet) == 4096
+    assert description(packet) is not None
+    assert build_dji_xmp_packet(30.5, 114.3, 100.0, 0.0, 0.0, 0.0, packet_size=100) is None
+
+
+@pytest.mark.parametrize('angles', [(float('nan'),) * 3, (None, None, None)])
+def test_missing_attitude_is_omitted(angles):
+    element = description(build_dji_xmp_packet(30.5, 114.3, 100.0, *angles))
+    assert element.get(f'{{{DJI_NS}}}AbsoluteAltitude') == "100.0"
+    assert element.get(f'{{{DJI_NS}}}FlightYawDegree') is None
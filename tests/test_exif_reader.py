@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""仅读文件头的EXIF读取测试"""
+
+import csv
+
+import piexif
+import pytest
+
+from conftest import make_jpeg
+from batch_add_gps_info import set_gps_location
+from exif_reader import (read_tags, read_tags_bulk, iter_tags, dms_to_decimal, rational_to_float, geotag_row,
+                         dump_geotags, TAGS, XMP_TAGS)
+
+
+@pytest.fixture
+def geotagged(tmp_path):
+    path = make_jpeg(tmp_path / "geo.jpg", datetime_original="2024:08:18 10:30:00")
+    set_gps_location(path, 30.123456, -114.654321, altitude=88.5, roll=1.5, pitch=-90.0, yaw=45.0,
+                     timestamp="2024-08-18 10:30:00")
+    return path
+
+
+def test_matches_piexif(geotagged):
+    exif = piexif.load(geotagged)
+    values = read_tags(geotagged, tuple(TAGS))
+    for name, (ifd, tag) in TAGS.items():
+        expected = exif[ifd].get(tag)
+        if isinstance(expected, bytes) and name != 'UserComment':
+            expected = expected.decode('utf-8').strip('\x00').strip()
+        assert values[name] == expected, name
+
+
+def test_reads_dji_xmp(geotagged):
+    values = read_tags(geotagged, ('GPSLatitude',) + XMP_TAGS)
+    assert values['GpsLatitude'] == pytest.approx(30.123456)
+    assert values['FlightYawDegree'] == pytest.approx(45.0)
+
+
+def test_missing_exif_returns_none(tmp_path):
+    path = make_jpeg(tmp_path / "plain.jpg", exif=False)
+    assert read_tags(path, ('Make', 'GPSLatitude', 'GpsLatitude')) == dict.fromkeys(('Make', 'GPSLatitude',
+                                                                                     'GpsLatitude'))
+
+
+def test_iter_tags_reports_errors_in_order(tmp_path, geotagged):
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"not a jpeg")
+    results = list(iter_tags([geotagged, str(broken), geotagged], ('Make',), workers=2))
+    assert [path for path, _, _ in results] == [geotagged, str(broken), geotagged]
+    assert results[1][1] is None and results[1][2]
+    assert read_tags_bulk([geotagged], ('Make',)) == [{'Make': 'TestCam'}]
+
+
+def test_rational_helpers():
+    assert rational_to_float((3, 2)) == 1.5
+    assert rational_to_float((1, 0)) is None
+    assert rational_to_float(None) is None
+    assert dms_to_decimal(((30, 1), (30, 1), (0, 1)), 'S') == -30.5
+
+
+def test_geotag_row_round_trip(geotagged):
+    row = geotag_row(read_tags(geotagged))
+    assert row[:3] == [pytest.approx(30.123456, abs=1e-5), pytest.approx(-114.654321, abs=1e-5), 88.5]
+    assert row[3:6] == [1.5, -90.0, 45.0]
+    assert row[6] == "2024-08-18 10:30:00"
+
+
+def test_dump_geotags(tmp_path, geotagged):
+    plain = make_jpeg(tmp_path / "plain.jpg")
+    csv_path = tmp_path / "dump.csv"
+    stats = dump_geotags([geotagged, plain], str(csv_path), log=lambda message: None)
+    assert stats == {'exported': 1, 'missing': 1, 'failed': 0}
+    with open(csv_path, encoding='utf-8-sig') as f:
+        rows = list(csv.reader(f))
+    assert rows[1][0] == "geo.jpg"
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""按轨迹插值测试"""
+
+import numpy as np
+import piexif
+import pytest
+
+from conftest import make_jpeg
+from gps_track import prepare_track, interpolate_track, build_track_manifest, read_capture_times
+from jpeg_segments import read_xmp_packet
+from batch_add_gps_info import process_images_from_track
+
+
+def make_track(times, yaw=None, attitude=True):
+    count = len(times)
+    return prepare_track({
+        'time': np.asarray(times, dtype=np.float64),
+        'latitude': np.linspace(30.0, 30.0 + 0.001 * (count - 1), count),
+        'longitude': np.full(count, 114.0),
+        'altitude': np.arange(count, dtype=np.float64) * 10,
+        'roll': np.zeros(count),
+        'pitch': np.zeros(count),
+        'yaw': np.asarray(yaw if yaw is not None else np.zeros(count), dtype=np.float64),
+        'attitude': attitude,
+    })
+
+
+def test_linear_interpolation_and_range():
+    track = make_track([0.0, 10.0, 20.0])
+    result = interpolate_track(track, [15.0, 5.0, -1.0, np.nan])
+    assert result['valid'].tolist() == [True, True, False, False]
+    assert result['latitude'][:2] == pytest.approx([30.0015, 30.0005])
+    assert result['altitude'][:2] == pytest.approx([15.0, 5.0])
+    assert np.isnan(result['latitude'][2])
+
+
+def test_yaw_wraps_across_north():
+    track = make_track([0.0, 10.0], yaw=[350.0, 10.0])
+    result = interpolate_track(track, [5.0, 2.5, 7.5])
+    assert result['yaw'] == pytest.approx([0.0, 355.0, 5.0])
+
+
+def test_gap_is_not_interpolated():
+    track = make_track([0.0, 100.0])
+    assert not interpolate_track(track, [50.0], max_gap=10.0)['valid'][0]
+    assert interpolate_track(track, [50.0], max_gap=None)['valid'][0]
+
+
+def test_prepare_track_sorts_and_drops_duplicates():
+    track = make_track([10.0, 0.0, 10.0, np.nan])
+    assert track['time'].tolist() == [0.0, 10.0]
+
+
+def test_gps_time_uses_track_time(tmp_path):
+    track = make_track([1723977000.0, 1723977010.0])
+    texts = np.array(["2024:08:18 18:30:05"], dtype=object)
+    # 相机为UTC+8本地时间，偏移-8小时得到轨迹(UTC)时间
+    manifest = build_track_manifest([str(tmp_path / "a.jpg")], ["a.jpg"], texts,
+                                    np.array([1723977005.0 + 8 * 3600]), track, time_offset=-8 * 3600)
+    assert manifest['valid'].tolist() == [True]
+    assert list(manifest['exif_time']) == ["2024:08:18 18:30:05"]
+    assert list(manifest['gps_time']) == ["2024:08:18 10:30:05"]
+    assert manifest['yaw'].tolist() == [0.0] and manifest['direction_rational'] == [0]
+
+
+def test_track_without_attitude_has_no_angles(tmp_path):
+    track = make_track([0.0, 10.0], attitude=False)
+    manifest = build_track_manifest([str(tmp_path / "a.jpg")], ["a.jpg"], np.array(["1970:01:01 00:00:05"]),
+                                    np.array([5.0]), track)
+    assert manifest['valid'].tolist() == [True]
+    for field in ('roll', 'pitch', 'yaw'):
+        assert np.isnan(manifest[field]).all()
+    assert manifest['direction_rational'] == [None]
+
+
+def test_process_track_writes_utc_gps_stamp(tmp_path):
+    folder = tmp_path / "images"
+    folder.mkdir()
+    path = make_jpeg(folder / "a.jpg", datetime_original="2024:08:18 18:30:05")
+    track_file = tmp_path / "track.csv"
+    track_file.write_text("时间,经度,纬度,高度\n2024-08-18 10:30:00,114.0,30.0,100\n"
+                          "2024-08-18 10:30:10,114.0,30.001,110\n", encoding='utf-8')
+    result = process_images_from_track(str(track_file), str(folder), time_offset=-8 * 3600)
+    assert result['success'] == 1
+    exif = piexif.load(path)
+    assert exif['Exif'][piexif.ExifIFD.DateTimeOriginal] == b"2024:08:18 18:30:05"
+    assert exif['GPS'][piexif.GPSIFD.GPSDateStamp] == b"2024/08/18"
+    assert exif['GPS'][piexif.GPSIFD.GPSTimeStamp] == ((10, 1), (30, 1), (5, 1))
+    # 轨迹不含姿态：不写入方向、UserComment姿态和XMP姿态角
+    assert piexif.GPSIFD.GPSImgDirection not in exif['GPS']
+    assert piexif.GPSIFD.GPSImgDirectionRef not in exif['GPS']
+    assert piexif.ExifIFD.UserComment not in exif['Exif']
+    xmp = read_xmp_packet(path)
+    assert b'AbsoluteAltitude' in xmp and b'FlightYawDegree' not in xmp
+
+
+def test_read_capture_times_with_subseconds(tmp_path):
+    path = tmp_path / "a.jpg"
+    make_jpeg(path, datetime_original="2024:08:18 10:30:05")
+    exif = piexif.load(str(path))
+    exif['Exif'][piexif.ExifIFD.SubSecTimeOriginal] = b"25"
+    piexif.insert(piexif.dump(exif), str(path))
+    texts, seconds = read_capture_times([str(path)])
+    assert texts[0] == "2024:08:18 10:30:05"
+    assert seconds[0] == pytest.approx(1723977005.25)
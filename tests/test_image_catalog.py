@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""递归图片目录库测试"""
+
+import os
+
+import pytest
+from PIL import Image
+
+from conftest import make_jpeg, write_csv
+from image_catalog import open_catalog, CATALOG_EXTENSIONS
+from image_index import ImageIndex, MATCH_AMBIGUOUS
+from batch_add_gps_info import set_gps_location, process_images_from_csv, load_image_index
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "photos"
+    (root / "a").mkdir(parents=True)
+    (root / "b").mkdir()
+    make_jpeg(root / "a" / "IMG_001.jpg")
+    make_jpeg(root / "a" / "IMG_002.jpg")
+    make_jpeg(root / "b" / "IMG_002.JPG")
+    Image.new('RGB', (8, 8)).save(root / "a" / "IMG_003.tif")
+    return root
+
+
+def test_catalog_records_only_jpeg(tmp_path, tree):
+    assert CATALOG_EXTENSIONS == ('.jpg', '.jpeg')
+    with open_catalog(str(tree), str(tmp_path / "catalog.sqlite3")) as catalog:
+        index = catalog.index()
+        assert sorted(os.path.basename(path) for path in index.paths) == ["IMG_001.jpg", "IMG_002.JPG",
+                                                                           "IMG_002.jpg"]
+        assert index.resolve("IMG_003.tif") is None
+        assert index.resolve("IMG_001") == str(tree / "a" / "IMG_001.jpg")
+        assert index.is_ambiguous("IMG_002.jpg")
+        assert index.resolve("b/img_002.jpg") == str(tree / "b" / "IMG_002.JPG")
+
+
+def test_incremental_refresh(tmp_path, tree):
+    db_path = str(tmp_path / "catalog.sqlite3")
+    with open_catalog(str(tree), db_path) as catalog:
+        assert catalog.stats['rescanned'] == 3
+    with open_catalog(str(tree), db_path) as catalog:
+        assert catalog.stats['rescanned'] == 0
+    make_jpeg(tree / "b" / "IMG_004.jpg")
+    with open_catalog(str(tree), db_path) as catalog:
+        assert catalog.stats['rescanned'] == 1
+        assert catalog.index().resolve("IMG_004") == str(tree / "b" / "IMG_004.jpg")
+
+
+def test_own_writes_do_not_trigger_rescan(tmp_path, tree):
+    db_path = str(tmp_path / "catalog.sqlite3")
+    csv_file = write_csv(tmp_path / "pos.csv", ["a/IMG_001.jpg,2024-08-18 10:30:01,114.3,30.5,100,-90,0,0",
+                                                "b/IMG_002.JPG,2024-08-18 10:30:02,114.3,30.5,100,-90,0,0"])
+    for _ in range(2):
+        result = process_images_from_csv(csv_file, str(tree), recursive=True, catalog_path=db_path)
+        assert result['success'] == 2
+    with open_catalog(str(tree), db_path) as catalog:
+        assert catalog.stats['rescanned'] == 0
+        sizes = {path: size for _, path, _, size, _ in catalog.iter_files()}
+        assert sizes[str(tree / "a" / "IMG_001.jpg")] == os.path.getsize(tree / "a" / "IMG_001.jpg")
+
+
+def test_record_written_keeps_foreign_changes(tmp_path, tree):
+    db_path = str(tmp_path / "catalog.sqlite3")
+    open_catalog(str(tree), db_path).close()
+    path = str(tree / "a" / "IMG_001.jpg")
+    assert set_gps_location(path, 30.5, 114.3, 10)
+    # 其他程序同时在b中新增了图片，b仍需重新扫描
+    make_jpeg(tree / "b" / "IMG_005.jpg")
+    with open_catalog(str(tree), db_path, refresh=False) as catalog:
+        assert catalog.record_written([path, str(tree / "b" / "IMG_002.JPG"), str(tmp_path / "other.jpg")]) == 1
+        stats = catalog.refresh()
+        assert stats['rescanned'] == 1
+        assert catalog.index().resolve("IMG_005") == str(tree / "b" / "IMG_005.jpg")
+
+
+def test_multiple_roots_without_recursion(tmp_path, tree):
+    index, catalog = load_image_index([str(tree / "a"), str(tree / "b")], recursive=False,
+                                      catalog_path=str(tmp_path / "catalog.sqlite3"))
+    assert catalog is None
+    assert not os.path.exists(tmp_path / "catalog.sqlite3")
+    assert sorted(os.path.basename(path) for path in index.paths) == ["IMG_001.jpg", "IMG_002.JPG",
+                                                                       "IMG_002.jpg"]
+    assert index.is_ambiguous("IMG_002.jpg")
+    (tree / "a" / "sub").mkdir()
+    make_jpeg(tree / "a" / "sub" / "IMG_009.jpg")
+    index, _ = load_image_index([str(tree / "a"), str(tree / "b")], recursive=False)
+    assert index.resolve("IMG_009.jpg") is None
+
+
+def test_jpeg_tiff_stem_collision_is_ambiguous(tmp_path):
+    index = ImageIndex(extensions=('.jpg', '.jpeg', '.tif', '.tiff'))
+    index.add("IMG_001.jpg", str(tmp_path / "IMG_001.jpg"), "IMG_001.jpg")
+    index.add("IMG_001.tif", str(tmp_path / "IMG_001.tif"), "IMG_001.tif")
+    index.add("IMG_002.jpg", str(tmp_path / "IMG_002.jpg"), "IMG_002.jpg")
+    index.add("IMG_002.jpeg", str(tmp_path / "IMG_002.jpeg"), "IMG_002.jpeg")
+    assert index.match("IMG_001") == (None, MATCH_AMBIGUOUS)
+    assert index.match("./IMG_001") == (None, MATCH_AMBIGUOUS)
+    assert index.resolve("IMG_001.tif") == str(tmp_path / "IMG_001.tif")
+    # 同一目录中的.jpg和.jpeg按优先级选择.jpg
+    assert index.resolve("IMG_002") == str(tmp_path / "IMG_002.jpg")
+
+
+def test_reencode_keeps_tiff_format(tmp_path):
+    path = str(tmp_path / "IMG_001.tif")
+    Image.new('RGB', (16, 16), (10, 20, 30)).save(path)
+    assert set_gps_location(path, 30.5, 114.3, 10, write_mode='reencode')
+    with Image.open(path) as img:
+        assert img.format == 'TIFF'
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""图片文件名索引测试"""
+
+import pytest
+
+from conftest import make_jpeg
+from image_index import (ImageIndex, analyze_matches, MATCH_EXACT, MATCH_CASE, MATCH_EXTENSION, MATCH_SUFFIX,
+                         MATCH_AMBIGUOUS)
+
+
+@pytest.fixture
+def folder(tmp_path):
+    for name in ("IMG_001.jpg", "IMG_002.JPG", "IMG_003.jpeg", "IMG_004.jpg", "IMG_004.jpeg"):
+        make_jpeg(tmp_path / name, exif=False)
+    (tmp_path / "notes.txt").write_text("x")
+    (tmp_path / "sub").mkdir()
+    make_jpeg(tmp_path / "sub" / "IMG_005.jpg", exif=False)
+    return tmp_path
+
+
+@pytest.mark.parametrize('name, expected, kind', [
+    ("IMG_001.jpg", "IMG_001.jpg", MATCH_EXACT),
+    ("img_001.JPG", "IMG_001.jpg", MATCH_CASE),
+    ("IMG_002.jpeg", "IMG_002.JPG", MATCH_EXTENSION),
+    ("IMG_003", "IMG_003.jpeg", MATCH_SUFFIX),
+    ("IMG_004", "IMG_004.jpg", MATCH_SUFFIX),  # 同一目录中.jpg优先于.jpeg
+    ("notes.txt", "notes.txt", MATCH_EXACT),
+])
+def test_match(folder, name, expected, kind):
+    path, match_kind = ImageIndex(str(folder)).match(name)
+    assert path == str(folder / expected)
+    assert match_kind == kind
+
+
+def test_missing_and_subfolder(folder):
+    index = ImageIndex(str(folder))
+    assert index.match("IMG_999.jpg") == (None, None)
+    assert index.match("") == (None, None)
+    # 单层索引不包含子目录，带子目录的文件名直接检查文件
+    assert index.resolve("sub/IMG_005") == str(folder / "sub" / "IMG_005.jpg")
+    assert sorted(index.image_names()) == ["IMG_001.jpg", "IMG_002.JPG", "IMG_003.jpeg", "IMG_004.jpeg",
+                                           "IMG_004.jpg"]
+
+
+def test_duplicate_names_in_different_directories_are_ambiguous(tmp_path):
+    index = ImageIndex()
+    index.add("IMG_001.jpg", str(tmp_path / "a" / "IMG_001.jpg"), "a/IMG_001.jpg")
+    index.add("IMG_001.jpg", str(tmp_path / "b" / "IMG_001.jpg"), "b/IMG_001.jpg")
+    assert index.match("IMG_001.jpg") == (None, MATCH_AMBIGUOUS)
+    assert index.match("IMG_001") == (None, MATCH_AMBIGUOUS)
+    assert index.is_ambiguous("img_001.JPG")
+    assert index.resolve("b/IMG_001.jpg") == str(tmp_path / "b" / "IMG_001.jpg")
+    assert index.resolve("B/img_001") == str(tmp_path / "b" / "IMG_001.jpg")
+
+
+def test_dot_leading_directories(tmp_path):
+    index = ImageIndex()
+    hidden = str(tmp_path / ".hidden" / "IMG.jpg")
+    index.add("IMG.jpg", hidden, ".hidden/IMG.jpg")
+    index.add("IMG.jpg", str(tmp_path / "hidden" / "IMG.jpg"), "hidden/IMG.jpg")
+    assert index.match(".hidden/IMG.jpg") == (hidden, MATCH_EXACT)
+    assert index.match("./.hidden/IMG.jpg") == (hidden, MATCH_EXACT)
+    assert index.match("././.hidden/img.JPG") == (hidden, MATCH_CASE)
+    assert index.resolve("../IMG.jpg") is None
+
+
+def test_analyze_matches(folder):
+    progress = []
+    result = analyze_matches(["IMG_001.jpg", "img_002.jpg", "IMG_003", "IMG_001.jpg", "IMG_999.jpg"],
+                             ImageIndex(str(folder)), lambda done, total: progress.append((done, total)),
+                             batch_size=2)
+    assert result['total'] == 5
+    assert result['matched'] == 1
+    assert result['near_misses'][MATCH_CASE] == [("img_002.jpg", str(folder / "IMG_002.JPG"))]
+    assert result['near_misses'][MATCH_SUFFIX] == [("IMG_003", str(folder / "IMG_003.jpeg"))]
+    assert result['duplicates'] == ["IMG_001.jpg"]
+    assert result['missing'] == ["IMG_999.jpg"]
+    assert sorted(result['unmatched_images']) == [str(folder / "IMG_004.jpeg"), str(folder / "IMG_004.jpg")]
+    assert progress == [(2, 5), (4, 5), (5, 5)]
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""JPEG标记段读写测试"""
+
+import os
+from xml.etree import ElementTree
+
+import piexif
+import pytest
+from PIL import Image
+
+import jpeg_segments
+from conftest import make_jpeg, write_csv, csv_row
+from batch_add_gps_info import process_images_from_csv
+
+
+def _entropy_data(path):
+    """SOS之后的图像压缩数据"""
+    layout = jpeg_segments.scan_jpeg_file(path)
+    with open(path, 'rb') as f:
+        return f.read()[layout['sos_offset']:]
+
+
+@pytest.fixture
+def fsynced(monkeypatch):
+    """记录fsync_file和fsync_directory刷新过的路径"""
+    calls = {'files': [], 'directories': []}
+    real_fsync_file = jpeg_segments.fsync_file
+    monkeypatch.setattr(jpeg_segments, 'fsync_file', lambda path: (calls['files'].append(path),
+                                                                   real_fsync_file(path)))
+    monkeypatch.setattr(jpeg_segments, 'fsync_directory', lambda path: calls['directories'].append(path))
+    return calls
+
+
+def test_sync_files_fsyncs_files_and_directories(tmp_path, fsynced):
+    paths = []
+    for name in ("a.jpg", "b.jpg"):
+        path = tmp_path / name
+        path.write_bytes(b"data")
+        paths.append(str(path))
+    jpeg_segments.sync_files(paths + [str(tmp_path / "missing.jpg")])
+    assert fsynced['files'] == paths
+    assert fsynced['directories'] == [str(tmp_path)]
+
+
+def test_batch_overwrite_fsyncs_before_rename(tmp_path, image_folder, fsynced):
+    csv_file = write_csv(tmp_path / "pos.csv", [csv_row(1), csv_row(2)])
+    result = process_images_from_csv(csv_file, str(image_folder), fsync='batch')
+    assert result['success'] == 2
+    # 重命名前fsync的是临时文件
+    temp_files = [path for path in fsynced['files'] if path.endswith('.tmp')]
+    assert len(temp_files) == 2
+    assert fsynced['directories'] == [str(image_folder)]
+
+
+def test_batch_output_dir_syncs_at_end(tmp_path, image_folder, fsynced):
+    csv_file = write_csv(tmp_path / "pos.csv", [csv_row(1), csv_row(2)])
+    output_dir = tmp_path / "out"
+    result = process_images_from_csv(csv_file, str(image_folder), output_dir=str(output_dir), fsync='batch')
+    assert result['success'] == 2
+    assert sorted(fsynced['files']) == [str(output_dir / "IMG_001.jpg"), str(output_dir / "IMG_002.jpg")]
+
+
+def _exif_with_make(make):
+    return piexif.dump({'0th': {piexif.ImageIFD.Make: make}, 'Exif': {}, 'GPS': {}, '1st': {}})
+
+
+@pytest.fixture
+def padded_jpeg(tmp_path):
+    """EXIF段末尾预留了空间的JPEG"""
+    path = make_jpeg(tmp_path / "padded.jpg")
+    jpeg_segments.rewrite_jpeg_metadata(path, path, _exif_with_make(b"TestCam"), exif_padding=512)
+    return path
+
+
+def test_patch_in_place_fits(padded_jpeg):
+    size = os.path.getsize(padded_jpeg)
+    entropy = _entropy_data(padded_jpeg)
+    assert jpeg_segments.patch_metadata_in_place(padded_jpeg, _exif_with_make(b"OtherCam"), fsync=True)
+    assert os.path.getsize(padded_jpeg) == size
+    assert _entropy_data(padded_jpeg) == entropy
+    assert jpeg_segments.load_exif_dict(padded_jpeg)['0th'][piexif.ImageIFD.Make] == b"OtherCam"
+
+
+def test_patch_in_place_falls_back_when_too_large(padded_jpeg):
+    with open(padded_jpeg, 'rb') as f:
+        before = f.read()
+    exif = _exif_with_make(b"X" * 2048)
+    assert not jpeg_segments.patch_metadata_in_place(padded_jpeg, exif)
+    # XMP段不存在时同样不写入
+    assert not jpeg_segments.patch_metadata_in_place(padded_jpeg, _exif_with_make(b"Cam"), xmp_bytes=b"<x/>")
+    with open(padded_jpeg, 'rb') as f:
+        assert f.read() == before
+
+
+def _packet(body, padding=0):
+    return (b'<?xpacket begin="" id="W5M0MpCehiHzreSzNTczkc9d"?>' + body + b' ' * padding
+            + b'<?xpacket end="w"?>')
+
+
+@pytest.fixture
+def xmp_jpeg(tmp_path):
+    """EXIF段预留了空间、XMP包带有空白填充的JPEG"""
+    path = make_jpeg(tmp_path / "xmp.jpg")
+    jpeg_segments.rewrite_jpeg_metadata(path, path, _exif_with_make(b"TestCam"),
+                                        _packet(b'<x:xmpmeta xmlns:x="adobe:ns:meta/"/>', 256), exif_padding=512)
+    return path
+
+
+def test_patch_in_place_pads_xmp_inside_packet(xmp_jpeg):
+    size = os.path.getsize(xmp_jpeg)
+    packet = _packet(b'<x:xmpmeta xmlns:x="adobe:ns:meta/" a="1"/>')
+    assert jpeg_segments.patch_metadata_in_place(xmp_jpeg, _exif_with_make(b"OtherCam"), xmp_bytes=packet)
+    assert os.path.getsize(xmp_jpeg) == size
+    stored = jpeg_segments.read_xmp_packet(xmp_jpeg)
+    # 空白在包尾之前，包尾仍是最后的内容
+    trailer = b'<?xpacket end="w"?>'
+    assert stored.endswith(trailer) and stored[:-len(trailer)].endswith(b' ' * 16)
+    assert ElementTree.fromstring(stored).get('a') == "1"
+
+
+def test_patch_in_place_skips_extended_xmp(xmp_jpeg):
+    with open(xmp_jpeg, 'rb') as f:
+        data = f.read()
+    extension = jpeg_segments.build_app1_segment(jpeg_segments.XMP_EXTENSION_HEADER + b'0' * 40)
+    with open(xmp_jpeg, 'wb') as f:
+        f.write(data[:2] + extension + data[2:])
+    with open(xmp_jpeg, 'rb') as f:
+        before = f.read()
+    assert not jpeg_segments.patch_metadata_in_place(xmp_jpeg, _exif_with_make(b"Cam"), xmp_bytes=_packet(b'<x/>'))
+    with open(xmp_jpeg, 'rb') as f:
+        assert f.read() == before
+
+
+def test_in_place_is_opt_in(tmp_path, image_folder):
+    csv_file = write_csv(tmp_path / "pos.csv", [csv_row(1)])
+    path = str(image_folder / "IMG_001.jpg")
+    # 第一次写入重写文件并预留空间
+    assert process_images_from_csv(csv_file, str(image_folder), in_place=True)['success'] == 1
+    inode = os.stat(path).st_ino
+    # 与落盘方式无关，只由in_place决定
+    for fsync in ('batch', 'none', 'file'):
+        assert process_images_from_csv(csv_file, str(image_folder), fsync=fsync, in_place=True)['success'] == 1
+        assert os.stat(path).st_ino == inode
+    # 默认总是通过临时文件重写
+    assert process_images_from_csv(csv_file, str(image_folder), fsync='file')['success'] == 1
+    assert os.stat(path).st_ino != inode
+
+
+def test_rewrite_round_trip_keeps_entropy_data(tmp_path):
+    source = make_jpeg(tmp_path / "source.jpg", size=(96, 64))
+    with Image.open(source) as img:
+        img.save(tmp_path / "icc.jpg", 'JPEG', exif=_exif_with_make(b"TestCam"), icc_profile=b"\x00" * 200)
+    source = str(tmp_path / "icc.jpg")
+    target = str(tmp_path / "target.jpg")
+    jpeg_segments.rewrite_jpeg_metadata(source, target, _exif_with_make(b"NewCam"), b"<x:xmpmeta/>",
+                                        exif_padding=256)
+
+    assert _entropy_data(target) == _entropy_data(source)
+    layout = jpeg_segments.scan_jpeg_file(target)
+    kinds = [segment.kind for segment in layout['segments']]
+    # EXIF和XMP紧跟在JFIF APP0之后，ICC配置(APP2)保留
+    assert kinds[:3] == ['app0', 'exif', 'xmp']
+    assert kinds.count('exif') == 1 and len(layout['app2']) == 1
+    assert layout['frame_size'] == (96, 64)
+    assert jpeg_segments.load_exif_dict(target)['0th'][piexif.ImageIFD.Make] == b"NewCam"
+    assert jpeg_segments.read_xmp_packet(target) == b"<x:xmpmeta/>"
+    assert layout['exif'].payload_length == len(_exif_with_make(b"NewCam")) + 256
+    with Image.open(target) as img:
+        img.load()
+
+
+def test_rewrite_keeps_metadata_not_replaced(tmp_path):
+    source = make_jpeg(tmp_path / "source.jpg")
+    target = str(tmp_path / "target.jpg")
+    jpeg_segments.rewrite_jpeg_metadata(source, target, xmp_bytes=b"<x/>")
+    assert jpeg_segments.read_exif_bytes(target) == jpeg_segments.read_exif_bytes(source)
+    assert jpeg_segments.read_xmp_packet(target) == b"<x/>"
+
+
+def test_rewrite_failure_leaves_target_untouched(tmp_path):
+    source = make_jpeg(tmp_path / "source.jpg")
+    with open(source, 'rb') as f:
+        before = f.read()
+    with pytest.raises(ValueError):
+        jpeg_segments.rewrite_jpeg_metadata(source, source, b"Exif\x00\x00" + b"\x00" * 70000)
+    with open(source, 'rb') as f:
+        assert f.read() == before
+    assert os.listdir(tmp_path) == ["source.jpg"]
+
+
+def test_scan_rejects_non_jpeg(tmp_path):
+    path = tmp_path / "bad.jpg"
+    path.write_bytes(b"\x89PNG\r\n\x1a\n" + b"\x00" * 16)
+    with pytest.raises(ValueError):
+        jpeg_segments.scan_jpeg_file(str(path))
+
+
+def _segment_end(segment):
+    return segment.payload_offset + segment.payload_length
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_splice_into_jpeg_without_app1(tmp_path):
+    source = make_jpeg(tmp_path / "plain.jpg", exif=False)
+    before = jpeg_segments.scan_segments(_read(source))
+    assert before['exif'] is None and before['xmp'] is None
+    target = str(tmp_path / "target.jpg")
+    jpeg_segments.rewrite_jpeg_metadata(source, target, _exif_with_make(b"NewCam"), b"<x:xmpmeta/>")
+
+    after = jpeg_segments.scan_jpeg_file(target)
+    assert [segment.kind for segment in after['segments']][:3] == ['app0', 'exif', 'xmp']
+    # 插入位置（JFIF APP0）之后的原有字节原样保留
+    assert _read(target)[_segment_end(after['xmp']):] == _read(source)[_segment_end(before['app0']):]
+    assert jpeg_segments.load_exif_dict(target)['0th'][piexif.ImageIFD.Make] == b"NewCam"
+
+
+def test_splice_replaces_existing_exif_and_xmp(tmp_path):
+    source = make_jpeg(tmp_path / "source.jpg")
+    jpeg_segments.rewrite_jpeg_metadata(source, source, _exif_with_make(b"OldCam"), b"<x:xmpmeta old=''/>")
+    before = jpeg_segments.scan_jpeg_file(source)
+    target = str(tmp_path / "target.jpg")
+    jpeg_segments.rewrite_jpeg_metadata(source, target, _exif_with_make(b"NewCamera"), b"<x:xmpmeta new='1'/>")
+
+    after = jpeg_segments.scan_jpeg_file(target)
+    kinds = [segment.kind for segment in after['segments']]
+    assert kinds.count('exif') == 1 and kinds.count('xmp') == 1
+    assert _read(target)[_segment_end(after['xmp']):] == _read(source)[_segment_end(before['xmp']):]
+    assert jpeg_segments.read_xmp_packet(target) == b"<x:xmpmeta new='1'/>"
+    # 只替换EXIF时XMP段保持原样
+    jpeg_segments.rewrite_jpeg_metadata(target, target, _exif_with_make(b"Cam"))
+    assert jpeg_segments.read_xmp_packet(target) == b"<x:xmpmeta new='1'/>"
+
+
+def test_truncated_segment_length_is_rejected(tmp_path):
+    source = make_jpeg(tmp_path / "source.jpg")
+    data = bytearray(_read(source))
+    exif = jpeg_segments.scan_segments(bytes(data))['exif']
+    # EXIF段长度字段超出文件末尾
+    data[exif.offset + 2:exif.offset + 4] = b'\xff\xff'
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(bytes(data[:exif.offset + 200]))
+    with pytest.raises(ValueError, match="长度无效"):
+        jpeg_segments.scan_segments(_read(broken))
+    target = tmp_path / "target.jpg"
+    with pytest.raises(ValueError):
+        jpeg_segments.rewrite_jpeg_metadata(str(broken), str(target), _exif_with_make(b"Cam"))
+    assert not target.exists()
+    assert [path.name for path in tmp_path.iterdir() if path.suffix == '.tmp'] == []
+    assert _read(broken) == bytes(data[:exif.offset + 200])
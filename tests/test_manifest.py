@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""CSV清单读取测试"""
+
+import numpy as np
+import piexif
+import pytest
+
+from conftest import make_jpeg, write_csv, csv_row
+from manifest import iter_manifest_chunks, dms_rationals
+from batch_add_gps_info import (process_images_from_csv, set_gps_location, decimal_to_dms, parse_timestamp,
+                                normalize_angle)
+
+
+def test_headerless_csv(tmp_path):
+    csv_file = write_csv(tmp_path / "pos.csv", [csv_row(1), csv_row(2)], header=False)
+    chunks = list(iter_manifest_chunks(csv_file, 'no_header'))
+    assert len(chunks) == 1
+    offset, manifest = chunks[0]
+    assert offset == 0
+    assert manifest['count'] == 2
+    assert list(manifest['filename']) == ["IMG_001.jpg", "IMG_002.jpg"]
+
+
+def test_non_numeric_coordinates_are_invalid(tmp_path):
+    rows = [csv_row(1), "IMG_002.jpg,2024-08-18 10:30:02,abc,30.5,100,-90,0,0", csv_row(3)]
+    csv_file = write_csv(tmp_path / "pos.csv", rows)
+    (_, manifest), = iter_manifest_chunks(csv_file, 'with_header')
+    assert list(manifest['valid']) == [True, False, True]
+
+
+def test_chunk_offsets(tmp_path):
+    csv_file = write_csv(tmp_path / "pos.csv", [csv_row(i) for i in range(1, 6)])
+    offsets = [offset for offset, _ in iter_manifest_chunks(csv_file, 'with_header', chunksize=2)]
+    assert offsets == [0, 2, 4]
+
+
+def test_too_few_columns_raises_before_first_chunk(tmp_path):
+    csv_file = write_csv(tmp_path / "pos.csv", ["IMG_001.jpg,30.5,114.3"], header=False)
+    with pytest.raises(ValueError, match="列数不足"):
+        next(iter_manifest_chunks(csv_file, 'no_header'))
+
+
+def test_too_few_columns_reported_as_format_error(tmp_path, image_folder):
+    csv_file = write_csv(tmp_path / "pos.csv", ["IMG_001.jpg,30.5,114.3"], header=False)
+    result = process_images_from_csv(csv_file, str(image_folder), output_dir=str(tmp_path / "out"))
+    assert result['failed'] == 1
+    assert "列数不足" in result['errors'][0]
+
+
+@pytest.mark.parametrize('fsync', ['none', 'batch'])
+def test_bad_row_in_later_chunk_keeps_counts(tmp_path, image_folder, fsync):
+    rows = [csv_row(i) for i in range(1, 5)] + ['IMG_005.jpg,"2024-08-18 10:30:05,114.3,30.5,100,-90,0,0'] + [csv_row(6)]
+    csv_file = write_csv(tmp_path / "pos.csv", rows)
+    result = process_images_from_csv(csv_file, str(image_folder), output_dir=str(tmp_path / "out"),
+                                     fsync=fsync, chunksize=2)
+    # 前两块的4张图片照常写入，错误信息为实际的解析错误
+    assert result['success'] == 4
+    assert result['manifest_error']
+    assert "列数不足" not in result['manifest_error']
+    assert result['manifest_error'] in result['errors']
+    assert len(list((tmp_path / "out").iterdir())) == 4
+
+
+# 逐行路径（set_gps_location未传入precomputed时）使用的各种时间格式
+TIMESTAMP_CASES = ["2024-08-18 10:30:00", "2020-10-18_12:19:00", "2024/08/18 10:30:00", "2024-08-18 10-30-00",
+                   "2024:08:18 10:30:00", "2024-08-18 10:30:00.750", "2024-08-18T10:30:00",
+                   "2024-08-18T23:59:59.999999", "not a time", ""]
+
+
+def test_dms_rationals_match_per_row():
+    values = np.array([0.0, 1e-9, 30.123456789, -30.123456789, 114.999999, -179.9999999, 89.5, -0.0000001])
+    assert dms_rationals(values) == [decimal_to_dms(float(value)) for value in values]
+
+
+def test_compile_manifest_matches_per_row(tmp_path):
+    rows = [f"IMG_{i + 1:03d}.jpg,{timestamp},{-114.3 - i * 0.01234567},{-30.5 + i * 0.00765432},"
+            f"{-12.345 + i},{-90 + i},{i * 0.5},{-45 - i * 37.3}"
+            for i, timestamp in enumerate(TIMESTAMP_CASES)]
+    # 缺失和无法解析的高度、姿态角按0处理，与逐行路径的默认值一致
+    rows.append("IMG_099.jpg,2024-08-18 10:30:00,114.3,30.5,,,abc,")
+    csv_file = write_csv(tmp_path / "pos.csv", rows)
+    (_, manifest), = iter_manifest_chunks(csv_file, 'with_header')
+    for i in range(manifest['count']):
+        lat, lng = manifest['latitude'][i], manifest['longitude'][i]
+        altitude, yaw = manifest['altitude'][i], manifest['yaw'][i]
+        assert manifest['lat_dms'][i] == decimal_to_dms(lat)
+        assert manifest['lng_dms'][i] == decimal_to_dms(lng)
+        assert manifest['altitude_rational'][i] == int(abs(float(altitude)) * 100)
+        assert yaw == normalize_angle(float(yaw))
+        assert manifest['direction_rational'][i] == int(normalize_angle(float(yaw)) * 100)
+        assert manifest['exif_time'][i] == parse_timestamp(manifest['timestamp'][i])
+    assert manifest['yaw'][-1] == 0.0 and manifest['altitude'][-1] == 0.0 and manifest['roll'][-1] == 0.0
+
+
+def test_missing_coordinates_are_invalid(tmp_path):
+    csv_file = write_csv(tmp_path / "pos.csv", ["IMG_001.jpg,2024-08-18 10:30:00,,30.5,100,0,0,0",
+                                                "IMG_002.jpg,2024-08-18 10:30:00,114.3,nan,100,0,0,0"])
+    (_, manifest), = iter_manifest_chunks(csv_file, 'with_header')
+    assert list(manifest['valid']) == [False, False]
+
+
+def test_precomputed_write_matches_per_row(tmp_path):
+    rows = ["IMG_001.jpg,2024-08-18T10:30:00.5,-114.3123456,-30.5987654,-12.34,-90,1.5,-45.25"]
+    csv_file = write_csv(tmp_path / "pos.csv", rows)
+    (_, manifest), = iter_manifest_chunks(csv_file, 'with_header')
+    args = [manifest[field][0] for field in ('latitude', 'longitude', 'altitude', 'roll', 'pitch', 'yaw',
+                                              'timestamp')]
+    precomputed = {key: manifest[key][0] for key in ('exif_time', 'lat_dms', 'lng_dms', 'altitude_rational',
+                                                    'direction_rational')}
+    written = []
+    for name, values in (("row.jpg", None), ("compiled.jpg", precomputed)):
+        path = make_jpeg(tmp_path / name)
+        assert set_gps_location(path, *args, precomputed=values)
+        written.append(piexif.load(path))
+    for ifd in ('GPS', 'Exif', '0th'):
+        assert written[0][ifd] == written[1][ifd]
+    assert written[0]['GPS'][piexif.GPSIFD.GPSLatitudeRef] == b"S"
+    assert written[0]['GPS'][piexif.GPSIFD.GPSLongitudeRef] == b"W"
+    assert written[0]['GPS'][piexif.GPSIFD.GPSAltitudeRef] == 1
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""运行统计测试"""
+
+import threading
+
+import pytest
+
+import run_stats
+from run_stats import RunStats, format_duration
+
+
+def result(success=True, elapsed=0.01, **extra):
+    return dict({'success': success, 'elapsed': elapsed, 'bytes': 1024 * 1024, 'bytes_read': 2 * 1024 * 1024,
+                 'stages': {'read': 0.002, 'write': 0.004}}, **extra)
+
+
+def test_counts_and_stage_averages():
+    stats = RunStats()
+    stats.start(10)
+    for _ in range(4):
+        stats.record_submitted()
+    stats.record_result(result())
+    stats.record_result(result(success=False))
+    stats.record_skipped()
+    stats.record_skipped(failed=True)
+    stats.record_stage('resolve', 0.001)
+    snapshot = stats.snapshot()
+    assert (snapshot['completed'], snapshot['success'], snapshot['failed'], snapshot['skipped']) == (4, 1, 2, 1)
+    assert snapshot['in_flight'] == 2
+    assert snapshot['stage_ms']['read'] == pytest.approx(2.0)
+    assert snapshot['stage_ms']['write'] == pytest.approx(4.0)
+    assert snapshot['stage_ms']['resolve'] == pytest.approx(1.0)
+    assert snapshot['stage_ms']['xmp'] == 0.0
+    assert snapshot['read_mb_per_sec'] == pytest.approx(2 * snapshot['write_mb_per_sec'], rel=0.05)
+    assert snapshot['eta'] is not None
+
+
+def test_eta_uses_recent_window(monkeypatch):
+    clock = {'now': 100.0}
+    monkeypatch.setattr(run_stats.time, 'perf_counter', lambda: clock['now'])
+    stats = RunStats()
+    stats.start(100)
+    for _ in range(10):
+        stats.record_result(result())
+    clock['now'] = 110.0
+    assert stats.snapshot()['images_per_sec'] == pytest.approx(1.0)
+    for _ in range(40):
+        stats.record_result(result())
+    clock['now'] = 120.0
+    snapshot = stats.snapshot()
+    # 最近10秒完成40张，剩余50张按4张/秒估算
+    assert snapshot['recent_images_per_sec'] == pytest.approx(4.0)
+    assert snapshot['eta'] == pytest.approx(12.5)
+
+
+def test_latency_percentiles():
+    stats = RunStats()
+    assert stats.latency_percentiles() == {}
+    for ms in range(1, 101):
+        stats.record_result(result(elapsed=ms / 1000))
+    percentiles = stats.latency_percentiles()
+    assert list(percentiles) == ['p50', 'p90', 'p95', 'p99']
+    assert percentiles['p50'] == pytest.approx(50.5)
+    assert percentiles['p99'] == pytest.approx(99.01)
+
+
+def test_thread_safe_counting():
+    stats = RunStats()
+
+    def work():
+        for _ in range(1000):
+            stats.record_result(result())
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stats.snapshot()['success'] == 4000
+
+
+def test_format_duration():
+    assert format_duration(None) == "--:--:--"
+    assert format_duration(3725.9) == "01:02:05"
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""GPX/KML/NMEA轨迹解析测试"""
+
+import numpy as np
+import pytest
+
+from track_parsers import parse_gpx, parse_kml, parse_nmea, iso_seconds, get_track_parser
+from gps_track import load_track
+
+T0 = 1723977000.0  # 2024-08-18 10:30:00 UTC
+
+
+def nmea(body):
+    """补上校验和的NMEA语句"""
+    checksum = 0
+    for char in body:
+        checksum ^= ord(char)
+    return f"${body}*{checksum:02X}"
+
+
+def test_iso_seconds():
+    seconds = iso_seconds(["2024-08-18T10:30:00Z", "2024-08-18T18:30:00.5+08:00", "bad"])
+    assert seconds[:2].tolist() == [T0, T0 + 0.5]
+    assert np.isnan(seconds[2])
+
+
+def test_parse_gpx(tmp_path):
+    path = tmp_path / "track.gpx"
+    path.write_text(
+        '<?xml version="1.0"?><gpx:gpx xmlns:gpx="http://www.topografix.com/GPX/1/1"><gpx:trk><gpx:trkseg>'
+        '<gpx:trkpt lat="30.0" lon="114.0"><gpx:ele>100.5</gpx:ele><gpx:time>2024-08-18T10:30:00Z</gpx:time></gpx:trkpt>'
+        "<gpx:trkpt lon='114.001' lat='30.001'><gpx:time>2024-08-18T10:30:01Z</gpx:time></gpx:trkpt>"
+        '</gpx:trkseg></gpx:trk></gpx:gpx>', encoding='utf-8')
+    track = parse_gpx(str(path))
+    assert track['time'].tolist() == [T0, T0 + 1]
+    assert track['latitude'].tolist() == [30.0, 30.001]
+    assert track['longitude'].tolist() == [114.0, 114.001]
+    assert track['altitude'][0] == 100.5 and np.isnan(track['altitude'][1])
+
+
+def test_parse_kml_gx_track(tmp_path):
+    path = tmp_path / "track.kml"
+    path.write_text(
+        '<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2"><Placemark>'
+        '<gx:Track><when>2024-08-18T10:30:00Z</when><when>2024-08-18T10:30:02Z</when>'
+        '<gx:coord>114.0 30.0 100</gx:coord><gx:coord>114.002 30.002 102</gx:coord></gx:Track>'
+        '</Placemark></kml>', encoding='utf-8')
+    track = parse_kml(str(path))
+    assert track['time'].tolist() == [T0, T0 + 2]
+    assert track['latitude'].tolist() == [30.0, 30.002]
+    assert track['altitude'].tolist() == [100.0, 102.0]
+
+
+def test_kml_line_string_without_time_is_rejected(tmp_path):
+    path = tmp_path / "line.kml"
+    path.write_text('<kml><Placemark><LineString><coordinates>114.0,30.0,100 114.001,30.001,101'
+                    '</coordinates></LineString></Placemark></kml>', encoding='utf-8')
+    track = parse_kml(str(path))
+    assert track['latitude'].tolist() == [30.0, 30.001]
+    assert np.isnan(track['time']).all()
+    with pytest.raises(ValueError, match="没有时间"):
+        load_track(str(path))
+
+
+def test_parse_nmea_midnight_rollover(tmp_path):
+    path = tmp_path / "track.nmea"
+    lines = [
+        nmea("GPRMC,235958.00,A,3000.000,N,11400.000,E,0.0,0.0,180824,,,A"),
+        nmea("GPGGA,235958.00,3000.000,N,11400.000,E,1,08,0.9,100.0,M,0.0,M,,"),
+        nmea("GPGGA,235959.00,3000.060,N,11400.000,E,1,08,0.9,101.0,M,0.0,M,,"),
+        # 跨过UTC零点后只有GGA，没有新的日期
+        nmea("GPGGA,000001.00,3000.120,S,11400.000,W,1,08,0.9,102.0,M,0.0,M,,"),
+        nmea("GPGGA,000002.00,3000.180,N,11400.000,E,0,00,0.0,0.0,M,0.0,M,,"),  # 定位无效
+        "$GPGGA,000003.00,3000.240,N,11400.000,E,1,08,0.9,104.0,M,0.0,M,,*00",  # 校验和错误
+    ]
+    path.write_text("\n".join(lines) + "\n", encoding='ascii')
+    track = parse_nmea(str(path))
+    midnight = 1724025600.0  # 2024-08-19 00:00:00 UTC
+    assert track['time'].tolist() == [midnight - 2, midnight - 1, midnight + 1]
+    assert track['latitude'] == pytest.approx([30.0, 30.001, -30.002])
+    assert track['longitude'][2] == pytest.approx(-114.0)
+    assert track['altitude'].tolist() == [100.0, 101.0, 102.0]
+
+
+def test_get_track_parser():
+    assert get_track_parser("a.GPX") is parse_gpx
+    assert get_track_parser("a.log") is parse_nmea
+    assert get_track_parser("a.csv") is None
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+GPS轨迹文件流式解析工具
+直接读取GPX、NMEA(GGA/RMC)和KML(gx:Track)轨迹，不需要先转换为CSV。
+KML的LineString只有坐标没有时间，解析时保留（时间为NaN），但不能用于按拍摄时间插值。
+文件按块增量读取，不建立DOM（GPX按块扫描轨迹点，KML用expat增量解析）；每个点的数值直接追加到array.array缓冲区，
+时间字符串按批向量化转换，几百MB的轨迹文件也只占用与点数成正比的少量内存。
+
+解析结果为按列存放的NumPy数组：{'time', 'latitude', 'longitude', 'altitude', 'roll', 'pitch', 'yaw', 'attitude'}，
+时间为UTC秒数（1970年起），缺失为NaN。
+"""
+
+import os
+import re
+import sys
+import codecs
+from array import array
+from xml.parsers import expat
+
+import numpy as np
+import pandas as pd
+
+# 每次读取的字节数
+READ_BLOCK_SIZE = 1024 * 1024
+
+# 时间字符串每批转换的数量
+TIME_BATCH_SIZE = 8192
+
+# GPX轨迹点（可带命名空间前缀，也可以是自闭合的<trkpt/>）及其属性和子元素
+_GPX_POINT = re.compile(r'<(?:[\w.-]+:)?trkpt\b([^>]*?)(?:/>|>([^<]*(?:<(?!/(?:[\w.-]+:)?trkpt\s*>)[^<]*)*)'
+                        r'</(?:[\w.-]+:)?trkpt\s*>)')
+_GPX_LAT = re.compile(r'\blat\s*=\s*["\']\s*([^"\'\s]*)')
+_GPX_LON = re.compile(r'\blon\s*=\s*["\']\s*([^"\'\s]*)')
+_GPX_ELE = re.compile(r'<(?:[\w.-]+:)?ele\s*>\s*([^<\s]*)')
+_GPX_TIME = re.compile(r'<(?:[\w.-]+:)?time\s*>\s*([^<\s]*)')
+
+# 一个块中最后一个完整的点到此为止
+_GPX_LAST_END = re.compile(r'.*(?:</(?:[\w.-]+:)?trkpt\s*>|<(?:[\w.-]+:)?trkpt\b[^>]*/>)', re.S)
+
+# 常见写法的快速匹配：(正则, 是否经度在前)，GPX规范中<ele>在<time>之前
+_GPX_FAST_POINTS = [
+    (re.compile(r'<trkpt\s+lat="([^"]*)"\s+lon="([^"]*)"\s*>\s*(?:<ele>\s*([^<\s]*)\s*</ele>\s*)?'
+                r'(?:<time>\s*([^<\s]*)\s*</time>)?'), False),
+    (re.compile(r'<trkpt\s+lon="([^"]*)"\s+lat="([^"]*)"\s*>\s*(?:<ele>\s*([^<\s]*)\s*</ele>\s*)?'
+                r'(?:<time>\s*([^<\s]*)\s*</time>)?'), True),
+]
+
+
+def _extend(target, values):
+    """把NumPy数组整块追加到array('d')缓冲区"""
+    target.frombytes(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+
+
+class _TrackBuffer:
+    """按列累积轨迹点，逐点的原始文本攒够一批后统一向量化转换"""
+
+    def __init__(self):
+        self.time = array('d')
+        self.latitude = array('d')
+        self.longitude = array('d')
+        self.altitude = array('d')
+        self._pending = []
+
+    def append(self, latitude, longitude, altitude=None, time_text=None):
+        """添加一个点，数值可以是文本，time_text为ISO 8601时间字符串"""
+        self._pending.append((latitude, longitude, altitude, time_text))
+        if len(self._pending) >= TIME_BATCH_SIZE:
+            self._flush()
+
+    def extend_text(self, rows):
+        """批量添加(纬度, 经度, 高度, 时间)文本元组，缺失的值为空字符串或None"""
+        self._flush()
+        self._convert(rows)
+
+    def extend(self, latitude, longitude, altitude, time=None):
+        """批量添加已经是数组的点，time为秒数数组"""
+        self._flush()
+        if time is None:
+            time = np.full(len(latitude), np.nan)
+        for target, values in ((self.latitude, latitude), (self.longitude, longitude),
+                               (self.altitude, altitude), (self.time, time)):
+            _extend(target, values)
+
+    def _flush(self):
+        if self._pending:
+            self._convert(self._pending)
+            self._pending = []
+
+    def _convert(self, rows):
+        if not rows:
+            return
+        latitude, longitude, altitude, times = zip(*rows)
+        for target, values in ((self.latitude, latitude), (self.longitude, longitude), (self.altitude, altitude)):
+            _extend(target, _numbers(values))
+        _extend(self.time, iso_seconds(times))
+
+    def result(self):
+        """转换为轨迹字典"""
+        self._flush()
+        count = len(self.latitude)
+        return {
+            'time': np.frombuffer(self.time, dtype=np.float64).copy(),
+            'latitude': np.frombuffer(self.latitude, dtype=np.float64).copy(),
+            'longitude': np.frombuffer(self.longitude, dtype=np.float64).copy(),
+            'altitude': np.frombuffer(self.altitude, dtype=np.float64).copy(),
+            'roll': np.zeros(count),
+            'pitch': np.zeros(count),
+            'yaw': np.zeros(count),
+            'attitude': False,
+        }
+
+
+def _numbers(values):
+    """将数值文本序列转换为float64数组，空值和无法解析的为NaN"""
+    try:
+        # 全部是有效数字时由NumPy在C层直接转换
+        return np.array(values, dtype=str).astype(np.float64)
+    except ValueError:
+        return pd.to_numeric(np.array(values, dtype=object), errors='coerce')
+
+
+def iso_seconds(texts):
+    """
+    向量化将ISO 8601时间字符串（可带Z或时区偏移、小数秒）转换为UTC秒数
+
+    Returns:
+        ndarray: float64秒数，无法解析的为NaN
+    """
+    try:
+        text = np.array(texts, dtype=str)
+        if len(text) and np.char.endswith(text, 'Z').all():
+            # 最常见的UTC时间（以Z结尾）由NumPy直接解析
+            return np.char.rstrip(text, 'Z').astype('datetime64[ns]').astype(np.int64) / 1e9
+    except ValueError:
+        pass
+    parsed = pd.to_datetime(pd.Series(texts, dtype=object), utc=True, format='ISO8601', errors='coerce')
+    seconds = parsed.dt.tz_convert(None).to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+    return np.where(parsed.isna().to_numpy(), np.nan, seconds)
+
+
+def _feed_file(parser, track_file):
+    """按块把文件喂给expat解析器"""
+    with open(track_file, 'rb') as f:
+        while True:
+            block = f.read(READ_BLOCK_SIZE)
+            if not block:
+                break
+            parser.Parse(block, False)
+    parser.Parse(b'', True)
+
+
+def _local_name(name):
+    """去掉expat命名空间前缀（命名空间与本地名之间以空格分隔）"""
+    return name.rsplit(' ', 1)[-1]
+
+
+def _float(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def _create_parser():
+    """创建带命名空间处理、合并连续文本的expat解析器"""
+    parser = expat.ParserCreate(namespace_separator=' ')
+    parser.buffer_text = True
+    parser.buffer_size = 64 * 1024
+    return parser
+
+
+def _scan_gpx_points(text, buffer):
+    """扫描一段只包含完整轨迹点的GPX文本"""
+    # 快速路径：常见的<trkpt lat lon><ele><time>写法整段一次findall，
+    # 'trkpt'出现次数恰好是匹配数的两倍（开始和结束标签）时说明没有遗漏的点
+    expected = text.count('trkpt')
+    for pattern, swapped in _GPX_FAST_POINTS:
+        rows = pattern.findall(text)
+        if rows and len(rows) * 2 == expected:
+            if swapped:
+                rows = [(lat, lon, ele, time) for lon, lat, ele, time in rows]
+            buffer.extend_text(rows)
+            return
+    # 通用路径：带命名空间前缀、自闭合、属性顺序不同等写法逐点解析
+    for match in _GPX_POINT.finditer(text):
+        attributes, body = match.group(1), match.group(2) or ''
+        latitude = _GPX_LAT.search(attributes)
+        longitude = _GPX_LON.search(attributes)
+        if latitude is None or longitude is None:
+            continue
+        altitude = _GPX_ELE.search(body)
+        time_text = _GPX_TIME.search(body)
+        buffer.append(latitude.group(1), longitude.group(1), altitude and altitude.group(1),
+                      time_text and time_text.group(1))
+
+
+def parse_gpx(track_file):
+    """
+    流式解析GPX轨迹中的所有<trkpt>点（lat/lon属性、<ele>和<time>）
+
+    每个<trkpt>很小且互相独立，按块用正则表达式扫描到最后一个完整的点为止，
+    之后的内容留到下一块，比逐元素回调的XML解析快得多。
+
+    Returns:
+        dict: 轨迹数组
+    """
+    buffer = _TrackBuffer()
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    rest = ''
+    with open(track_file, 'rb') as f:
+        while True:
+            block = f.read(READ_BLOCK_SIZE)
+            text = rest + decoder.decode(block, final=not block)
+            if block:
+                # 最后一个结束标签或自闭合点之后的内容可能不完整
+                end = _GPX_LAST_END.search(text)
+                cut = end.end() if end else 0
+            else:
+                cut = len(text)
+            _scan_gpx_points(text[:cut], buffer)
+            if not block:
+                break
+            rest = text[cut:]
+    return buffer.result()
+
+
+def _parse_coordinate_text(text):
+    """
+    向量化解析KML坐标文本"经度,纬度[,高度] 经度,纬度[,高度] ..."
+
+    Returns:
+        tuple: (经度数组, 纬度数组, 高度数组)
+    """
+    tuples = text.split(None, 1)
+    if not tuples:
+        return np.empty(0), np.empty(0), np.empty(0)
+    dims = tuples[0].count(',') + 1
+    values = np.array(text.replace(',', ' ').split(), dtype=np.float64)
+    if dims not in (2, 3) or len(values) % dims:
+        # 二维和三维坐标混用时逐个解析
+        rows = [(item.split(',') + ['nan'])[:3] for item in text.split()]
+        values, dims = np.array(rows, dtype=np.float64).reshape(-1), 3
+    values = values.reshape(-1, dims)
+    altitude = values[:, 2] if dims == 3 else np.full(len(values), np.nan)
+    return values[:, 0], values[:, 1], altitude
+
+
+def parse_kml(track_file):
+    """
+    流式解析KML轨迹：Google扩展<gx:Track>中成对的<when>和<gx:coord>，
+    以及<LineString>的<coordinates>（没有时间，时间为NaN，按时间插值时会被丢弃）
+
+    很长的<coordinates>文本按块解析，只保留未完整的最后一个坐标。
+
+    Returns:
+        dict: 轨迹数组
+    """
+    buffer = _TrackBuffer()
+    state = {'in_line': False, 'coordinates': False, 'chunks': [], 'size': 0, 'field': None, 'text': []}
+    # gx:Track中先列出所有<when>再列出所有<gx:coord>，两者都按批转换为数组，轨迹结束时一一对应
+    track = {'whens': [], 'coords': [], 'time': array('d'), 'longitude': array('d'), 'latitude': array('d'),
+             'altitude': array('d')}
+
+    def flush_track_values():
+        if track['whens']:
+            _extend(track['time'], iso_seconds(track['whens']))
+            track['whens'] = []
+        if track['coords']:
+            values = np.array([(coord.split() + ['nan', 'nan', 'nan'])[:3] for coord in track['coords']],
+                              dtype=np.float64)
+            for column, field in enumerate(('longitude', 'latitude', 'altitude')):
+                _extend(track[field], values[:, column])
+            track['coords'] = []
+
+    def flush_coordinates(final):
+        text = ''.join(state['chunks'])
+        state['chunks'], state['size'] = [], 0
+        if not final:
+            # 最后一个空白之后的坐标可能还没有读完，留到下一块
+            cut = max(text.rfind(' '), text.rfind('\n'), text.rfind('\t'), text.rfind('\r'))
+            if cut < 0:
+                state['chunks'], state['size'] = [text], len(text)
+                return
+            text, rest = text[:cut], text[cut:]
+            state['chunks'], state['size'] = [rest], len(rest)
+        longitude, latitude, altitude = _parse_coordinate_text(text)
+        if len(longitude):
+            buffer.extend(latitude, longitude, altitude)
+
+    def start(name, attrs):
+        name = _local_name(name)
+        if name == 'LineString':
+            state['in_line'] = True
+        elif name == 'coordinates' and state['in_line']:
+            state['coordinates'] = True
+            state['chunks'], state['size'] = [], 0
+        elif name in ('when', 'coord'):
+            state['field'] = name
+            state['text'] = []
+
+    def end(name):
+        name = _local_name(name)
+        if name == 'coordinates' and state['coordinates']:
+            flush_coordinates(True)
+            state['coordinates'] = False
+        elif name == 'LineString':
+            state['in_line'] = False
+        elif name == state['field']:
+            pending = track['whens' if name == 'when' else 'coords']
+            pending.append(''.join(state['text']).strip())
+            state['field'] = None
+            if len(pending) >= TIME_BATCH_SIZE:
+                flush_track_values()
+        elif name == 'Track':
+            flush_track_values()
+            count = min(len(track['time']), len(track['latitude']))
+            columns = {field: np.frombuffer(track[field], dtype=np.float64)[:count]
+                       for field in ('time', 'longitude', 'latitude', 'altitude')}
+            buffer.extend(columns['latitude'], columns['longitude'], columns['altitude'], columns['time'])
+            for field in ('time', 'longitude', 'latitude', 'altitude'):
+                track[field] = array('d')
+
+    def characters(data):
+        if state['coordinates']:
+            state['chunks'].append(data)
+            state['size'] += len(data)
+            if state['size'] >= READ_BLOCK_SIZE:
+                flush_coordinates(False)
+        elif state['field'] is not None:
+            state['text'].append(data)
+
+    parser = _create_parser()
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = characters
+    _feed_file(parser, track_file)
+    return buffer.result()
+
+
+def _nmea_checksum_ok(line):
+    """校验NMEA语句的校验和，没有校验和时视为有效"""
+    star = line.rfind('*')
+    if star < 0:
+        return True
+    checksum = 0
+    for char in line[1:star]:
+        checksum ^= ord(char)
+    try:
+        return checksum == int(line[star + 1:star + 3], 16)
+    except ValueError:
+        return False
+
+
+def _nmea_degrees(value, hemisphere):
+    """ddmm.mmmm/dddmm.mmmm格式转换为十进制度数"""
+    if not value:
+        return float('nan')
+    try:
+        number = float(value)
+    except ValueError:
+        return float('nan')
+    degrees = int(number // 100)
+    decimal = degrees + (number - degrees * 100) / 60.0
+    return -decimal if hemisphere in ('S', 'W') else decimal
+
+
+def _nmea_time_of_day(value):
+    """hhmmss.ss转换为当天秒数"""
+    try:
+        return int(value[0:2]) * 3600 + int(value[2:4]) * 60 + float(value[4:])
+    except (ValueError, IndexError):
+        return float('nan')
+
+
+def _nmea_date_seconds(value):
+    """ddmmyy转换为当天0点的UTC秒数"""
+    try:
+        day, month, year = int(value[0:2]), int(value[2:4]), 2000 + int(value[4:6])
+        return (np.datetime64(f"{year:04d}-{month:02d}-{day:02d}") - np.datetime64('1970-01-01')) / np.timedelta64(1, 's')
+    except (ValueError, IndexError):
+        return float('nan')
+
+
+def parse_nmea(track_file):
+    """
+    逐行流式解析NMEA日志（任意发送方ID的GGA和RMC语句）
+
+    同一时刻的GGA（位置、海拔）和RMC（日期、位置）合并为一个点；
+    GGA没有日期，使用前后最近的RMC日期，跨过UTC零点时日期加一天。
+    只有RMC的日志同样可以解析，此时高度为NaN。定位无效和校验和错误的语句被忽略。
+
+    Returns:
+        dict: 轨迹数组
+    """
+    time_of_day = array('d')
+    date = array('d')
+    latitude = array('d')
+    longitude = array('d')
+    altitude = array('d')
+    epoch = {'time': None}
+
+    def flush():
+        if epoch['time'] is not None and epoch.get('lat') is not None:
+            time_of_day.append(epoch['time'])
+            date.append(epoch.get('date', float('nan')))
+            latitude.append(epoch['lat'])
+            longitude.append(epoch['lon'])
+            altitude.append(epoch.get('alt', float('nan')))
+        epoch.clear()
+        epoch['time'] = None
+
+    def begin(seconds):
+        if epoch['time'] != seconds:
+            flush()
+            epoch['time'] = seconds
+
+    with open(track_file, 'rb') as f:
+        for raw in f:
+            line = raw.decode('ascii', errors='ignore').strip()
+            start = line.find('$')
+            if start < 0:
+                continue
+            line = line[start:]
+            kind = line[3:6]
+            if kind not in ('GGA', 'RMC') or not _nmea_checksum_ok(line):
+                continue
+            fields = line.split('*', 1)[0].split(',')
+            if kind == 'GGA' and len(fields) >= 10:
+                if fields[6] in ('', '0'):
+                    continue
+                begin(_nmea_time_of_day(fields[1]))
+                epoch['lat'] = _nmea_degrees(fields[2], fields[3])
+                epoch['lon'] = _nmea_degrees(fields[4], fields[5])
+                epoch['alt'] = _float(fields[9])
+            elif kind == 'RMC' and len(fields) >= 10:
+                if fields[2] != 'A':
+                    continue
+                begin(_nmea_time_of_day(fields[1]))
+                epoch['date'] = _nmea_date_seconds(fields[9])
+                if epoch.get('lat') is None:
+                    epoch['lat'] = _nmea_degrees(fields[3], fields[4])
+                    epoch['lon'] = _nmea_degrees(fields[5], fields[6])
+    flush()
+
+    time_of_day = np.frombuffer(time_of_day, dtype=np.float64)
+    date = pd.Series(np.frombuffer(date, dtype=np.float64))
+    dated = date.notna().to_numpy()
+    # 沿用前一个RMC日期的点，时间倒退超过12小时视为跨过了UTC零点，到下一个带日期的点为止累计天数
+    backwards = np.concatenate(([False], np.diff(time_of_day) < -43200)) & ~dated
+    rollover = pd.Series(backwards.astype(np.float64)).groupby(np.cumsum(dated)).cumsum().to_numpy()
+    date = date.ffill().bfill().to_numpy()
+    count = len(time_of_day)
+    return {
+        'time': date + time_of_day + rollover * 86400.0,
+        'latitude': np.frombuffer(latitude, dtype=np.float64).copy(),
+        'longitude': np.frombuffer(longitude, dtype=np.float64).copy(),
+        'altitude': np.frombuffer(altitude, dtype=np.float64).copy(),
+        'roll': np.zeros(count),
+        'pitch': np.zeros(count),
+        'yaw': np.zeros(count),
+        'attitude': False,
+    }
+
+
+# 按扩展名选择解析器
+TRACK_PARSERS = {
+    '.gpx': parse_gpx,
+    '.kml': parse_kml,
+    '.nmea': parse_nmea,
+    '.nma': parse_nmea,
+    '.log': parse_nmea,
+}
+
+
+def get_track_parser(track_file):
+    """按扩展名返回解析函数，CSV等其他格式返回None"""
+    return TRACK_PARSERS.get(os.path.splitext(track_file)[1].lower())
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or get_track_parser(sys.argv[1]) is None:
+        print("用法: python track_parsers.py <轨迹文件(.gpx/.kml/.nmea/.log)>")
+        sys.exit(1)
+    track = get_track_parser(sys.argv[1])(sys.argv[1])
+    times = track['time'][~np.isnan(track['time'])]
+    print(f"轨迹点数: {len(track['latitude'])}")
+    if len(times):
+        print(f"时间范围: {np.datetime64(int(times.min()), 's')} - {np.datetime64(int(times.max()), 's')} (UTC)")